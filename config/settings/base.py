@@ -383,6 +383,14 @@ CRON_JOBS = {
         "func": "metaci.release.tasks.update_cohort_status",
         "cron_string": "* * * * *",
     },
+    "archive_logs": {
+        "func": "metaci.build.tasks.archive_logs",
+        "cron_string": "0 3 * * *",
+    },
+    "run_scheduler": {
+        "func": "metaci.build.tasks.run_scheduler",
+        "cron_string": "* * * * *",
+    },
 }
 # There is a default dict of cron jobs,
 # and the cron_string can be optionally overridden
@@ -440,6 +448,60 @@ METACI_CHANGE_CASE_URL_TEMPLATE = env(
 METACI_LONG_RUNNING_BUILD_CONFIG = json.loads(
     env("METACI_LONG_RUNNING_BUILD_CONFIG", default="{}")
 )
+# Number of test results to write per INSERT when importing test results
+METACI_TEST_RESULT_IMPORT_BATCH_SIZE = env.int(
+    "METACI_TEST_RESULT_IMPORT_BATCH_SIZE", default=1000
+)
+# Most failing tests listed in a build's test summary on the build page
+METACI_BUILD_SUMMARY_FAILED_TESTS = env.int(
+    "METACI_BUILD_SUMMARY_FAILED_TESTS", default=100
+)
+# Number of processes used to parse and render robot test results during import
+# (1 parses them in the worker process itself), and how many tests each one gets at a time
+METACI_ROBOT_IMPORT_WORKERS = env.int("METACI_ROBOT_IMPORT_WORKERS", default=1)
+METACI_ROBOT_IMPORT_CHUNKSIZE = env.int("METACI_ROBOT_IMPORT_CHUNKSIZE", default=50)
+# Number of threads uploading robot screenshots to file storage during import
+METACI_ROBOT_SCREENSHOT_UPLOAD_WORKERS = env.int(
+    "METACI_ROBOT_SCREENSHOT_UPLOAD_WORKERS", default=8
+)
+# How robot test xml is stored: "text" (a full document per test) or "compressed"
+# (compressed per-test xml, with the surrounding suite xml stored once per flow)
+METACI_ROBOT_XML_STORAGE = env("METACI_ROBOT_XML_STORAGE", default="text")
+# Seconds to keep rendered robot logs in the cache, how long a request waits for
+# another process that is already rendering the same log, and whether the logs of
+# failed robot tests are rendered in the background as soon as they are imported
+METACI_ROBOT_LOG_CACHE_TIMEOUT = env.int(
+    "METACI_ROBOT_LOG_CACHE_TIMEOUT", default=60 * 60 * 24 * 7
+)
+METACI_ROBOT_LOG_RENDER_WAIT = env.int("METACI_ROBOT_LOG_RENDER_WAIT", default=30)
+METACI_ROBOT_LOG_PRERENDER = env.bool("METACI_ROBOT_LOG_PRERENDER", default=True)
+# Longest wait in seconds for new output when following a build log.
+# A waiting request holds a web worker, so keep it to a few seconds.
+METACI_LOG_TAIL_WAIT = env.int("METACI_LOG_TAIL_WAIT", default=5)
+# Seconds to keep the html of finished build logs in the cache, whether it is
+# rendered as soon as a build finishes, and the most characters of a log
+# rendered on the build page (earlier output is loaded on request; 0 for no limit)
+METACI_LOG_HTML_CACHE_TIMEOUT = env.int(
+    "METACI_LOG_HTML_CACHE_TIMEOUT", default=60 * 60 * 24 * 7
+)
+METACI_LOG_HTML_PRERENDER = env.bool("METACI_LOG_HTML_PRERENDER", default=True)
+METACI_LOG_HTML_WINDOW = env.int("METACI_LOG_HTML_WINDOW", default=500000)
+# Days after a build finishes before its logs are moved out of the database
+# into compressed files in DEFAULT_FILE_STORAGE (0 to keep them in the database)
+METACI_LOG_ARCHIVE_DAYS = env.int("METACI_LOG_ARCHIVE_DAYS", default=30)
+# Seconds to cache the repository list dashboard (it is also refreshed
+# whenever a build completes)
+METACI_REPO_DASHBOARD_CACHE_TIMEOUT = env.int(
+    "METACI_REPO_DASHBOARD_CACHE_TIMEOUT", default=60
+)
+# Seconds to cache the plan repositories each user has permissions on
+# (the cache is also cleared whenever permissions change)
+METACI_PERMISSION_SCOPE_CACHE_TIMEOUT = env.int(
+    "METACI_PERMISSION_SCOPE_CACHE_TIMEOUT", default=300
+)
+# API lists count their results exactly up to this many rows, and use the
+# database's estimate beyond that
+METACI_PAGINATION_COUNT_LIMIT = env.int("METACI_PAGINATION_COUNT_LIMIT", default=10000)
 
 # GUS BUS OWNER ID
 GUS_BUS_OWNER_ID = env("GUS_BUS_OWNER_ID", default="")
@@ -458,6 +520,47 @@ METACI_MAX_WORKERS = env.int("METACI_MAX_WORKERS", 3)
 # Should be less than METACI_MAX_WORKERS
 METACI_WORKER_RESERVE = env.int("METACI_WORKER_RESERVE", 1)
 WORKER_DYNO_NAME = env("WORKER_DYNO_NAME", default=None) or "worker"
+# Seconds a snapshot of the RQ queues is shared by HireFire
+# and the queue metrics API before it is collected again
+METACI_QUEUE_METRICS_TIMEOUT = env.int("METACI_QUEUE_METRICS_TIMEOUT", default=5)
+# Seconds the predictive autoscalers aim to start queued builds within
+METACI_AUTOSCALER_TARGET_WAIT = env.int("METACI_AUTOSCALER_TARGET_WAIT", default=600)
+# How much tighter than the target wait fewer workers must meet
+# before the predictive autoscalers scale down (0 to 1)
+METACI_AUTOSCALER_HYSTERESIS = env.float("METACI_AUTOSCALER_HYSTERESIS", default=0.5)
+# Seconds workers must have been surplus before they are stopped
+METACI_AUTOSCALER_SCALE_DOWN_COOLDOWN = env.int(
+    "METACI_AUTOSCALER_SCALE_DOWN_COOLDOWN", default=900
+)
+# Number of recent builds of a plan its build duration is estimated from,
+# how long the estimate is cached for, and the seconds a build of a plan
+# without finished builds is assumed to take
+METACI_AUTOSCALER_HISTORY = env.int("METACI_AUTOSCALER_HISTORY", default=20)
+METACI_AUTOSCALER_HISTORY_TIMEOUT = env.int(
+    "METACI_AUTOSCALER_HISTORY_TIMEOUT", default=600
+)
+METACI_AUTOSCALER_DEFAULT_DURATION = env.int(
+    "METACI_AUTOSCALER_DEFAULT_DURATION", default=1800
+)
+# Number of queued and running jobs of each queue the predictive
+# autoscalers look at. Builds queued behind them are counted,
+# but the first ones are enough to keep all the workers busy.
+METACI_AUTOSCALER_LOOKAHEAD = env.int("METACI_AUTOSCALER_LOOKAHEAD", default=100)
+# Number of worker slots the fair-share scheduler hands out to builds.
+# 0 disables the scheduler, so builds are queued as soon as they can run.
+METACI_SCHEDULER_SLOTS = env.int("METACI_SCHEDULER_SLOTS", default=0)
+# Seconds a build must wait to move ahead by one build's share,
+# so builds of busy repositories aren't starved
+METACI_SCHEDULER_AGING_SECONDS = env.int("METACI_SCHEDULER_AGING_SECONDS", default=900)
+# Share of worker slots given to builds of each plan role (the default is 1)
+METACI_SCHEDULER_ROLE_WEIGHTS = {
+    "release": 4,
+    "release_deploy": 4,
+    "push_production": 4,
+    "beta_release": 2,
+    "release_test": 2,
+    "qa": 2,
+}
 
 
 # Django REST Framework
@@ -1,6 +1,105 @@
-from rest_framework.pagination import PageNumberPagination
+from collections import OrderedDict
 
+from django.conf import settings
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 
-class RestrictedPagination(PageNumberPagination):
+from metaci.build.utils import BUILD_KEYSET, estimate_count, get_keyset_page
+
+
+class KeysetPagination(BasePagination):
+    """Pages through results with cursors on a unique ordering
+    rather than page numbers, so deep pages are as fast as the first.
+
+    The count is exact up to METACI_PAGINATION_COUNT_LIMIT and estimated
+    by the database planner beyond that. Pass count=false to skip it.
+    """
+
+    ordering = BUILD_KEYSET
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 1000
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            self.page = get_keyset_page(
+                queryset,
+                self.ordering,
+                self.get_page_size(request),
+                request.query_params.get(self.cursor_query_param),
+            )
+        except ValueError:
+            raise NotFound("Invalid cursor")
+        self.count, self.count_estimated = self.get_count(queryset, request)
+        return list(self.page)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_count(self, queryset, request):
+        if request.query_params.get(self.count_query_param) == "false":
+            return None, False
+        limit = settings.METACI_PAGINATION_COUNT_LIMIT
+        count = queryset.order_by()[: limit + 1].count()
+        if count <= limit:
+            return count, False
+        return max(estimate_count(queryset), count), True
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        return self.get_link(self.page.next_cursor)
+
+    def get_previous_link(self):
+        return self.get_link(self.page.previous_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("count", self.count),
+                    ("count_estimated", self.count_estimated),
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "count": {"type": "integer", "nullable": True},
+                "count_estimated": {"type": "boolean"},
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class BuildPagination(KeysetPagination):
     page_size = 10
     max_page_size = 100
+
+
+class RobotTestResultPagination(KeysetPagination):
+    # Results are annotated with the end time of their build flow
+    ordering = ("flow_time_end", "id")
@@ -0,0 +1,68 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework import renderers
+
+
+class Echo:
+    """A file-like object which returns what is written to it,
+    so csv.writer can format one row at a time."""
+
+    def write(self, value):
+        return value
+
+
+class StreamingRenderer(renderers.BaseRenderer):
+    """Renders rows for a StreamingHttpResponse, a batch at a time,
+    so exports use the same memory however many rows they have.
+
+    Views call stream() with an iterator of dicts. render() is only
+    used for error responses.
+    """
+
+    charset = "utf-8"
+    # Number of rows joined into each chunk of the response
+    batch_size = 1000
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, cls=DjangoJSONEncoder).encode("utf-8")
+
+    def stream(self, rows, fields):
+        batch = [self.render_header(fields)]
+        for row in rows:
+            batch.append(self.render_row(row, fields))
+            if len(batch) >= self.batch_size:
+                yield "".join(batch).encode("utf-8")
+                batch = []
+        if batch:
+            yield "".join(batch).encode("utf-8")
+
+    def render_header(self, fields):
+        return ""
+
+    def render_row(self, row, fields):
+        raise NotImplementedError
+
+
+class CSVStreamingRenderer(StreamingRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+    def __init__(self):
+        self.writer = csv.writer(Echo())
+
+    def render_header(self, fields):
+        return self.writer.writerow(fields)
+
+    def render_row(self, row, fields):
+        return self.writer.writerow([row[field] for field in fields])
+
+
+class JSONLinesRenderer(StreamingRenderer):
+    media_type = "application/x-ndjson"
+    format = "jsonl"
+
+    def render_row(self, row, fields):
+        data = {field: row[field] for field in fields}
+        return json.dumps(data, cls=DjangoJSONEncoder) + "\n"
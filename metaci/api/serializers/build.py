@@ -10,6 +10,9 @@ from metaci.repository.models import Branch, Repository
 
 
 class BuildFlowSerializer(serializers.HyperlinkedModelSerializer):
+    # The log is a property reading the flow's log chunks
+    log = serializers.CharField(required=False, allow_blank=True, trim_whitespace=False)
+
     class Meta:
         model = BuildFlow
         fields = (
@@ -77,6 +80,8 @@ class BuildSerializer(serializers.HyperlinkedModelSerializer):
     repo_id = serializers.PrimaryKeyRelatedField(
         queryset=Repository.objects.all(), source="repo", write_only=True
     )
+    # The log is a property reading the build's log chunks
+    log = serializers.CharField(required=False, allow_blank=True, trim_whitespace=False)
 
     class Meta:
         model = Build
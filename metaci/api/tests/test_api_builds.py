@@ -0,0 +1,57 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APITestCase
+
+from metaci.build.models import Build
+from metaci.conftest import BuildFactory, BuildFlowFactory, StaffSuperuserFactory
+
+
+class TestAPIBuilds(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(StaffSuperuserFactory())
+        self.build = BuildFactory()
+        self.build.log = "build log\n"
+        self.build.save()
+        self.build_flow = BuildFlowFactory(build=self.build)
+        self.build_flow.log = "flow log\n"
+        self.build_flow.save()
+
+    def test_list__logs(self):
+        response = self.client.get("/api/builds/")
+        assert response.status_code == 200
+        build = response.json()["results"][0]
+        assert build["log"] == "build log\n"
+        assert "log" not in build["flows"][0]
+
+        response = self.client.get("/api/build_flows/")
+        assert response.status_code == 200
+        assert response.json()["results"][0]["log"] == "flow log\n"
+
+    def test_list__log_queries(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get("/api/build_flows/")
+            assert response.status_code == 200
+            return len(queries)
+
+        expected = count_queries()
+        for build_flow in BuildFlowFactory.create_batch(3, build=self.build):
+            build_flow.log = "more flow log\n"
+            build_flow.save()
+
+        assert count_queries() == expected
+
+    def test_detail__log(self):
+        response = self.client.get(f"/api/builds/{self.build.id}/")
+        assert response.json()["log"] == "build log\n"
+
+        response = self.client.get(f"/api/build_flows/{self.build_flow.id}/")
+        assert response.json()["log"] == "flow log\n"
+
+    def test_update__log(self):
+        response = self.client.patch(
+            f"/api/builds/{self.build.id}/", {"log": "replaced\n"}, format="json"
+        )
+        assert response.status_code == 200
+        assert Build.objects.get(id=self.build.id).log == "replaced\n"
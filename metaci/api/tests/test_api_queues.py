@@ -0,0 +1,42 @@
+from unittest import mock
+
+from rest_framework.test import APIClient, APITestCase
+
+from metaci.build.queue_metrics import QueueMetrics
+from metaci.conftest import StaffSuperuserFactory, UserFactory
+
+
+@mock.patch("metaci.api.views.queues.get_queue_metrics")
+class TestAPIQueueMetrics(APITestCase):
+    def test_queue_metrics(self, get_queue_metrics):
+        get_queue_metrics.return_value = {
+            "default": QueueMetrics("default", 3, 1, 0, 10, 2, 42.5)
+        }
+        client = APIClient()
+        client.force_authenticate(StaffSuperuserFactory())
+
+        response = client.get("/api/queue_metrics/")
+
+        assert response.status_code == 200
+        assert response.json() == {
+            "queues": [
+                {
+                    "name": "default",
+                    "jobs": 3,
+                    "started_jobs": 1,
+                    "deferred_jobs": 0,
+                    "finished_jobs": 10,
+                    "workers": 2,
+                    "oldest_job_age": 42.5,
+                }
+            ]
+        }
+
+    def test_queue_metrics__not_staff(self, get_queue_metrics):
+        client = APIClient()
+        client.force_authenticate(UserFactory())
+
+        response = client.get("/api/queue_metrics/")
+
+        assert response.status_code == 403
+        get_queue_metrics.assert_not_called()
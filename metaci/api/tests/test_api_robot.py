@@ -1,5 +1,6 @@
 """Test cases for /api/robot, mostly focusing on csv output"""
 
+import json
 from unittest.mock import patch
 
 import dateutil.parser
@@ -7,6 +8,7 @@ from django.utils import timezone
 from guardian.shortcuts import assign_perm
 from rest_framework.test import APIClient, APITestCase
 
+from metaci.api.pagination import RobotTestResultPagination
 from metaci.api.views.robot import RobotTestResultViewSet
 from metaci.conftest import (
     BranchFactory,
@@ -164,6 +166,69 @@ class TestAPIRobot(APITestCase):
         actual = response.content.decode().splitlines()
         self.assertCountEqual(expected, actual)
 
+    def test_result_pagination(self):
+        """Verify results can be paged through with cursors"""
+        self.client.force_authenticate(self.superuser)
+        response = self.client.get("/api/robot.json?page_size=4")
+        first = response.json()
+        assert first["count"] == 6
+        assert first["previous"] is None
+        assert len(first["results"]) == 4
+
+        second = self.client.get(first["next"]).json()
+        assert second["next"] is None
+        assert len(second["results"]) == 2
+        assert self.client.get(second["previous"]).json()["results"] == (
+            first["results"]
+        )
+
+        ids = [result["id"] for result in first["results"] + second["results"]]
+        assert ids == sorted(ids)
+
+    def test_result_pagination__invalid_cursor(self):
+        self.client.force_authenticate(self.superuser)
+        response = self.client.get("/api/robot.json?cursor=nonsense")
+        assert response.status_code == 404
+
+    def test_result_pagination__without_count(self):
+        self.client.force_authenticate(self.superuser)
+        response = self.client.get("/api/robot.json?count=false")
+        assert response.json()["count"] is None
+
+    def test_export_csv(self):
+        """Verify exports stream the same csv as the list"""
+        self.client.force_authenticate(self.superuser)
+        response = self.client.get("/api/robot/export.csv")
+        assert response.streaming
+        assert response["Content-Type"] == "text/csv"
+        actual = b"".join(response.streaming_content).decode().splitlines()
+
+        expected = self.client.get("/api/robot.csv").content.decode().splitlines()
+        assert actual[0] == expected[0]
+        self.assertCountEqual(expected, actual)
+
+    def test_export_jsonl(self):
+        self.client.force_authenticate(self.superuser)
+        response = self.client.get("/api/robot/export.jsonl?outcome=Fail")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+
+        results = [json.loads(line) for line in lines]
+        assert len(results) == 4
+        assert {result["outcome"] for result in results} == {"Fail"}
+        assert results[0]["date"] == self.today
+
+    def test_export__not_paginated(self):
+        self.client.force_authenticate(self.superuser)
+        with patch.object(RobotTestResultPagination, "page_size", 2):
+            response = self.client.get("/api/robot/export.csv")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        assert len(lines) == 7
+
+    def test_export__unauthenticated(self):
+        self.client.logout()
+        response = self.client.get("/api/robot/export.csv")
+        assert response.status_code == 401
+
     def test_repo_filter(self):
         self.client.force_authenticate(self.superuser)
         response = self.client.get("/api/robot.csv?repo_name=repo2")
@@ -9,6 +9,7 @@ from metaci.api.views.cumulusci import (
     ServiceViewSet,
 )
 from metaci.api.views.plan import PlanRepositoryViewSet, PlanViewSet
+from metaci.api.views.queues import QueueMetricsView
 from metaci.api.views.repository import BranchViewSet, RepositoryViewSet
 from metaci.api.views.robot import RobotTestResultViewSet
 
@@ -28,4 +29,7 @@ router.register(r"robot", RobotTestResultViewSet, basename="robot")
 urlpatterns = router.urls
 
 schema_view = get_schema_view(title="MetaCI API")
-urlpatterns += (re_path(r"^schema/$", schema_view),)
+urlpatterns += (
+    re_path(r"^schema/$", schema_view),
+    re_path(r"^queue_metrics/$", QueueMetricsView.as_view(), name="queue_metrics"),
+)
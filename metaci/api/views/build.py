@@ -1,14 +1,21 @@
+from django.db.models import Prefetch
 from django.shortcuts import render
 from rest_framework import viewsets
 
-from metaci.api.pagination import RestrictedPagination
+from metaci.api.pagination import BuildPagination, KeysetPagination
 from metaci.api.serializers.build import (
     BuildFlowSerializer,
     BuildSerializer,
     RebuildSerializer,
 )
 from metaci.build.filters import BuildFilter, BuildFlowFilter, RebuildFilter
-from metaci.build.models import Build, BuildFlow, Rebuild
+from metaci.build.models import (
+    Build,
+    BuildFlow,
+    BuildFlowLogChunk,
+    BuildLogChunk,
+    Rebuild,
+)
 
 
 class BuildViewSet(viewsets.ModelViewSet):
@@ -19,7 +26,16 @@ class BuildViewSet(viewsets.ModelViewSet):
     serializer_class = BuildSerializer
     queryset = Build.objects.all()
     filterset_class = BuildFilter
-    pagination_class = RestrictedPagination
+    pagination_class = BuildPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == "list":
+            # Read the logs of the whole page in one query
+            queryset = queryset.prefetch_related(
+                Prefetch("log_chunks", queryset=BuildLogChunk.objects.order_by("id"))
+            )
+        return queryset
 
 
 class BuildFlowViewSet(viewsets.ModelViewSet):
@@ -30,6 +46,18 @@ class BuildFlowViewSet(viewsets.ModelViewSet):
     serializer_class = BuildFlowSerializer
     queryset = BuildFlow.objects.all()
     filterset_class = BuildFlowFilter
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == "list":
+            # Read the logs of the whole page in one query
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    "log_chunks", queryset=BuildFlowLogChunk.objects.order_by("id")
+                )
+            )
+        return queryset
 
 
 class RebuildViewSet(viewsets.ModelViewSet):
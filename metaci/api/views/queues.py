@@ -0,0 +1,15 @@
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from metaci.build.queue_metrics import get_queue_metrics
+
+
+class QueueMetricsView(APIView):
+    """
+    The depth, job counts, workers and oldest job age of each RQ queue,
+    from the snapshot the autoscaler and HireFire share
+    """
+
+    def get(self, request):
+        metrics = get_queue_metrics()
+        return Response({"queues": [queue._asdict() for queue in metrics.values()]})
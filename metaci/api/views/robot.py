@@ -2,17 +2,42 @@ import datetime
 
 import dateutil.parser
 from dateutil.relativedelta import MO, relativedelta
+from django.db.models import F
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from rest_framework import viewsets
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
 
+from metaci.api.pagination import RobotTestResultPagination
 from metaci.api.renderers.csv_renderer import SimpleCSVRenderer
+from metaci.api.renderers.streaming_renderers import (
+    CSVStreamingRenderer,
+    JSONLinesRenderer,
+)
 from metaci.api.serializers.robot import RobotTestResultSerializer
 from metaci.build.models import BuildFlow
 from metaci.plan.models import PlanRepository
 from metaci.testresults.filters import RobotResultFilter
 from metaci.testresults.models import TestResult
 
+# Columns of exported results, matching RobotTestResultSerializer
+EXPORT_FIELDS = {
+    "id": "id",
+    "outcome": "outcome",
+    "date": "build_flow__time_end",
+    "duration": "duration",
+    "repo_name": "build_flow__build__repo__name",
+    "branch_name": "build_flow__build__branch__name",
+    "source_file": "source_file",
+    "test_name": "method__name",
+    "robot_tags": "robot_tags",
+    "robot_keyword": "robot_keyword",
+    "message": "message",
+}
+EXPORT_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
 
 class RobotTestResultViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -23,6 +48,7 @@ class RobotTestResultViewSet(viewsets.ReadOnlyModelViewSet):
     renderer_classes = [BrowsableAPIRenderer, JSONRenderer, SimpleCSVRenderer]
     filterset_class = RobotResultFilter
     permission_classes = [IsAuthenticated]
+    pagination_class = RobotTestResultPagination
 
     def get_queryset(self):
         """Return a query set for robot results
@@ -73,16 +99,56 @@ class RobotTestResultViewSet(viewsets.ReadOnlyModelViewSet):
                 method__testclass__test_type="Robot",
                 build_flow_id__in=buildflows,
             )
+            .annotate(flow_time_end=F("build_flow__time_end"))
             .prefetch_related(
                 "build_flow__build__branch",
                 "build_flow__build__repo",
                 "method__testclass",
             )
-            .order_by("build_flow__time_end")
+            .order_by("flow_time_end", "id")
         )
 
         return queryset
 
+    @action(
+        detail=False,
+        renderer_classes=[CSVStreamingRenderer, JSONLinesRenderer],
+        pagination_class=None,
+    )
+    def export(self, request, *args, **kwargs):
+        """Streams every matching result as CSV or JSON Lines,
+        without pagination. It takes the same filters as the list:
+
+            /api/robot/export.csv?range=lastmonth
+            /api/robot/export.jsonl?range=lastmonth&outcome=Fail
+
+        Rows are read from a server-side cursor as they are sent,
+        so large exports don't have to fit in memory.
+        """
+        rows = (
+            self.filter_queryset(self.get_queryset())
+            .prefetch_related(None)
+            .values_list(*EXPORT_FIELDS.values())
+            .iterator(chunk_size=2000)
+        )
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(self._export_rows(rows), list(EXPORT_FIELDS)),
+            content_type=renderer.media_type,
+        )
+        filename = f"robot-results.{renderer.format}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+    def _export_rows(self, rows):
+        for values in rows:
+            row = dict(zip(EXPORT_FIELDS, values))
+            if row["date"] is not None:
+                row["date"] = timezone.localtime(row["date"]).strftime(
+                    EXPORT_DATE_FORMAT
+                )
+            yield row
+
     def _get_today(self):
         """Return today's date as a datetime.date object
 
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from metaci.build.models import Build, BuildFlow, FlowTask, Rebuild
+from metaci.build.models import Build, BuildFlow, FlowTask, Rebuild, ScheduledBuild
 
 
 @admin.register(Build)
@@ -52,3 +52,40 @@ class RebuildAdmin(admin.ModelAdmin):
     )
     list_filter = ("build__repo", "build__plan")
     raw_id_fields = ("build", "org_instance")
+
+
+@admin.register(ScheduledBuild)
+class ScheduledBuildAdmin(admin.ModelAdmin):
+    """Shows the fair-share scheduler's latest decision about each build
+    waiting for or running in a worker slot."""
+
+    list_display = (
+        "build",
+        "repo",
+        "role",
+        "time_submitted",
+        "time_dispatched",
+        "score",
+        "decision",
+    )
+    list_filter = ("build__repo", "build__plan__role")
+    list_select_related = ("build__repo", "build__plan")
+    # Waiting builds first, in the order they will be dispatched
+    ordering = ("-time_dispatched", "score")
+    readonly_fields = (
+        "build",
+        "lock_id",
+        "time_submitted",
+        "time_dispatched",
+        "score",
+        "decision",
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def repo(self, obj):
+        return obj.build.repo
+
+    def role(self, obj):
+        return obj.build.plan.get_role_display()
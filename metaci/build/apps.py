@@ -10,5 +10,5 @@ class BuildConfig(AppConfig):
 
         Build = self.get_model("Build")
         BuildFlow = self.get_model("BuildFlow")
-        watson.register(Build, exclude=["log"])
-        watson.register(BuildFlow, exclude=["log"])
+        watson.register(Build, fields=Build.search_fields)
+        watson.register(BuildFlow, fields=BuildFlow.search_fields)
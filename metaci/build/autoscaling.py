@@ -1,14 +1,21 @@
+import heapq
 import logging
+import statistics
 import subprocess
+import time
 import typing as T
+from datetime import datetime
 
 import django_rq
 import requests
 from cumulusci.core.utils import import_global
+from django.apps import apps
 from django.conf import settings
-from rq import Worker
+from django.core.cache import cache
+from rq.job import Job
 from rq.registry import StartedJobRegistry
 
+from metaci.build.queue_metrics import collect_queue_metrics
 from metaci.exceptions import ConfigError
 
 logger = logging.getLogger(__name__)
@@ -19,6 +26,7 @@ class Autoscaler(object):
 
     active_builds = 0
     target_workers = 0
+    queue_metrics = None
 
     def __init__(self, config):
         """config is a dict that has an entry for queues"""
@@ -62,15 +70,24 @@ class Autoscaler(object):
     def __repr__(self):
         return f"<{self.__class__.__name__} builds: {self.active_builds}, workers: {self.target_workers}>"
 
+    def get_queue_metrics(self):
+        """Collects the queue metrics once per autoscaler. The cached
+        snapshot shared with HireFire and the API isn't used, as it
+        wouldn't include a build which was only just queued."""
+        if self.queue_metrics is None:
+            self.queue_metrics = collect_queue_metrics()
+        return self.queue_metrics
+
     def count_builds(self, queue):
-        return queue.count + len(StartedJobRegistry(queue=queue))
+        metrics = self.get_queue_metrics()[queue.name]
+        return metrics.jobs + metrics.started_jobs
 
     def count_workers(self):
         """Count how many workers are active
 
         (Note: this assumes that all workers process the first (high-priority) queue.)
         """
-        return Worker.count(queue=self.queues[0])
+        return self.get_queue_metrics()[self.queues[0].name].workers
 
     def scale(self):
         """Do what is needed to achieve the target # of workers.
@@ -234,6 +251,205 @@ class HerokuOneOffBuilder(OneOffBuilder):
         return resp.json()["id"]
 
 
+def starts_in_time(running, queued, workers):
+    """Returns whether the queued builds would all start in time on the
+    given number of workers, taking them in queue order.
+
+    running holds the seconds left for each running build, and queued
+    a (duration, seconds it may still wait) pair for each queued build.
+    """
+    if workers < len(running):
+        return False
+    # A sorted list is a heap
+    free_at = [0] * (workers - len(running)) + sorted(running)
+    for duration, allowed in queued:
+        if not free_at:
+            return False
+        start = heapq.heappop(free_at)
+        if start > allowed:
+            return False
+        heapq.heappush(free_at, start + duration)
+    return True
+
+
+def plan_workers(running, queued, target_wait, max_workers):
+    """Returns the fewest workers, up to max_workers, on which every
+    queued build starts within target_wait seconds of being queued.
+
+    running holds the seconds left for each running build, and queued
+    a (duration, seconds already waited) pair for each queued build.
+    """
+    queued = [(duration, max(target_wait - waited, 0)) for duration, waited in queued]
+    workers = len(running) or (1 if queued else 0)
+    while workers < max_workers and not starts_in_time(running, queued, workers):
+        workers += 1
+    return workers
+
+
+class ScalingPolicy(object):
+    """Chooses how many workers to run so queued builds start within a
+    target wait.
+
+    Workers are added as soon as the target would be missed, but only
+    removed once fewer workers would meet a target `hysteresis` times
+    tighter, and have done so for `cooldown` seconds. That keeps a
+    burst of builds from starting and stopping workers every minute.
+    """
+
+    def __init__(self, target_wait, hysteresis, cooldown, last_busy=None):
+        self.target_wait = target_wait
+        self.hysteresis = hysteresis
+        self.cooldown = cooldown
+        # When the running workers were last all needed
+        self.last_busy = last_busy
+
+    def target_workers(self, running, queued, workers, max_workers, now):
+        scale_up = plan_workers(running, queued, self.target_wait, max_workers)
+        scale_down = plan_workers(
+            running, queued, self.target_wait * (1 - self.hysteresis), max_workers
+        )
+        if scale_down >= workers or self.last_busy is None:
+            self.last_busy = now
+        if scale_up > workers:
+            return scale_up
+        if scale_down < workers and now - self.last_busy >= self.cooldown:
+            return scale_down
+        return workers
+
+
+def estimate_durations(plan_ids):
+    """Returns the median seconds recent builds of each plan ran for.
+    Plans without finished builds are estimated from the default."""
+    Build = apps.get_model("build.Build")
+    durations = {}
+    for plan_id in plan_ids:
+        key = f"metaci:plan-duration:{plan_id}"
+        duration = cache.get(key)
+        if duration is None:
+            builds = (
+                Build.objects.filter(
+                    plan_id=plan_id,
+                    current_rebuild__isnull=True,
+                    effective_status__in=["success", "fail", "qa"],
+                    time_start__isnull=False,
+                    time_end__isnull=False,
+                )
+                .order_by("-time_queue")
+                .values_list("time_start", "time_end")
+            )[: settings.METACI_AUTOSCALER_HISTORY]
+            seconds = [(end - start).total_seconds() for start, end in builds]
+            duration = (
+                statistics.median(seconds)
+                if seconds
+                else settings.METACI_AUTOSCALER_DEFAULT_DURATION
+            )
+            cache.set(key, duration, settings.METACI_AUTOSCALER_HISTORY_TIMEOUT)
+        durations[plan_id] = duration
+    return durations
+
+
+class PredictiveAutoscaler(Autoscaler):
+    """Sizes the workers from how long the queued and running builds are
+    likely to take, judging by recent builds of their plans, so queued
+    builds start within a target wait.
+
+    The config may set target_wait, hysteresis and scale_down_cooldown
+    (see ScalingPolicy); they default to the METACI_AUTOSCALER settings.
+    Mix it in ahead of the autoscaler for the platform.
+    """
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.policy = ScalingPolicy(
+            config.get("target_wait", settings.METACI_AUTOSCALER_TARGET_WAIT),
+            config.get("hysteresis", settings.METACI_AUTOSCALER_HYSTERESIS),
+            config.get(
+                "scale_down_cooldown", settings.METACI_AUTOSCALER_SCALE_DOWN_COOLDOWN
+            ),
+        )
+        self.last_busy_key = "metaci:autoscaler:last-busy:" + ",".join(
+            queue.name for queue in self.queues
+        )
+
+    def measure(self):
+        running, queued = self.get_pending_work()
+        builds = {queue.name: self.count_builds(queue) for queue in self.queues}
+        self.active_builds = sum(builds.values())
+        # Reserve workers are only for high-priority builds
+        max_workers = self.max_workers
+        if not builds.get("high"):
+            max_workers -= self.worker_reserve
+
+        now = time.time()
+        self.policy.last_busy = cache.get(self.last_busy_key)
+        self.target_workers = self.policy.target_workers(
+            running, queued, self.count_workers(), max_workers, now
+        )
+        cache.set(self.last_busy_key, self.policy.last_busy, None)
+
+    def get_pending_work(self):
+        """Returns the seconds left for each running build, and a (duration,
+        seconds waited) pair for each queued build.
+
+        Only the first METACI_AUTOSCALER_LOOKAHEAD jobs of each queue are
+        fetched, so a long queue doesn't slow down every autoscaling run.
+        """
+        now = datetime.utcnow()
+        lookahead = settings.METACI_AUTOSCALER_LOOKAHEAD
+        started = []
+        queued = []
+        for queue in self.queues:
+            started_ids = StartedJobRegistry(queue=queue).get_job_ids(0, lookahead - 1)
+            queued_ids = queue.get_job_ids(0, lookahead)
+            jobs = Job.fetch_many(started_ids + queued_ids, connection=queue.connection)
+            started.extend(job for job in jobs[: len(started_ids)] if job is not None)
+            queued.extend(job for job in jobs[len(started_ids) :] if job is not None)
+
+        def build_id(job):
+            if job.func_name.endswith(".run_build") and job.args:
+                return job.args[0]
+
+        Build = apps.get_model("build.Build")
+        build_ids = [build_id(job) for job in started + queued]
+        plan_ids = dict(
+            Build.objects.filter(
+                id__in=[pk for pk in build_ids if pk is not None]
+            ).values_list("id", "plan_id")
+        )
+        durations = estimate_durations(set(plan_ids.values()))
+
+        def estimate(job):
+            plan_id = plan_ids.get(build_id(job))
+            if plan_id is None:
+                return settings.METACI_AUTOSCALER_DEFAULT_DURATION
+            return durations[plan_id]
+
+        running = [
+            # A build running longer than usual is assumed to finish soon
+            max(estimate(job) - (now - (job.started_at or now)).total_seconds(), 60)
+            for job in started
+        ]
+        queued = [
+            (estimate(job), (now - (job.enqueued_at or now)).total_seconds())
+            for job in sorted(queued, key=lambda job: job.enqueued_at or now)
+        ]
+        return running, queued
+
+    def scale(self):
+        if not self.active_builds and self.target_workers:
+            # Keep the idle workers until the scale-down cooldown is over
+            return
+        super().scale()
+
+
+class PredictiveLocalAutoscaler(PredictiveAutoscaler, LocalAutoscaler):
+    """Predictive scaling of local rqworker subprocesses."""
+
+
+class PredictiveHerokuAutoscaler(PredictiveAutoscaler, HerokuAutoscaler):
+    """Predictive scaling of Heroku worker dynos."""
+
+
 def get_autoscaler(app_name):
     """Fetches the appropriate autoscaler given the app name"""
     autoscaler_class = import_global(settings.METACI_WORKER_AUTOSCALER)
@@ -31,6 +31,7 @@ class BuildRelatedFilter(filters.FilterSet):
         fields = {
             "commit": ["exact"],
             "status": ["exact"],
+            "effective_status": ["exact"],
             "time_queue": ["gt", "lt"],
             "time_start": ["gt", "lt"],
             "time_end": ["gt", "lt"],
@@ -17,8 +17,10 @@ logger = logging.getLogger("cumulusci")
 class MetaCIFlowCallback(FlowCallback):
     """An implementation of FlowCallback that logs task execution to the database."""
 
-    def __init__(self, buildflow_id):
+    def __init__(self, buildflow_id, test_outcomes=None):
         self.buildflow_id = buildflow_id
+        # Counter for the outcomes of imported robot test results
+        self.test_outcomes = test_outcomes
 
     def pre_task(self, step):
         flowtask = FlowTask.objects.find_task(
@@ -48,7 +50,9 @@ class MetaCIFlowCallback(FlowCallback):
         flowtask.save()
         if "robot_outputdir" in result.return_values:
             test_results = import_robot_test_results(
-                flowtask, result.return_values["robot_outputdir"]
+                flowtask,
+                result.return_values["robot_outputdir"],
+                outcomes=self.test_outcomes,
             )
             if settings.METACI_RESULT_EXPORT_ENABLED:
                 try:
@@ -2,7 +2,7 @@ from django.conf import settings
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
-from metaci.build.models import Build, Rebuild
+from metaci.build.models import Build, BuildTestSummary, Rebuild
 from metaci.build.tasks import check_queued_build, set_github_status
 
 
@@ -39,6 +39,8 @@ def queue_rebuild(sender, **kwargs):
         return
 
     build.current_rebuild = rebuild
+    # The build's test summary described the flows being replaced
+    BuildTestSummary.objects.filter(build=build).delete()
 
     # Queue the pending status task
     if settings.GITHUB_STATUS_UPDATES_ENABLED:
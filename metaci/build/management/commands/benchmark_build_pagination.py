@@ -0,0 +1,80 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import transaction
+
+from metaci import conftest as fact
+from metaci.build.models import Build
+from metaci.build.utils import BUILD_KEYSET, encode_cursor, get_keyset_page
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the latency of the first and a deep page of the build list "
+        "with OFFSET and keyset pagination. All rows are rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--builds", type=int, default=250000, help="Number of builds to generate"
+        )
+        parser.add_argument("--per-page", type=int, default=25, help="Page size")
+        parser.add_argument(
+            "--page", type=int, default=10000, help="Deep page number to fetch"
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=5, help="Times to fetch each page"
+        )
+
+    def handle(self, *args, **options):
+        per_page = options["per_page"]
+        pages = [1, min(options["page"], options["builds"] // per_page)]
+        with transaction.atomic():
+            self.create_builds(options["builds"])
+            builds = Build.objects.order_by(*BUILD_KEYSET)
+
+            for page_number in pages:
+                offset = (page_number - 1) * per_page
+                cursor = None
+                if offset:
+                    key = builds.values_list("time_queue", "id")[offset - 1]
+                    cursor = encode_cursor(list(key))
+
+                elapsed = self.time(
+                    options["repeat"],
+                    lambda: list(Paginator(builds, per_page).page(page_number)),
+                )
+                self.stdout.write(f"offset page {page_number}: {elapsed:.1f}ms")
+                elapsed = self.time(
+                    options["repeat"],
+                    lambda: get_keyset_page(builds, BUILD_KEYSET, per_page, cursor),
+                )
+                self.stdout.write(f"keyset page {page_number}: {elapsed:.1f}ms")
+            transaction.set_rollback(True)
+
+    def create_builds(self, count):
+        build = fact.BuildFactory()
+        fields = {
+            "repo_id": build.repo_id,
+            "plan_id": build.plan_id,
+            # An instance, so Build.__init__ doesn't look the plan repo up
+            "planrepo": build.planrepo,
+            "branch_id": build.branch_id,
+            "org_id": build.org_id,
+            "commit": build.commit,
+            "status": "success",
+            "effective_status": "success",
+        }
+        Build.objects.bulk_create(
+            (Build(**fields) for _ in range(count - 1)), batch_size=5000
+        )
+
+    def time(self, repeat, fetch):
+        """Returns the median milliseconds fetch takes"""
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fetch()
+            timings.append((time.perf_counter() - start) * 1000)
+        return sorted(timings)[len(timings) // 2]
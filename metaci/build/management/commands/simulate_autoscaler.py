@@ -0,0 +1,204 @@
+import datetime
+import heapq
+import itertools
+import statistics
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from metaci.build.autoscaling import ScalingPolicy
+from metaci.build.traces import (
+    percentile,
+    read_arrivals,
+    record_arrivals,
+    write_arrivals,
+)
+
+# Kinds of simulated events, in the order they're handled at the same time
+FINISH, BOOT, ARRIVE, TICK = range(4)
+
+
+def simulate(
+    arrivals,
+    choose_workers,
+    interval,
+    boot_seconds,
+    history,
+    default,
+    stop_idle_workers=False,
+):
+    """Replays the arrivals onto workers which are scaled every interval
+    seconds by choose_workers(running, queued, workers, now), and take
+    boot_seconds to start. Build durations are estimated from the last
+    history builds of each plan which finished in the simulation.
+
+    Like Heroku dynos, workers are only stopped once no builds are
+    running or queued, unless stop_idle_workers is set.
+
+    Returns the seconds each build waited to start, and the seconds
+    workers were running for in total.
+    """
+    events = []
+    order = itertools.count()
+
+    def push(at, kind, data=None):
+        heapq.heappush(events, (at, kind, next(order), data))
+
+    for arrival in arrivals:
+        push(arrival.seconds, ARRIVE, arrival)
+    push(0, TICK)
+
+    durations = defaultdict(list)
+    queue = []
+    running = []  # (arrival, start) of running builds
+    idle = booting = 0
+    unfinished = len(arrivals)
+    waits = []
+    worker_seconds = 0
+    last = 0
+
+    def plan_key(arrival):
+        return arrival.plan or f"{arrival.repo} {arrival.role}"
+
+    def estimate(arrival):
+        seen = durations[plan_key(arrival)][-history:]
+        return statistics.median(seen) if seen else default
+
+    while events:
+        now, kind, _, data = heapq.heappop(events)
+        worker_seconds += (idle + booting + len(running)) * (now - last)
+        last = now
+
+        if kind == FINISH:
+            running.remove(data)
+            idle += 1
+            unfinished -= 1
+            durations[plan_key(data[0])].append(data[0].duration)
+        elif kind == BOOT:
+            booting -= 1
+            idle += 1
+        elif kind == ARRIVE:
+            queue.append(data)
+        else:
+            workers = idle + booting + len(running)
+            target = choose_workers(
+                [max(estimate(a) - (now - start), 60) for a, start in running],
+                [(estimate(a), now - a.seconds) for a in queue],
+                workers,
+                now,
+            )
+            if target > workers:
+                booting += target - workers
+                for _ in range(target - workers):
+                    push(now + boot_seconds, BOOT)
+            elif target < workers and (stop_idle_workers or not running + queue):
+                idle -= min(idle, workers - target)
+            if unfinished or idle + booting:
+                push(now + interval, TICK)
+
+        while idle and queue:
+            arrival = queue.pop(0)
+            idle -= 1
+            waits.append(now - arrival.seconds)
+            running.append((arrival, now))
+            push(now + arrival.duration, FINISH, (arrival, now))
+    return waits, worker_seconds
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays a day of build arrivals against the autoscalers, comparing "
+        "how long builds wait and how many worker hours are used when "
+        "workers are scaled by queue length and by predicted build time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date", help="Day of builds to replay from the database (YYYY-MM-DD)"
+        )
+        parser.add_argument(
+            "--file", help="CSV of arrivals (seconds, repo, role, duration, plan)"
+        )
+        parser.add_argument("--record", help="Write the replayed arrivals to a CSV")
+        parser.add_argument(
+            "--max-workers", type=int, default=settings.METACI_MAX_WORKERS
+        )
+        parser.add_argument(
+            "--interval", type=int, default=60, help="Seconds between scalings"
+        )
+        parser.add_argument(
+            "--boot-seconds",
+            type=int,
+            default=60,
+            help="Seconds a worker takes to start",
+        )
+        parser.add_argument(
+            "--target-wait", type=int, default=settings.METACI_AUTOSCALER_TARGET_WAIT
+        )
+        parser.add_argument(
+            "--hysteresis", type=float, default=settings.METACI_AUTOSCALER_HYSTERESIS
+        )
+        parser.add_argument(
+            "--stop-idle-workers",
+            action="store_true",
+            help="Stop idle workers while other builds run (Heroku can't)",
+        )
+        parser.add_argument(
+            "--cooldown",
+            type=int,
+            default=settings.METACI_AUTOSCALER_SCALE_DOWN_COOLDOWN,
+            help="Seconds workers must be surplus before they are stopped",
+        )
+
+    def handle(self, *args, **options):
+        if options["file"]:
+            arrivals = read_arrivals(options["file"])
+        elif options["date"]:
+            date = datetime.date.fromisoformat(options["date"])
+            arrivals = record_arrivals(date)
+        else:
+            raise CommandError("Pass --date or --file with the arrivals to replay")
+        if options["record"]:
+            write_arrivals(options["record"], arrivals)
+        if not arrivals:
+            raise CommandError("There are no arrivals to replay")
+
+        max_workers = options["max_workers"]
+        target_wait = options["target_wait"]
+        policy = ScalingPolicy(target_wait, options["hysteresis"], options["cooldown"])
+        policies = (
+            (
+                "Queue length",
+                lambda running, queued, workers, now: min(
+                    len(running) + len(queued), max_workers
+                ),
+            ),
+            (
+                "Predictive",
+                lambda running, queued, workers, now: policy.target_workers(
+                    running, queued, workers, max_workers, now
+                ),
+            ),
+        )
+        self.stdout.write(
+            f"Replaying {len(arrivals)} builds onto at most {max_workers} workers"
+        )
+        for label, choose_workers in policies:
+            waits, worker_seconds = simulate(
+                arrivals,
+                choose_workers,
+                options["interval"],
+                options["boot_seconds"],
+                settings.METACI_AUTOSCALER_HISTORY,
+                settings.METACI_AUTOSCALER_DEFAULT_DURATION,
+                options["stop_idle_workers"],
+            )
+            missed = sum(wait > target_wait for wait in waits) / len(waits)
+            self.stdout.write(
+                f"{label}: waited {statistics.mean(waits) / 60:.1f} min on average, "
+                f"{percentile(waits, 95) / 60:.1f} min at p95, "
+                f"{max(waits) / 60:.1f} min at most; "
+                f"{missed:.0%} of builds missed the target wait; "
+                f"{worker_seconds / 3600:.1f} worker hours"
+            )
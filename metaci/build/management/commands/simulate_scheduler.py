@@ -0,0 +1,116 @@
+import datetime
+import heapq
+import statistics
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from metaci.build.scheduler import Candidate, plan_dispatch
+from metaci.build.traces import (
+    percentile,
+    read_arrivals,
+    record_arrivals,
+    write_arrivals,
+)
+from metaci.repository.models import Repository
+
+
+def simulate(arrivals, slots, fair_share, repo_settings):
+    """Replays the arrivals onto the worker slots, dispatching builds in
+    arrival order or with the fair-share scheduler.
+    Returns the seconds each repository's builds waited for a slot."""
+    arrivals = sorted(arrivals)
+    finishing = []  # heap of (end, repo) for running builds
+    running = Counter()
+    pending = []
+    waits = defaultdict(list)
+    next_arrival = 0
+    while next_arrival < len(arrivals) or pending:
+        arrival_time = (
+            arrivals[next_arrival].seconds
+            if next_arrival < len(arrivals)
+            else float("inf")
+        )
+        if finishing and finishing[0][0] <= arrival_time:
+            now, repo = heapq.heappop(finishing)
+            running[repo] -= 1
+        else:
+            now = arrival_time
+            arrival = arrivals[next_arrival]
+            weight, limit = repo_settings.get(arrival.repo, (1, None))
+            pending.append(
+                Candidate(next_arrival, arrival.repo, arrival.role, now, weight, limit)
+            )
+            next_arrival += 1
+
+        if fair_share:
+            dispatched = [
+                decision.candidate
+                for decision in plan_dispatch(pending, running, slots, now)
+                if decision.dispatch
+            ]
+        else:
+            dispatched = pending[: max(slots - sum(running.values()), 0)]
+        for candidate in dispatched:
+            pending.remove(candidate)
+            running[candidate.repo] += 1
+            waits[candidate.repo].append(now - candidate.time_submitted)
+            end = now + arrivals[candidate.key].duration
+            heapq.heappush(finishing, (end, candidate.repo))
+    return waits
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays a day of build arrivals onto the worker slots, comparing "
+        "how long each repository's builds wait for a slot when builds are "
+        "dispatched in arrival order and by the fair-share scheduler."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date", help="Day of builds to replay from the database (YYYY-MM-DD)"
+        )
+        parser.add_argument(
+            "--file", help="CSV of arrivals (seconds, repo, role, duration, plan)"
+        )
+        parser.add_argument("--record", help="Write the replayed arrivals to a CSV")
+        parser.add_argument(
+            "--slots",
+            type=int,
+            default=settings.METACI_SCHEDULER_SLOTS or settings.METACI_MAX_WORKERS,
+            help="Number of worker slots",
+        )
+
+    def handle(self, *args, **options):
+        if options["file"]:
+            arrivals = read_arrivals(options["file"])
+        elif options["date"]:
+            date = datetime.date.fromisoformat(options["date"])
+            arrivals = record_arrivals(date)
+        else:
+            raise CommandError("Pass --date or --file with the arrivals to replay")
+        if options["record"]:
+            write_arrivals(options["record"], arrivals)
+        if options["slots"] < 1:
+            raise CommandError("There must be at least one slot")
+
+        repo_settings = {
+            str(repo): (repo.build_weight, repo.max_concurrent_builds)
+            for repo in Repository.objects.all()
+        }
+        self.stdout.write(
+            f"Replaying {len(arrivals)} builds onto {options['slots']} slots"
+        )
+        for label, fair_share in (("Arrival order", False), ("Fair share", True)):
+            waits = simulate(arrivals, options["slots"], fair_share, repo_settings)
+            self.stdout.write(f"\n{label}:")
+            all_waits = [wait for repo_waits in waits.values() for wait in repo_waits]
+            for repo, repo_waits in sorted(waits.items()) + [("all", all_waits)]:
+                self.stdout.write(
+                    f"  {repo}: {len(repo_waits)} builds, waited "
+                    f"{statistics.mean(repo_waits) / 60:.1f} min on average, "
+                    f"{percentile(repo_waits, 95) / 60:.1f} min at p95, "
+                    f"{max(repo_waits) / 60:.1f} min at most"
+                )
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.16 on 2026-10-18 14:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("build", "0036_update_jsonfield"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BuildTestSummary",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "build",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="test_summary",
+                        to="build.build",
+                    ),
+                ),
+                (
+                    "rebuild",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="build.rebuild",
+                    ),
+                ),
+                ("summary", models.JSONField()),
+                ("time_updated", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,115 @@
+# Generated by Django 3.2.16 on 2026-10-18 15:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from metaci.utils import split_seq
+
+LOG_MODELS = (
+    ("Build", "BuildLogChunk", "build"),
+    ("BuildFlow", "BuildFlowLogChunk", "build_flow"),
+)
+
+
+def copy_logs_to_chunks(apps, schema_editor):
+    for model_name, chunk_model_name, fk_name in LOG_MODELS:
+        Model = apps.get_model("build", model_name)
+        Chunk = apps.get_model("build", chunk_model_name)
+        logs = (
+            Model.objects.exclude(log__isnull=True)
+            .exclude(log="")
+            .order_by("id")
+            .values_list("id", "log")
+            .iterator(chunk_size=100)
+        )
+        for batch in split_seq(logs, 100):
+            Chunk.objects.bulk_create(
+                Chunk(**{f"{fk_name}_id": pk, "text": log}) for pk, log in batch
+            )
+
+
+def copy_chunks_to_logs(apps, schema_editor):
+    for model_name, chunk_model_name, fk_name in LOG_MODELS:
+        Model = apps.get_model("build", model_name)
+        Chunk = apps.get_model("build", chunk_model_name)
+        owner_ids = (
+            Chunk.objects.order_by().values_list(f"{fk_name}_id", flat=True).distinct()
+        )
+        for owner_id in owner_ids.iterator():
+            log = "".join(
+                Chunk.objects.filter(**{f"{fk_name}_id": owner_id})
+                .order_by("id")
+                .values_list("text", flat=True)
+            )
+            Model.objects.filter(id=owner_id).update(log=log)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("build", "0037_buildtestsummary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BuildLogChunk",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("text", models.TextField()),
+                (
+                    "build",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="log_chunks",
+                        to="build.build",
+                    ),
+                ),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="BuildFlowLogChunk",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("text", models.TextField()),
+                (
+                    "build_flow",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="log_chunks",
+                        to="build.buildflow",
+                    ),
+                ),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+        migrations.RunPython(copy_logs_to_chunks, copy_chunks_to_logs),
+        migrations.RemoveField(
+            model_name="build",
+            name="log",
+        ),
+        migrations.RemoveField(
+            model_name="buildflow",
+            name="log",
+        ),
+    ]
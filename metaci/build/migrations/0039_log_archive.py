@@ -0,0 +1,33 @@
+# Generated by Django 3.2.16 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+import metaci.build.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("build", "0038_log_chunks"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="build",
+            name="log_archive",
+            field=models.FileField(
+                blank=True,
+                null=True,
+                upload_to=metaci.build.models.log_archive_upload_to,
+            ),
+        ),
+        migrations.AddField(
+            model_name="buildflow",
+            name="log_archive",
+            field=models.FileField(
+                blank=True,
+                null=True,
+                upload_to=metaci.build.models.log_archive_upload_to,
+            ),
+        ),
+    ]
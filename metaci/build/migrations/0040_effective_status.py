@@ -0,0 +1,68 @@
+# Generated by Django 3.2.16 on 2026-10-18 19:12
+
+from django.db import migrations, models
+
+SET_EFFECTIVE_STATUS = """
+UPDATE build_build
+SET effective_status = status, effective_time_end = time_end
+WHERE current_rebuild_id IS NULL;
+
+UPDATE build_build
+SET effective_status = build_rebuild.status,
+    effective_time_end = build_rebuild.time_end
+FROM build_rebuild
+WHERE build_build.current_rebuild_id = build_rebuild.id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("build", "0039_log_archive"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="build",
+            name="effective_status",
+            field=models.CharField(
+                choices=[
+                    ("queued", "Queued"),
+                    ("waiting", "Waiting"),
+                    ("running", "Running"),
+                    ("success", "Success"),
+                    ("error", "Error"),
+                    ("fail", "Failed"),
+                    ("qa", "QA Testing"),
+                ],
+                default="queued",
+                max_length=16,
+            ),
+        ),
+        migrations.AddField(
+            model_name="build",
+            name="effective_time_end",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunSQL(SET_EFFECTIVE_STATUS, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name="build",
+            index=models.Index(
+                fields=["repo", "plan", "effective_status", "-time_queue"],
+                name="build_repo_plan_status_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="build",
+            index=models.Index(
+                fields=["plan", "effective_status", "-time_queue"],
+                name="build_plan_status_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="build",
+            index=models.Index(
+                fields=["effective_status", "-time_queue"], name="build_status_idx"
+            ),
+        ),
+    ]
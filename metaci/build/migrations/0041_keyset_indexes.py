@@ -0,0 +1,23 @@
+# Generated by Django 3.2.16 on 2026-10-18 20:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("build", "0040_effective_status"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="build",
+            index=models.Index(fields=["-time_queue", "-id"], name="build_keyset_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="buildflow",
+            index=models.Index(
+                fields=["-time_queue", "-id"], name="buildflow_keyset_idx"
+            ),
+        ),
+    ]
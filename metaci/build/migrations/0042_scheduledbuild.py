@@ -0,0 +1,47 @@
+# Generated by Django 3.2.16 on 2026-10-18 21:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("build", "0041_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScheduledBuild",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("lock_id", models.CharField(blank=True, max_length=255, null=True)),
+                ("time_submitted", models.DateTimeField(auto_now_add=True)),
+                ("time_dispatched", models.DateTimeField(blank=True, null=True)),
+                ("score", models.FloatField(blank=True, null=True)),
+                (
+                    "decision",
+                    models.CharField(blank=True, default="", max_length=255),
+                ),
+                (
+                    "build",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="scheduled",
+                        to="build.build",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["time_submitted"],
+            },
+        ),
+    ]
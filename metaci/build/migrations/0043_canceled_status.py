@@ -0,0 +1,67 @@
+# Generated by Django 3.2.16 on 2026-10-18 22:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("build", "0042_scheduledbuild"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="build",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("queued", "Queued"),
+                    ("waiting", "Waiting"),
+                    ("running", "Running"),
+                    ("success", "Success"),
+                    ("error", "Error"),
+                    ("fail", "Failed"),
+                    ("qa", "QA Testing"),
+                    ("canceled", "Canceled"),
+                ],
+                default="queued",
+                max_length=16,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="build",
+            name="effective_status",
+            field=models.CharField(
+                choices=[
+                    ("queued", "Queued"),
+                    ("waiting", "Waiting"),
+                    ("running", "Running"),
+                    ("success", "Success"),
+                    ("error", "Error"),
+                    ("fail", "Failed"),
+                    ("qa", "QA Testing"),
+                    ("canceled", "Canceled"),
+                ],
+                default="queued",
+                max_length=16,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="rebuild",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("queued", "Queued"),
+                    ("waiting", "Waiting"),
+                    ("running", "Running"),
+                    ("success", "Success"),
+                    ("error", "Error"),
+                    ("fail", "Failed"),
+                    ("qa", "QA Testing"),
+                    ("canceled", "Canceled"),
+                ],
+                default="queued",
+                max_length=16,
+            ),
+        ),
+    ]
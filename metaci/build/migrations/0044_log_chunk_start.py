@@ -0,0 +1,46 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:40
+
+from django.db import migrations, models
+
+SET_CHUNK_STARTS = """
+UPDATE build_buildlogchunk
+SET start = starts.start
+FROM (
+    SELECT id, SUM(LENGTH(text)) OVER (
+        PARTITION BY build_id ORDER BY id
+    ) - LENGTH(text) AS start
+    FROM build_buildlogchunk
+) starts
+WHERE build_buildlogchunk.id = starts.id;
+
+UPDATE build_buildflowlogchunk
+SET start = starts.start
+FROM (
+    SELECT id, SUM(LENGTH(text)) OVER (
+        PARTITION BY build_flow_id ORDER BY id
+    ) - LENGTH(text) AS start
+    FROM build_buildflowlogchunk
+) starts
+WHERE build_buildflowlogchunk.id = starts.id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("build", "0043_canceled_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="buildlogchunk",
+            name="start",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="buildflowlogchunk",
+            name="start",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunSQL(SET_CHUNK_STARTS, migrations.RunSQL.noop),
+    ]
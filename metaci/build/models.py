@@ -1,3 +1,4 @@
+import gzip
 import json
 import os
 import shutil
@@ -5,8 +6,10 @@ import sys
 import tempfile
 import traceback
 import zipfile
+from collections import Counter
 from glob import iglob
 from io import BytesIO
+from itertools import chain
 
 from cumulusci import __version__ as cumulusci_version
 from cumulusci.core.config import FAILED_TO_CREATE_SCRATCH_ORG
@@ -18,19 +21,23 @@ from cumulusci.core.exceptions import (
 )
 from cumulusci.core.flowrunner import FlowCoordinator
 from cumulusci.salesforce_api.exceptions import MetadataComponentFailure
-from cumulusci.utils import elementtree_parse_file
 from django.apps import apps
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
+from django.core.files.base import ContentFile
 from django.core.serializers.json import DjangoJSONEncoder
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Subquery
+from django.db.models.functions import Coalesce, Length
 from django.http import Http404
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils import timezone
 from jinja2.sandbox import ImmutableSandboxedEnvironment
+from watson import search as watson
 
 from metaci.build.tasks import set_github_status
-from metaci.build.utils import format_log, set_build_info
+from metaci.build.utils import log_window_start, render_log_html, set_build_info
 from metaci.cumulusci.config import MetaCIUniversalConfig
 from metaci.cumulusci.keychain import MetaCIProjectKeychain
 from metaci.cumulusci.logger import init_logger
@@ -38,7 +45,8 @@ from metaci.release.utils import (
     send_start_webhook,
     send_stop_webhook,
 )
-from metaci.testresults.importer import import_test_results
+from metaci.testresults.importer import import_test_results, iter_junit_results
+from metaci.testresults.models import FAIL_OUTCOMES, TestResult, count_outcomes
 from metaci.utils import generate_hash
 
 BUILD_STATUSES = (
@@ -49,6 +57,7 @@ BUILD_STATUSES = (
     ("error", "Error"),
     ("fail", "Failed"),
     ("qa", "QA Testing"),
+    ("canceled", "Canceled"),
 )
 BUILD_FLOW_STATUSES = (
     ("queued", "Queued"),
@@ -57,6 +66,9 @@ BUILD_FLOW_STATUSES = (
     ("error", "Error"),
     ("fail", "Failed"),
 )
+# Statuses after which a build or build flow is done running
+FINISHED_STATUSES = ("success", "fail", "error", "qa", "canceled")
+FINISHED_FLOW_STATUSES = ("success", "fail", "error")
 FLOW_TASK_STATUSES = (
     ("initializing", "Initializing"),
     ("running", "Running"),
@@ -82,6 +94,9 @@ FAIL_EXCEPTIONS = (
     RobotTestFailure,
 )
 
+# Longest message or stacktrace kept for a failing test in a BuildTestSummary
+SUMMARY_TEXT_LENGTH = 2000
+
 jinja2_env = ImmutableSandboxedEnvironment()
 
 
@@ -99,10 +114,10 @@ class BuildQuerySet(models.QuerySet):
     def for_user(self, user, perms=None):
         if user.is_superuser:
             return self
-        if perms is None:
-            perms = "plan.view_builds"
         PlanRepository = apps.get_model("plan.PlanRepository")
-        return self.filter(planrepo__in=PlanRepository.objects.for_user(user, perms))
+        return self.filter(
+            planrepo_id__in=PlanRepository.objects.ids_for_user(user, perms)
+        )
 
     def get_for_user_or_404(self, user, query, perms=None):
         try:
@@ -111,7 +126,312 @@ class BuildQuerySet(models.QuerySet):
             raise Http404
 
 
-class Build(models.Model):
+def snapshot_value(field, value):
+    # Values are compared as they'd be saved (e.g. JSON as its encoded text),
+    # as copying them could copy whole model instances or fail outright
+    return field.get_prep_value(value)
+
+
+class DirtyFieldsMixin:
+    """Saves only the columns that changed since the instance was loaded
+    or last saved.
+
+    A save() without update_fields on an existing row becomes an UPDATE
+    of the modified columns, so processes updating different fields of
+    the same row don't overwrite each other's changes. If nothing has
+    changed, no query is made.
+    """
+
+    _field_snapshot = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Snapshot the loaded values rather than the instance, in case
+        # __init__ changed anything which still needs to be saved
+        fields = {field.attname: field for field in cls._meta.concrete_fields}
+        pk_attname = cls._meta.pk.attname
+        instance._field_snapshot = {
+            attname: snapshot_value(fields[attname], value)
+            for attname, value in zip(field_names, values)
+            if attname != pk_attname and value is not models.DEFERRED
+        }
+        return instance
+
+    def _take_field_snapshot(self, fields=None):
+        snapshot = {
+            field.attname: snapshot_value(field, self.__dict__[field.attname])
+            for field in self._meta.concrete_fields
+            if not field.primary_key
+            and field.attname in self.__dict__
+            and (fields is None or field.name in fields or field.attname in fields)
+        }
+        if fields is None or self._field_snapshot is None:
+            self._field_snapshot = snapshot
+        else:
+            self._field_snapshot.update(snapshot)
+
+    def get_dirty_fields(self):
+        """Returns the names of fields changed since the last snapshot."""
+        snapshot = self._field_snapshot or {}
+        return [
+            field.name
+            for field in self._meta.concrete_fields
+            if not field.primary_key
+            and field.attname in self.__dict__
+            and (
+                field.attname not in snapshot
+                or snapshot[field.attname]
+                != snapshot_value(field, self.__dict__[field.attname])
+            )
+        ]
+
+    def save(self, *args, **kwargs):
+        if (
+            self._field_snapshot is not None
+            and not self._state.adding
+            and not args
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+        ):
+            kwargs["update_fields"] = self.get_dirty_fields()
+        super().save(*args, **kwargs)
+        self._take_field_snapshot(kwargs.get("update_fields"))
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self._take_field_snapshot(fields)
+
+
+class SearchIndexMixin:
+    """Keeps the watson search index entry of a model up to date only when
+    a save touches one of its `search_fields`.
+
+    Saves limited to other fields, like status changes, skip the index
+    update and the queries it makes.
+    """
+
+    search_fields = ()
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        indexed = {name.split("__")[0] for name in self.search_fields}
+        if update_fields is not None and indexed.isdisjoint(update_fields):
+            with watson.skip_index_update():
+                return super().save(*args, **kwargs)
+        return super().save(*args, **kwargs)
+
+
+class ChunkedLogMixin:
+    """Stores a model's log as append-only chunks rather than in one column.
+
+    Appending writes a single small row however long the log is. Reading
+    `log` joins the chunks in one query and caches the result. Assigning
+    to `log` keeps working: text added to the end of the current log is
+    appended, anything else replaces the stored chunks.
+
+    Once a build is long finished, archive_log() moves the chunks into a
+    compressed file in storage, referenced by the `log_archive` field.
+    """
+
+    _log = None  # the assembled log, once loaded
+    _log_pending = ()
+    _log_reset = False
+    _log_archive_text = None  # (file name, text) of the archive, once loaded
+
+    @property
+    def log(self):
+        if self._log is None:
+            if self.pk is None:
+                self._log = ""
+            else:
+                self._log = self.read_log_archive() + "".join(self._read_log_chunks())
+        return self._log
+
+    @log.setter
+    def log(self, value):
+        value = value or ""
+        current = self.log
+        if value.startswith(current):
+            if len(value) > len(current):
+                self.append_log(value[len(current) :])
+        else:
+            self._log_reset = True
+            self._log_pending = [value] if value else []
+            self._log = value
+
+    def _read_log_chunks(self):
+        prefetched = getattr(self, "_prefetched_objects_cache", {})
+        if "log_chunks" in prefetched:
+            # Prefetched in order for a list of builds or flows
+            return [chunk.text for chunk in prefetched["log_chunks"]]
+        return self.log_chunks.order_by("id").values_list("text", flat=True)
+
+    def _forget_log_chunks(self):
+        getattr(self, "_prefetched_objects_cache", {}).pop("log_chunks", None)
+
+    def append_log(self, text):
+        """Adds text to the end of the log. It is stored on the next
+        save() or store_log()."""
+        if not self._log_pending:
+            self._log_pending = []
+        self._log_pending.append(text)
+        if self._log is not None:
+            self._log += text
+
+    def read_log(self, offset=0, limit=None):
+        """Returns up to `limit` characters of the stored log after
+        `offset` characters, and the offset of the end of that text.
+
+        Only the chunks holding the requested text are loaded. If `offset`
+        is past the end of the log (because it was replaced), the text is
+        returned from the start.
+        """
+        if self.log_archive:
+            # An archived log is finished, so it's read in one piece
+            log = self.read_log_archive() + "".join(
+                self.log_chunks.order_by("id").values_list("text", flat=True)
+            )
+            if offset > len(log):
+                offset = 0
+            end = len(log) if limit is None else offset + limit
+            text = log[offset:end]
+            return text, offset + len(text)
+
+        chunks = self.log_chunks.order_by("id")
+        # The text at the offset is in the last chunk starting before it
+        first = chunks.filter(start__lte=offset).values_list("id", "start").last()
+        if first is None:
+            return "", 0
+        first_id, start = first
+        chunks = chunks.filter(id__gte=first_id)
+        if limit is not None:
+            chunks = chunks.filter(start__lt=offset + limit)
+        text = "".join(chunks.values_list("text", flat=True))
+        if offset > start + len(text):
+            return self.read_log(0, limit)
+        text = text[offset - start :]
+        if limit is not None:
+            text = text[:limit]
+        return text, offset + len(text)
+
+    def get_log_html(self):
+        """Returns the log converted to html.
+
+        The html of finished logs is cached. Only the end of a log longer
+        than METACI_LOG_HTML_WINDOW is converted, after a link which loads
+        the earlier output from the log endpoint.
+        """
+        log = self.log
+        if not log:
+            return None
+        start = log_window_start(log)
+        log_html = render_log_html(log[start:], cache_html=self.is_finished())
+        if start:
+            log_html = (
+                render_to_string(
+                    "build/log_earlier.html",
+                    {
+                        "url": self.get_log_url(),
+                        "offset": start,
+                        "window": settings.METACI_LOG_HTML_WINDOW,
+                    },
+                )
+                + log_html
+            )
+        return log_html
+
+    def read_log_archive(self):
+        """Returns the text of the archived log, or "" if there isn't one."""
+        if not self.log_archive:
+            return ""
+        name = self.log_archive.name
+        if self._log_archive_text is None or self._log_archive_text[0] != name:
+            with self.log_archive.open("rb") as f:
+                text = gzip.decompress(f.read()).decode("utf-8")
+            self._log_archive_text = (name, text)
+        return self._log_archive_text[1]
+
+    def archive_log(self):
+        """Moves the stored log into a gzipped file in storage.
+
+        Text appended afterwards is stored in chunks again, and is
+        added to the archive if the log is archived again.
+        """
+        self.store_log()
+        chunks = list(self.log_chunks.order_by("id").values_list("id", "text"))
+        if not chunks:
+            return
+        old_archive = self.log_archive.name if self.log_archive else None
+        log = self.read_log_archive() + "".join(text for _, text in chunks)
+        self.log_archive.save(
+            f"{self.pk}.log.gz",
+            ContentFile(gzip.compress(log.encode("utf-8"))),
+            save=False,
+        )
+        with transaction.atomic():
+            type(self).objects.filter(pk=self.pk).update(
+                log_archive=self.log_archive.name
+            )
+            self.log_chunks.filter(id__in=[chunk_id for chunk_id, _ in chunks]).delete()
+        self._log = None
+        self._forget_log_chunks()
+        self._log_archive_text = (self.log_archive.name, log)
+        if old_archive:
+            self.log_archive.storage.delete(old_archive)
+
+    def delete_log_archive(self):
+        if self.log_archive:
+            self.log_archive.delete(save=False)
+            type(self).objects.filter(pk=self.pk).update(log_archive=None)
+
+    def store_log(self):
+        """Stores text appended to the log since it was last stored."""
+        if self.pk is None:
+            return
+        self._forget_log_chunks()
+        if self._log_reset:
+            self.log_chunks.all().delete()
+            self.delete_log_archive()
+            self._log_reset = False
+        if self._log_pending:
+            # The chunk starts where the last one ends, which the insert
+            # looks up itself so appending stays a single query
+            last_end = (
+                self.log_chunks.order_by("-id")
+                .annotate(end=F("start") + Length("text"))
+                .values("end")[:1]
+            )
+            self.log_chunks.create(
+                text="".join(self._log_pending),
+                start=Coalesce(Subquery(last_end), 0),
+            )
+            self._log_pending = ()
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.store_log()
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        if not self._log_pending and not self._log_reset:
+            self._log = None
+
+
+class LogChunk(models.Model):
+    text = models.TextField()
+    # Offset of the chunk's first character in the stored chunks
+    start = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+def log_archive_upload_to(instance, filename):
+    return os.path.join("logs", instance._meta.model_name, filename)
+
+
+class Build(DirtyFieldsMixin, SearchIndexMixin, ChunkedLogMixin, models.Model):
     repo = models.ForeignKey(
         "repository.Repository", related_name="builds", on_delete=models.CASCADE
     )
@@ -162,7 +482,9 @@ class Build(models.Model):
         blank=True,
         on_delete=models.SET_NULL,
     )
-    log = models.TextField(null=True, blank=True)
+    log_archive = models.FileField(
+        upload_to=log_archive_upload_to, null=True, blank=True
+    )
     exception = models.TextField(null=True, blank=True)
     error_message = models.TextField(null=True, blank=True)
     traceback = models.TextField(null=True, blank=True)
@@ -192,6 +514,12 @@ class Build(models.Model):
     time_end = models.DateTimeField(null=True, blank=True)
     time_qa_start = models.DateTimeField(null=True, blank=True)
     time_qa_end = models.DateTimeField(null=True, blank=True)
+    # Status and end time of the current rebuild, or of the build itself
+    # if it was never rebuilt, so lists can filter and sort on indexes
+    effective_status = models.CharField(
+        max_length=16, choices=BUILD_STATUSES, default="queued"
+    )
+    effective_time_end = models.DateTimeField(null=True, blank=True)
 
     build_type = models.CharField(max_length=16, choices=BUILD_TYPES, default="legacy")
     user = models.ForeignKey(
@@ -209,9 +537,35 @@ class Build(models.Model):
 
     objects = BuildQuerySet.as_manager()
 
+    search_fields = (
+        "repo__name",
+        "branch__name",
+        "plan__name",
+        "commit",
+        "commit_message",
+        "tag",
+        "exception",
+        "error_message",
+    )
+
     class Meta:
         ordering = ["-time_queue"]
         permissions = (("search_builds", "Search Builds"),)
+        indexes = [
+            models.Index(
+                fields=["repo", "plan", "effective_status", "-time_queue"],
+                name="build_repo_plan_status_idx",
+            ),
+            models.Index(
+                fields=["plan", "effective_status", "-time_queue"],
+                name="build_plan_status_idx",
+            ),
+            models.Index(
+                fields=["effective_status", "-time_queue"], name="build_status_idx"
+            ),
+            # Matches the keyset build lists are paginated by
+            models.Index(fields=["-time_queue", "-id"], name="build_keyset_idx"),
+        ]
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -219,8 +573,20 @@ class Build(models.Model):
 
     def save(self, *args, **kwargs):
         self._try_populate_planrepo()
+        self._set_effective_status()
         super().save(*args, **kwargs)
 
+    def _set_effective_status(self):
+        if self.current_rebuild_id is None:
+            build = self
+        elif Build.current_rebuild.is_cached(self):
+            build = self.current_rebuild
+        else:
+            # Rebuild.save keeps the columns in sync with the rebuild
+            return
+        self.effective_status = build.status
+        self.effective_time_end = build.time_end
+
     def _try_populate_planrepo(self):
         if self.plan_id and self.repo_id and not self.planrepo:
             PlanRepository = apps.get_model("plan.PlanRepository")
@@ -233,13 +599,51 @@ class Build(models.Model):
     def __str__(self):
         return f"{self.id}: {self.repo} - {self.commit}"
 
-    def get_log_html(self):
-        if self.log:
-            return format_log(self.log)
-
     def get_absolute_url(self):
         return reverse("build_detail", kwargs={"build_id": str(self.id)})
 
+    def get_log_url(self):
+        return reverse("build_log", kwargs={"build_id": str(self.id)})
+
+    def is_finished(self):
+        return self.get_status() in FINISHED_STATUSES
+
+    def get_superseding_build(self, running=False):
+        """Returns the latest build of a newer commit of the same plan
+        and branch, if the plan coalesces builds and this one should give
+        way to it. Running builds only give way if the plan also
+        coalesces running builds. Manual builds and rebuilds never do."""
+        plan = self.plan
+        if (
+            not plan.coalesce_builds
+            or (running and not plan.coalesce_running_builds)
+            # Stopping would leave the change traffic control record open
+            or (running and plan.change_traffic_control)
+            or self.build_type != "auto"
+            or self.current_rebuild_id
+        ):
+            return None
+        return (
+            Build.objects.filter(
+                repo_id=self.repo_id,
+                plan_id=self.plan_id,
+                branch_id=self.branch_id,
+                build_type="auto",
+                time_queue__gt=self.time_queue,
+            )
+            .exclude(commit=self.commit)
+            .order_by("-time_queue")
+            .first()
+        )
+
+    def cancel(self, superseded_by):
+        """Cancels the build in favor of a build of a newer commit."""
+        self.log = (self.log or "") + (
+            f"\nCanceled: superseded by build #{superseded_by.id} "
+            f"of commit {superseded_by.commit}\n"
+        )
+        set_build_info(self, status="canceled", time_end=timezone.now())
+
     def get_external_url(self):
         url = f"{settings.SITE_URL}{self.get_absolute_url()}"
         return url
@@ -299,6 +703,11 @@ class Build(models.Model):
         return os.environ.get("DYNO")
 
     def run(self):
+        superseded_by = self.get_superseding_build()
+        if superseded_by:
+            self.cancel(superseded_by)
+            return
+
         self.logger = init_logger(self)
         worker_str = f"in {self.worker_id}" if self.worker_id else ""
         self.logger.info(
@@ -357,6 +766,15 @@ class Build(models.Model):
         try:
             flows = [flow.strip() for flow in self.plan.flows.split(",")]
             for flow in flows:
+                superseded_by = self.get_superseding_build(running=True)
+                if superseded_by:
+                    self.flush_log()
+                    if org_config.created:
+                        self.delete_org(org_config)
+                    self.delete_build_dir()
+                    self.cancel(superseded_by)
+                    return
+
                 self.logger = init_logger(self)
                 self.logger.info(f"Running flow: {flow}")
                 self.save()
@@ -577,7 +995,55 @@ class Build(models.Model):
             self.save()
 
 
-class BuildFlow(models.Model):
+class BuildFlowQuerySet(models.QuerySet):
+    def test_counts(self):
+        """Sums the test counters of the flows in one query."""
+        counts = self.aggregate(
+            total=models.Sum("tests_total"),
+            **{"pass": models.Sum("tests_pass"), "fail": models.Sum("tests_fail")},
+        )
+        return {key: value or 0 for key, value in counts.items()}
+
+    def test_summary(self):
+        """Returns the test counts of the flows along with a capped list of
+        their failing tests, holding only what the build page displays."""
+        summary = self.test_counts()
+        failed_tests = (
+            TestResult.objects.filter(
+                build_flow__in=self.filter(tests_fail__gt=0),
+                outcome__in=FAIL_OUTCOMES,
+            )
+            .order_by("build_flow__time_queue", "id")
+            .values(
+                "id",
+                "method_id",
+                "method__name",
+                "method__testclass__name",
+                "message",
+                "stacktrace",
+            )[: settings.METACI_BUILD_SUMMARY_FAILED_TESTS]
+        )
+        summary["failed_tests"] = [
+            {
+                "id": test["id"],
+                "method_id": test["method_id"],
+                "method": test["method__name"],
+                "testclass": test["method__testclass__name"],
+                "message": _truncate(test["message"]),
+                "stacktrace": _truncate(test["stacktrace"]),
+            }
+            for test in failed_tests
+        ]
+        return summary
+
+
+def _truncate(text, length=SUMMARY_TEXT_LENGTH):
+    if text and len(text) > length:
+        return text[:length] + "..."
+    return text
+
+
+class BuildFlow(DirtyFieldsMixin, SearchIndexMixin, ChunkedLogMixin, models.Model):
     build = models.ForeignKey(
         "build.Build", related_name="flows", on_delete=models.CASCADE
     )
@@ -592,7 +1058,9 @@ class BuildFlow(models.Model):
         max_length=16, choices=BUILD_FLOW_STATUSES, default="queued"
     )
     flow = models.CharField(max_length=255, null=True, blank=True)
-    log = models.TextField(null=True, blank=True)
+    log_archive = models.FileField(
+        upload_to=log_archive_upload_to, null=True, blank=True
+    )
     exception = models.TextField(null=True, blank=True)
     traceback = models.TextField(null=True, blank=True)
     error_message = models.TextField(null=True, blank=True)
@@ -604,6 +1072,18 @@ class BuildFlow(models.Model):
     tests_fail = models.IntegerField(null=True, blank=True)
     asset_hash = models.CharField(max_length=64, unique=True, default=generate_hash)
 
+    objects = BuildFlowQuerySet.as_manager()
+
+    search_fields = ("build__commit", "flow", "exception", "error_message")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-time_queue", "-id"], name="buildflow_keyset_idx")
+        ]
+
+    # Counter of the outcomes of test results imported while running the flow
+    test_outcomes = None
+
     def __str__(self):
         return f"{self.build.id}: {self.build.repo} - {self.build.commit} - {self.flow}"
 
@@ -613,9 +1093,14 @@ class BuildFlow(models.Model):
             + f"#flow-{self.flow}"
         )
 
-    def get_log_html(self):
-        if self.log:
-            return format_log(self.log)
+    def get_log_url(self):
+        return reverse(
+            "build_flow_log",
+            kwargs={"build_id": str(self.build_id), "build_flow_id": str(self.id)},
+        )
+
+    def is_finished(self):
+        return self.status in FINISHED_FLOW_STATUSES
 
     def run(self, project_config, org_config, root_dir):
         self.root_dir = root_dir
@@ -673,7 +1158,10 @@ class BuildFlow(models.Model):
 
         from metaci.build.flows import MetaCIFlowCallback
 
-        callbacks = MetaCIFlowCallback(buildflow_id=self.pk)
+        self.test_outcomes = Counter()
+        callbacks = MetaCIFlowCallback(
+            buildflow_id=self.pk, test_outcomes=self.test_outcomes
+        )
 
         # Create the flow and handle initialization exceptions
         self.flow_instance = FlowCoordinator(
@@ -741,70 +1229,67 @@ class BuildFlow(models.Model):
         """Import results from JUnit or test_results.json.
 
         Robot Framework results are imported in MetaCIFlowCallback.post_task
+
+        The flow's test counters come from the outcomes counted while
+        importing, or from a single query if they weren't counted.
         """
+        outcomes = self.test_outcomes if self.test_outcomes is not None else Counter()
+
         # Load JUnit
-        results = []
         if self.build.plan.junit_path:
-            for filename in iglob(self.build.plan.junit_path):
-                results.extend(self.load_junit(filename))
-            if not results:
+            results = chain.from_iterable(
+                iter_junit_results(filename)
+                for filename in iglob(self.build.plan.junit_path)
+            )
+            first = next(results, None)
+            if first is None:
                 self.logger.warning(
                     f"No results found at JUnit path {self.build.plan.junit_path}"
                 )
-        if results:
-            import_test_results(self, results, "JUnit")
+            else:
+                import_test_results(
+                    self, chain([first], results), "JUnit", outcomes=outcomes
+                )
 
         # Load from test_results.json
-        results = []
         try:
             results_filename = "test_results.json"
             with open(results_filename, "r") as f:
-                results.extend(json.load(f))
+                results = json.load(f)
             for result in results:
                 result["SourceFile"] = results_filename
         except IOError:
             try:
-                results_filename = "test_results.xml"
-                results.extend(self.load_junit(results_filename))
+                results = iter_junit_results("test_results.xml")
             except IOError:
-                pass
+                results = []
 
-        if results:
-            import_test_results(self, results, "Apex")
+        results = iter(results)
+        first = next(results, None)
+        if first is not None:
+            import_test_results(
+                self, chain([first], results), "Apex", outcomes=outcomes
+            )
 
-        self.tests_total = self.test_results.count()
-        self.tests_pass = self.test_results.filter(outcome="Pass").count()
-        self.tests_fail = self.test_results.filter(
-            outcome__in=["Fail", "CompileFail"]
-        ).count()
+        if self.test_outcomes is not None:
+            counts = count_outcomes(outcomes)
+        else:
+            counts = self.test_results.test_counts()
+        self.tests_total = counts["total"]
+        self.tests_pass = counts["pass"]
+        self.tests_fail = counts["fail"]
         self.save()
 
+        if self.rebuild_id == self.build.current_rebuild_id:
+            BuildTestSummary.objects.refresh(self.build)
+
     def load_junit(self, filename):
-        results = []
-        tree = elementtree_parse_file(filename)
-        testsuite = tree.getroot()
-        for testcase in testsuite.iter("testcase"):
-            result = {
-                "ClassName": testcase.attrib["classname"],
-                "Method": testcase.attrib["name"],
-                "Outcome": "Pass",
-                "StackTrace": "",
-                "Message": "",
-                "Stats": {"duration": testcase.get("time")},
-                "SourceFile": filename,
-            }
-            for element in testcase.iter():
-                if element.tag not in ["failure", "error"]:
-                    continue
-                result["Outcome"] = "Fail"
-                if element.text:
-                    result["StackTrace"] += element.text + "\n"
-                message = element.get("type", "")
-                if element.get("message"):
-                    message += ": " + element.get("message", "")
-                    result["Message"] += message + "\n"
-            results.append(result)
-        return results
+        """Returns the results in a JUnit file as a list.
+
+        load_test_results() streams results with iter_junit_results()
+        instead, so large files aren't held in memory.
+        """
+        return list(iter_junit_results(filename))
 
 
 def asset_upload_to(instance, filename):
@@ -812,6 +1297,18 @@ def asset_upload_to(instance, filename):
     return os.path.join(folder, filename)
 
 
+class BuildLogChunk(LogChunk):
+    build = models.ForeignKey(
+        Build, related_name="log_chunks", on_delete=models.CASCADE
+    )
+
+
+class BuildFlowLogChunk(LogChunk):
+    build_flow = models.ForeignKey(
+        BuildFlow, related_name="log_chunks", on_delete=models.CASCADE
+    )
+
+
 class BuildFlowAsset(models.Model):
     build_flow = models.ForeignKey(
         BuildFlow, related_name="assets", on_delete=models.CASCADE
@@ -820,7 +1317,7 @@ class BuildFlowAsset(models.Model):
     category = models.CharField(max_length=1024)
 
 
-class Rebuild(models.Model):
+class Rebuild(DirtyFieldsMixin, models.Model):
     build = models.ForeignKey(
         "build.Build", related_name="rebuilds", on_delete=models.CASCADE
     )
@@ -850,6 +1347,19 @@ class Rebuild(models.Model):
     class Meta:
         ordering = ["-id"]
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None:
+            update_fields = self.get_dirty_fields()
+        status_changed = self._state.adding or {"status", "time_end"} & set(
+            update_fields
+        )
+        super().save(*args, **kwargs)
+        if status_changed:
+            Build.objects.filter(current_rebuild_id=self.id).update(
+                effective_status=self.status, effective_time_end=self.time_end
+            )
+
     def get_absolute_url(self):
         return reverse(
             "build_detail",
@@ -857,6 +1367,56 @@ class Rebuild(models.Model):
         )
 
 
+class ScheduledBuild(models.Model):
+    """A build handed to the fair-share scheduler, waiting for a worker slot
+    or running in one. Rows are deleted when the build finishes."""
+
+    build = models.OneToOneField(
+        Build, related_name="scheduled", on_delete=models.CASCADE
+    )
+    # Org lock held by the build, passed on when it is dispatched
+    lock_id = models.CharField(max_length=255, null=True, blank=True)
+    time_submitted = models.DateTimeField(auto_now_add=True)
+    time_dispatched = models.DateTimeField(null=True, blank=True)
+    # The scheduler's latest decision about the build; lower scores go first
+    score = models.FloatField(null=True, blank=True)
+    decision = models.CharField(max_length=255, blank=True, default="")
+
+    class Meta:
+        ordering = ["time_submitted"]
+
+    def __str__(self):
+        return f"{self.build_id}: {self.decision}"
+
+
+class BuildTestSummaryManager(models.Manager):
+    def refresh(self, build):
+        """Recomputes the summary of the build's current flows."""
+        rebuild = build.current_rebuild
+        flows = rebuild.flows.all() if rebuild else build.flows.all()
+        summary = flows.test_summary()
+        self.update_or_create(
+            build=build, defaults={"rebuild": rebuild, "summary": summary}
+        )
+        return summary
+
+
+class BuildTestSummary(models.Model):
+    """Test totals and failing tests for the current flows of a build,
+    so the build page doesn't need to query the test results."""
+
+    build = models.OneToOneField(
+        Build, related_name="test_summary", on_delete=models.CASCADE
+    )
+    rebuild = models.ForeignKey(
+        Rebuild, null=True, blank=True, on_delete=models.CASCADE
+    )
+    summary = models.JSONField()
+    time_updated = models.DateTimeField(auto_now=True)
+
+    objects = BuildTestSummaryManager()
+
+
 class FlowTaskManager(models.Manager):
 
     # TODO: refactor to use step strings?
@@ -867,7 +1427,7 @@ class FlowTaskManager(models.Manager):
             return FlowTask(build_flow_id=build_flow_id, path=path, stepnum=step_num)
 
 
-class FlowTask(models.Model):
+class FlowTask(DirtyFieldsMixin, models.Model):
     """A FlowTask holds the result of a task execution during a BuildFlow."""
 
     time_start = models.DateTimeField(null=True, blank=True)
@@ -0,0 +1,92 @@
+"""A snapshot of the RQ queues, shared by the HireFire endpoint and the
+queue metrics API so that polling them doesn't repeat the same Redis
+calls.
+
+The snapshot is collected with one pipelined round trip per Redis
+server and cached for METACI_QUEUE_METRICS_TIMEOUT seconds. The
+autoscaler collects its own, as it runs right after builds are queued.
+"""
+import time
+import typing as T
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django_rq.queues import get_queue_by_index
+from django_rq.settings import QUEUES_LIST
+from rq.job import Job
+from rq.registry import DeferredJobRegistry, FinishedJobRegistry, StartedJobRegistry
+from rq.utils import utcparse
+from rq.worker_registration import WORKERS_BY_QUEUE_KEY
+
+QUEUE_METRICS_KEY = "metaci:queue-metrics"
+
+# Returns when the first job of a queue was enqueued, in one round trip
+OLDEST_ENQUEUED_AT = """
+local job_id = redis.call("LINDEX", KEYS[1], 0)
+if not job_id then
+    return false
+end
+return redis.call("HGET", ARGV[1] .. job_id, "enqueued_at")
+"""
+
+
+class QueueMetrics(T.NamedTuple):
+    name: str
+    jobs: int
+    started_jobs: int
+    deferred_jobs: int
+    finished_jobs: int
+    workers: int
+    # Seconds the first job in the queue has waited, if there is one
+    oldest_job_age: T.Optional[float]
+
+
+def get_queue_metrics():
+    """Returns the QueueMetrics of each queue by name, from the cache
+    if they were collected recently."""
+    metrics = cache.get(QUEUE_METRICS_KEY)
+    if metrics is None:
+        metrics = collect_queue_metrics()
+        cache.set(QUEUE_METRICS_KEY, metrics, settings.METACI_QUEUE_METRICS_TIMEOUT)
+    return metrics
+
+
+def collect_queue_metrics():
+    queues = [get_queue_by_index(index) for index in range(len(QUEUES_LIST))]
+    by_server = {}
+    for queue in queues:
+        kwargs = queue.connection.connection_pool.connection_kwargs
+        by_server.setdefault(repr(sorted(kwargs.items())), []).append(queue)
+
+    # Registries count the jobs which haven't expired yet, like len() does
+    # after cleaning the registry up
+    now = f"({time.time()}"
+    utcnow = datetime.utcnow()
+    metrics = {}
+    for server_queues in by_server.values():
+        pipeline = server_queues[0].connection.pipeline(transaction=False)
+        for queue in server_queues:
+            pipeline.llen(queue.key)
+            pipeline.zcount(StartedJobRegistry(queue=queue).key, now, "+inf")
+            # Deferred jobs don't expire
+            pipeline.zcard(DeferredJobRegistry(queue=queue).key)
+            pipeline.zcount(FinishedJobRegistry(queue=queue).key, now, "+inf")
+            pipeline.scard(WORKERS_BY_QUEUE_KEY % queue.name)
+            pipeline.eval(
+                OLDEST_ENQUEUED_AT, 1, queue.key, Job.redis_job_namespace_prefix
+            )
+        results = iter(pipeline.execute())
+        for queue in server_queues:
+            jobs, started, deferred, finished, workers, enqueued_at = [
+                next(results) for _ in range(6)
+            ]
+            oldest_job_age = None
+            if enqueued_at:
+                oldest_job_age = max(
+                    (utcnow - utcparse(enqueued_at.decode())).total_seconds(), 0
+                )
+            metrics[queue.name] = QueueMetrics(
+                queue.name, jobs, started, deferred, finished, workers, oldest_job_age
+            )
+    return metrics
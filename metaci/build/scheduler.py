@@ -0,0 +1,184 @@
+"""Fair-share scheduling of builds onto a fixed number of worker slots.
+
+Builds which are ready to run are submitted to the scheduler instead of
+being queued straight away. Whenever a slot is free, the scheduler
+dispatches the build with the lowest score:
+
+    (running builds of its repository + 1) / (repository weight * role weight)
+        - seconds waited / METACI_SCHEDULER_AGING_SECONDS
+
+so repositories share the workers in proportion to their weights,
+builds of important plan roles go first, and builds which have waited
+a long time eventually run even while busier repositories keep pushing.
+"""
+import typing as T
+from collections import Counter
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from metaci.build.models import FINISHED_STATUSES, ScheduledBuild
+from metaci.build.tasks import (
+    check_queued_build,
+    dispatch_build,
+    refresh_org_lock,
+    release_org_lock,
+)
+
+# Key of the advisory lock which serializes scheduling passes
+SCHEDULER_LOCK = 4627
+
+
+class Candidate(T.NamedTuple):
+    key: T.Any
+    repo: T.Any
+    role: str
+    time_submitted: float
+    repo_weight: int = 1
+    max_concurrent: T.Optional[int] = None
+
+
+class Decision(T.NamedTuple):
+    candidate: Candidate
+    dispatch: bool
+    score: T.Optional[float]
+    reason: str
+
+
+def plan_dispatch(
+    candidates, running, slots, now, role_weights=None, aging_seconds=None
+):
+    """Decides which candidates to dispatch to the free slots.
+
+    running counts the builds already running for each repository.
+    Returns a Decision for each candidate, dispatched ones first.
+    """
+    if role_weights is None:
+        role_weights = settings.METACI_SCHEDULER_ROLE_WEIGHTS
+    if aging_seconds is None:
+        aging_seconds = settings.METACI_SCHEDULER_AGING_SECONDS
+    running = Counter(running)
+    free = slots - sum(running.values())
+
+    def score(candidate):
+        share = candidate.repo_weight * role_weights.get(candidate.role, 1)
+        waited = now - candidate.time_submitted
+        return (running[candidate.repo] + 1) / share - waited / aging_seconds
+
+    def at_limit(candidate):
+        return (
+            candidate.max_concurrent is not None
+            and running[candidate.repo] >= candidate.max_concurrent
+        )
+
+    decisions = []
+    pending = sorted(candidates, key=lambda candidate: candidate.time_submitted)
+    while free > 0:
+        eligible = [candidate for candidate in pending if not at_limit(candidate)]
+        if not eligible:
+            break
+        best = min(eligible, key=score)
+        decisions.append(Decision(best, True, score(best), "dispatched"))
+        pending.remove(best)
+        running[best.repo] += 1
+        free -= 1
+
+    for candidate in pending:
+        if at_limit(candidate):
+            reason = (
+                f"waiting: the repository is running its limit of "
+                f"{candidate.max_concurrent} builds"
+            )
+        else:
+            reason = "waiting for a free slot"
+        decisions.append(Decision(candidate, False, score(candidate), reason))
+    return decisions
+
+
+def submit_build(build, lock_id=None):
+    """Hands a build which is ready to run to the scheduler."""
+    ScheduledBuild.objects.update_or_create(
+        build=build,
+        defaults={"lock_id": lock_id, "time_dispatched": None, "decision": ""},
+    )
+    return schedule_builds()
+
+
+def finish_build(build_id):
+    """Frees the slot of a finished build for the next one."""
+    ScheduledBuild.objects.filter(build_id=build_id).delete()
+    return schedule_builds()
+
+
+def schedule_builds():
+    """Dispatches scheduled builds to the free slots.
+    Returns the ids of the dispatched builds.
+
+    Builds are dispatched once the scheduling transaction commits, so the
+    advisory lock isn't held while jobs are enqueued and workers scaled.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [SCHEDULER_LOCK])
+
+        now = timezone.now()
+        scheduled = {}
+        running = Counter()
+        for row in ScheduledBuild.objects.select_related("build__repo", "build__plan"):
+            timeout = timedelta(seconds=row.build.plan.build_timeout)
+            if row.build.effective_status in FINISHED_STATUSES:
+                # The build was stopped before it was dispatched,
+                # or its slot wasn't freed when it finished
+                row.delete()
+                if row.lock_id and not row.time_dispatched:
+                    transaction.on_commit(partial(release_org_lock, row.lock_id))
+            elif row.time_dispatched and now - row.time_dispatched > timeout:
+                # The worker running the build was lost
+                row.delete()
+            elif row.time_dispatched:
+                running[row.build.repo_id] += 1
+            else:
+                scheduled[row.id] = row
+
+        decisions = plan_dispatch(
+            [
+                Candidate(
+                    key=row.id,
+                    repo=row.build.repo_id,
+                    role=row.build.plan.role,
+                    time_submitted=row.time_submitted.timestamp(),
+                    repo_weight=row.build.repo.build_weight,
+                    max_concurrent=row.build.repo.max_concurrent_builds,
+                )
+                for row in scheduled.values()
+            ],
+            running,
+            settings.METACI_SCHEDULER_SLOTS,
+            now.timestamp(),
+        )
+
+        dispatched = []
+        for decision in decisions:
+            row = scheduled[decision.candidate.key]
+            row.score = decision.score
+            row.decision = decision.reason
+            if not decision.dispatch:
+                continue
+            timeout = row.build.plan.build_timeout
+            if row.lock_id and not refresh_org_lock(row.lock_id, row.build_id, timeout):
+                # The org's lock expired while the build waited for a slot
+                # and another build took the org, so the build waits for it
+                del scheduled[row.id]
+                row.delete()
+                transaction.on_commit(partial(check_queued_build.delay, row.build_id))
+                continue
+            row.time_dispatched = now
+            transaction.on_commit(partial(dispatch_build, row.build, row.lock_id))
+            dispatched.append(row.build_id)
+        ScheduledBuild.objects.bulk_update(
+            scheduled.values(), ["score", "decision", "time_dispatched"]
+        )
+    return dispatched
@@ -2,6 +2,7 @@ import time
 import traceback
 import typing as T
 from collections import namedtuple
+from datetime import timedelta
 
 import django_rq
 from cumulusci.core.utils import import_global
@@ -9,7 +10,9 @@ from cumulusci.oauth.salesforce import jwt_session
 from django import db
 from django.conf import settings
 from django.core.cache import cache
+from django.db.models import Q
 from django.utils import timezone
+from django_redis import get_redis_connection
 from rq.exceptions import ShutDownImminentException
 
 from metaci.build.autoscaling import autoscale
@@ -20,6 +23,8 @@ from metaci.cumulusci.models import Org, sf_session
 from metaci.repository.utils import create_status
 
 ACTIVESCRATCHORGLIMITS_KEY = "metaci:activescratchorgs:limits"
+# Redis set of the lock ids of orgs which have builds waiting for them
+WAITING_ORGS_KEY = "metaci:waiting-orgs"
 
 ActiveScratchOrgLimits = namedtuple("ActiveScratchOrgLimits", ["remaining", "max"])
 
@@ -53,6 +58,7 @@ def run_build(build_id, lock_id=None):
         time.sleep(1)
         build = Build.objects.get(id=build_id)
 
+    requeued = False
     try:
         build.run()
         if settings.GITHUB_STATUS_UPDATES_ENABLED:
@@ -74,10 +80,9 @@ def run_build(build_id, lock_id=None):
             "MetaCI will try to start a rebuild."
         )
         build.save()
+        requeued = True
         raise RequeueJob
     except Exception as e:
-        if lock_id:
-            cache.delete(lock_id)
         if settings.GITHUB_STATUS_UPDATES_ENABLED:
             res_status = set_github_status.delay(build_id)
             build.task_id_status_end = res_status.id
@@ -96,13 +101,37 @@ def run_build(build_id, lock_id=None):
         build_complete.send(
             sender=build.__class__, build=build, status=build.get_status()
         )
+    finally:
+        # A requeued build keeps its org and worker slot for its next run
+        if not requeued:
+            if lock_id:
+                release_org_lock(lock_id)
 
-    if lock_id:
-        cache.delete(lock_id)
+            if settings.METACI_SCHEDULER_SLOTS:
+                from metaci.build.scheduler import finish_build
+
+                finish_build(build_id)
+
+    if settings.METACI_LOG_HTML_PRERENDER:
+        cache_log_html.delay(build_id)
 
     return build.get_status()
 
 
+def start_build(build, lock_id: str = None):
+    """Dispatches a build which is ready to run, or submits it to the
+    fair-share scheduler to wait for a worker slot if that is enabled.
+    Returns a description of what happened."""
+    if settings.METACI_SCHEDULER_SLOTS and build.plan.queue != "long-running":
+        from metaci.build.scheduler import submit_build
+
+        if build.id in submit_build(build, lock_id):
+            return "dispatched by the scheduler"
+        return "submitted to the scheduler"
+    res_run = dispatch_build(build, lock_id)
+    return f"running as task {res_run.id}"
+
+
 def dispatch_build(build, lock_id: str = None):
     queue_name = build.plan.queue
     if queue_name == "long-running":
@@ -147,10 +176,104 @@ def dispatch_queued_build(build, lock_id: str = None):
     return result
 
 
+def cancel_superseded_builds(build):
+    """Cancels the queued and waiting builds of older commits which a new
+    build makes redundant, if its plan coalesces builds. Running builds
+    of older commits stop themselves before their next flow."""
+    from metaci.build.models import Build
+
+    if not build.plan.coalesce_builds:
+        return []
+    superseded = (
+        Build.objects.filter(
+            repo_id=build.repo_id,
+            plan_id=build.plan_id,
+            branch_id=build.branch_id,
+            build_type="auto",
+            current_rebuild__isnull=True,
+            effective_status__in=["queued", "waiting"],
+            time_queue__lt=build.time_queue,
+        )
+        .exclude(commit=build.commit)
+        .select_related("org")
+    )
+    canceled = []
+    for old_build in superseded:
+        old_build.cancel(build)
+        if old_build.org and not old_build.org.scratch:
+            stop_waiting_for_org(old_build.org.lock_id, old_build.id)
+        if settings.GITHUB_STATUS_UPDATES_ENABLED:
+            set_github_status.delay(old_build.id)
+        canceled.append(old_build.id)
+    return canceled
+
+
 def lock_org(org, build_id, timeout):
     return cache.add(org.lock_id, f"build-{build_id}", timeout=timeout)
 
 
+def refresh_org_lock(lock_id, build_id, timeout):
+    """Restarts the timeout of a build's lock on an org, taking the lock
+    again if it expired. Returns False if another build has the org."""
+    value = f"build-{build_id}"
+    if cache.get(lock_id) == value and cache.touch(lock_id, timeout):
+        return True
+    return cache.add(lock_id, value, timeout=timeout)
+
+
+def release_org_lock(lock_id):
+    cache.delete(lock_id)
+    wake_waiting_build(lock_id)
+
+
+# Builds waiting for a persistent org are kept in a Redis sorted set per org,
+# scored by queue time. The first build is woken when the org's lock is
+# released, instead of every waiting build being checked every minute.
+
+
+def waiting_builds_key(lock_id):
+    return f"{lock_id}:waiting"
+
+
+def wait_for_org(lock_id, build):
+    redis = get_redis_connection("default")
+    redis.zadd(
+        waiting_builds_key(lock_id), {build.id: build.time_queue.timestamp()}, nx=True
+    )
+    redis.sadd(WAITING_ORGS_KEY, lock_id)
+
+
+def stop_waiting_for_org(lock_id, build_id):
+    get_redis_connection("default").zrem(waiting_builds_key(lock_id), build_id)
+
+
+def first_waiting_build(lock_id):
+    """Returns the id of the first build still waiting for the org,
+    dropping any builds which stopped waiting (e.g. were deleted)."""
+    from metaci.build.models import Build
+
+    redis = get_redis_connection("default")
+    while True:
+        build_ids = redis.zrange(waiting_builds_key(lock_id), 0, 0)
+        if not build_ids:
+            return None
+        build_id = int(build_ids[0])
+        if Build.objects.filter(id=build_id, effective_status="waiting").exists():
+            return build_id
+        stop_waiting_for_org(lock_id, build_id)
+
+
+def wake_waiting_build(lock_id):
+    """Queues a check of the first build waiting for the org."""
+    from metaci.build.models import Build
+
+    build_id = first_waiting_build(lock_id)
+    if build_id is not None:
+        res_check = check_queued_build.delay(build_id)
+        Build.objects.filter(id=build_id).update(task_id_check=res_check.id)
+    return build_id
+
+
 @django_rq.job("short", timeout=60)
 def check_queued_build(build_id):
     reset_database_connection()
@@ -173,6 +296,17 @@ def check_queued_build(build_id):
         build.save()
         return message
 
+    # A build of a newer commit may have superseded this one while it was queued
+    superseded_by = build.get_superseding_build()
+    if superseded_by:
+        build.cancel(superseded_by)
+    if build.get_status() == "canceled":
+        if not org.scratch:
+            stop_waiting_for_org(org.lock_id, build.id)
+            if not cache.get(org.lock_id):
+                wake_waiting_build(org.lock_id)
+        return "The build was canceled"
+
     if org.scratch:
         # For scratch orgs, we don't need concurrency blocking logic,
         # but we need to check capacity
@@ -184,39 +318,69 @@ def check_queued_build(build_id):
             build.log = msg
             build.save()
             return msg
-        res_run = dispatch_build(build)
-        return (
-            "DevHub has scratch org capacity, running the build "
-            + f"as task {res_run.id}"
-        )
+        started = start_build(build)
+        return f"DevHub has scratch org capacity, build {started}"
     else:
-        # For persistent orgs, use the cache to lock the org
-        status = lock_org(org, build_id, build.plan.build_timeout)
+        # For persistent orgs, use the cache to lock the org.
+        # Builds already waiting for the org go first.
+        first_waiting = first_waiting_build(org.lock_id)
+        status = None
+        if first_waiting in (None, build.id):
+            status = lock_org(org, build_id, build.plan.build_timeout)
 
         if status is True:
             # Lock successful, run the build
-            res_run = dispatch_build(build, org.lock_id)
-            return f"Got a lock on the org, running as task {res_run.id}"
+            stop_waiting_for_org(org.lock_id, build.id)
+            started = start_build(build, org.lock_id)
+            return f"Got a lock on the org, build {started}"
         else:
-            # Failed to get lock, queue next check
+            # Failed to get lock, wait to be woken when the org is unlocked
+            wait_for_org(org.lock_id, build)
             build.task_id_check = None
             build.set_status("waiting")
-            build.log = f"Waiting on build #{cache.get(org.lock_id)} to complete"
+            locked_by = cache.get(org.lock_id)
+            if locked_by:
+                build.log = f"Waiting on build #{locked_by} to complete"
+            else:
+                build.log = f"Waiting on build #{first_waiting} to start"
             build.save()
+            # The lock may have been released before this build started waiting
+            if not cache.get(org.lock_id):
+                wake_waiting_build(org.lock_id)
             return (
                 "Failed to get lock on org. "
-                + f"{cache.get(org.lock_id)} has the org locked. Queueing next check."
+                + f"{locked_by or first_waiting} has the org. "
+                + "Waiting for it to be unlocked."
             )
 
 
 @django_rq.job("short", timeout=60)
 def check_waiting_builds():
+    """Checks builds waiting for scratch org capacity.
+
+    Builds waiting for a persistent org are woken when its lock is
+    released, so they are only swept up here if that wakeup was missed:
+    the first build waiting for each unlocked org is woken again.
+    """
     reset_database_connection()
 
     from metaci.build.models import Build
 
+    redis = get_redis_connection("default")
+    queued = set()
+    for lock_id in redis.smembers(WAITING_ORGS_KEY):
+        lock_id = lock_id.decode("utf-8")
+        build_ids = redis.zrange(waiting_builds_key(lock_id), 0, -1)
+        if not build_ids:
+            redis.srem(WAITING_ORGS_KEY, lock_id)
+            continue
+        queued.update(int(build_id) for build_id in build_ids)
+        if not cache.get(lock_id):
+            wake_waiting_build(lock_id)
+
     builds = []
-    for build in Build.objects.filter(status="waiting").order_by("time_queue"):
+    waiting = Build.objects.filter(effective_status="waiting").exclude(id__in=queued)
+    for build in waiting.order_by("time_queue"):
         builds.append(build.id)
         res_check = check_queued_build.delay(build.id)
         build.task_id_check = res_check.id
@@ -228,6 +392,62 @@ def check_waiting_builds():
         return "No queued builds to check"
 
 
+@django_rq.job("short", timeout=60)
+def run_scheduler():
+    """Dispatches scheduled builds to any free worker slots, in case a slot
+    was freed without the scheduler running (e.g. a worker was lost)."""
+    reset_database_connection()
+    if not settings.METACI_SCHEDULER_SLOTS:
+        return "The fair-share scheduler is disabled"
+
+    from metaci.build.scheduler import schedule_builds
+
+    dispatched = schedule_builds()
+    if dispatched:
+        return f"Dispatched builds: {dispatched}"
+    return "No builds dispatched"
+
+
+@django_rq.job("short", timeout=600)
+def cache_log_html(build_id):
+    """Renders the html of a finished build's logs into the cache,
+    so the build page doesn't have to convert them."""
+    reset_database_connection()
+    from metaci.build.models import Build
+
+    build = Build.objects.get(id=build_id)
+    rendered = 0
+    for owner in [build, *(build.current_rebuild or build).flows.all()]:
+        if owner.is_finished():
+            owner.get_log_html()
+            rendered += 1
+    return f"Rendered {rendered} logs for build {build_id}"
+
+
+@django_rq.job("short", timeout=3600)
+def archive_logs():
+    """Moves the logs of builds finished more than METACI_LOG_ARCHIVE_DAYS
+    ago out of the database into compressed files in storage."""
+    reset_database_connection()
+    from metaci.build.models import FINISHED_STATUSES, Build
+
+    if not settings.METACI_LOG_ARCHIVE_DAYS:
+        return "Log archiving is disabled"
+    cutoff = timezone.now() - timedelta(days=settings.METACI_LOG_ARCHIVE_DAYS)
+    builds = Build.objects.filter(
+        Q(log_chunks__isnull=False) | Q(flows__log_chunks__isnull=False),
+        effective_status__in=FINISHED_STATUSES,
+        effective_time_end__lte=cutoff,
+        time_end__lte=cutoff,
+    )
+    archived = 0
+    for build in builds.distinct().order_by("id").iterator():
+        for owner in [build, *build.flows.all()]:
+            owner.archive_log()
+        archived += 1
+    return f"Archived the logs of {archived} builds"
+
+
 @django_rq.job("short")
 def set_github_status(build_id):
     reset_database_connection()
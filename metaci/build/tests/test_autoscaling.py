@@ -1,17 +1,28 @@
 import json
 import os
+from datetime import timedelta
 from unittest import mock
 
 import pytest
 import responses
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils import timezone
 
 from metaci.build.autoscaling import (
     Autoscaler,
     HerokuAutoscaler,
     LocalAutoscaler,
+    PredictiveHerokuAutoscaler,
+    ScalingPolicy,
     autoscale,
+    estimate_durations,
     get_autoscaler,
+    plan_workers,
 )
+from metaci.build.queue_metrics import QUEUE_METRICS_KEY, QueueMetrics
+from metaci.build.tasks import dispatch_queued_build
+from metaci.conftest import BuildFactory, PlanFactory
 from metaci.exceptions import ConfigError
 
 
@@ -47,19 +58,44 @@ class TestAutoscaler:
         autoscaler = Autoscaler(non_scaler_config)
         assert repr(autoscaler) == "<Autoscaler builds: 0, workers: 0>"
 
-    @mock.patch("metaci.build.autoscaling.StartedJobRegistry")
-    def test_count_builds(self, StartedJobRegistry, non_scaler_config):
-        queue = mock.Mock(count=1)
-        StartedJobRegistry.return_value = [mock.Mock]
+    @mock.patch("metaci.build.autoscaling.collect_queue_metrics")
+    def test_count_builds(self, collect_queue_metrics, non_scaler_config):
+        queue = mock.Mock()
+        queue.name = "default"
+        collect_queue_metrics.return_value = {
+            "default": mock.Mock(jobs=1, started_jobs=1)
+        }
         autoscaler = Autoscaler(non_scaler_config)
         assert autoscaler.count_builds(queue) == 2
+        assert autoscaler.count_builds(queue) == 2
+        collect_queue_metrics.assert_called_once()
 
-    @mock.patch("metaci.build.autoscaling.Worker")
-    def test_count_workers(self, Worker, non_scaler_config):
-        Worker.count.return_value = 1
+    @mock.patch("metaci.build.autoscaling.collect_queue_metrics")
+    def test_count_workers(self, collect_queue_metrics, non_scaler_config):
+        collect_queue_metrics.return_value = {"default": mock.Mock(workers=1)}
         autoscaler = Autoscaler(non_scaler_config)
         assert autoscaler.count_workers() == 1
 
+    @pytest.mark.django_db
+    @mock.patch("subprocess.Popen")
+    def test_autoscale__after_dispatch(self, popen):
+        # A snapshot cached before the build was queued
+        stale_cache = LocMemCache("stale-queue-metrics", {})
+        stale_cache.set(
+            QUEUE_METRICS_KEY,
+            {
+                name: QueueMetrics(name, 0, 0, 0, 0, 0, None)
+                for name in settings.RQ_QUEUES
+            },
+        )
+        build = BuildFactory()
+
+        with mock.patch("metaci.build.queue_metrics.cache", stale_cache):
+            job = dispatch_queued_build(build)
+        job.delete()
+
+        popen.assert_called()
+
     @mock.patch("metaci.build.autoscaling.get_autoscaler")
     def test_autoscale(self, get_autoscaler):
         get_autoscaler.return_value.target_workers = 1
@@ -152,6 +188,105 @@ class TestHerokuAutoscaler:
         autoscaler.scale()
 
 
+class TestPlanWorkers:
+    def test_short_builds(self):
+        # 30 two-minute builds all start within 10 minutes on 5 workers
+        assert plan_workers([], [(120, 0)] * 30, 600, 20) == 5
+
+    def test_long_builds(self):
+        assert plan_workers([], [(5400, 0)] * 5, 600, 20) == 5
+
+    def test_running_builds(self):
+        assert plan_workers([300, 3000], [(120, 0)], 600, 20) == 2
+        assert plan_workers([3000, 3000], [(120, 0)], 600, 20) == 3
+
+    def test_waited(self):
+        assert plan_workers([300], [(120, 0)], 600, 20) == 1
+        assert plan_workers([300], [(120, 500)], 600, 20) == 2
+
+    def test_max_workers(self):
+        assert plan_workers([], [(5400, 0)] * 5, 600, 3) == 3
+
+    def test_idle(self):
+        assert plan_workers([], [], 600, 20) == 0
+
+
+class TestScalingPolicy:
+    def test_scale_up(self):
+        policy = ScalingPolicy(600, 0.5, 900)
+        assert policy.target_workers([], [(5400, 0)] * 4, 1, 20, now=0) == 4
+
+    def test_hysteresis(self):
+        policy = ScalingPolicy(600, 0.5, 0)
+        # One worker meets the target, but not one half as long
+        queued = [(400, 0), (400, 0)]
+        assert policy.target_workers([], queued, 2, 20, now=0) == 2
+        assert policy.target_workers([], queued, 3, 20, now=0) == 2
+
+    def test_cooldown(self):
+        policy = ScalingPolicy(600, 0.5, 900)
+        assert policy.target_workers([], [], 2, 20, now=0) == 2
+        assert policy.target_workers([], [], 2, 20, now=600) == 2
+        assert policy.target_workers([], [], 2, 20, now=900) == 0
+
+
+@pytest.mark.django_db
+def test_estimate_durations():
+    plan, new_plan = PlanFactory(), PlanFactory()
+    now = timezone.now()
+    for minutes in (10, 20, 90):
+        BuildFactory(
+            planrepo__plan=plan,
+            status="success",
+            time_start=now,
+            time_end=now + timedelta(minutes=minutes),
+        )
+    with mock.patch(
+        "metaci.build.autoscaling.cache", LocMemCache("autoscaling-tests", {})
+    ):
+        durations = estimate_durations([plan.id, new_plan.id])
+    assert durations == {plan.id: 20 * 60, new_plan.id: 1800}
+
+
+class TestPredictiveAutoscaler:
+    @mock.patch("metaci.build.autoscaling.cache", LocMemCache("autoscaling-tests", {}))
+    def test_measure(self, scaler_config):
+        autoscaler = PredictiveHerokuAutoscaler(scaler_config)
+        autoscaler.get_pending_work = mock.Mock(return_value=([], [(120, 0)] * 30))
+        autoscaler.count_builds = mock.Mock(side_effect=[30, 0, 0])
+        autoscaler.count_workers = mock.Mock(return_value=1)
+        autoscaler.measure()
+        assert autoscaler.active_builds == 30
+        assert autoscaler.target_workers == 4
+
+    @pytest.mark.django_db
+    @mock.patch("metaci.build.autoscaling.cache", LocMemCache("autoscaling-tests", {}))
+    def test_get_pending_work__lookahead(self, scaler_config, settings):
+        autoscaler = PredictiveHerokuAutoscaler({**scaler_config, "queues": ["medium"]})
+        queue = autoscaler.queues[0]
+        settings.METACI_AUTOSCALER_LOOKAHEAD = queue.count + 1
+        build = BuildFactory()
+        jobs = [
+            queue.enqueue("metaci.build.tasks.run_build", build.id) for _ in range(2)
+        ]
+        try:
+            running, queued = autoscaler.get_pending_work()
+        finally:
+            for job in jobs:
+                job.delete()
+
+        assert len(queued) == settings.METACI_AUTOSCALER_LOOKAHEAD
+
+    @responses.activate
+    def test_scale__cooldown(self, scaler_config):
+        autoscaler = PredictiveHerokuAutoscaler(scaler_config)
+        autoscaler.active_builds = 0
+        autoscaler.target_workers = 1
+        autoscaler.count_workers = mock.Mock(return_value=1)
+        autoscaler.scale()
+        assert not responses.calls
+
+
 class TestAutoscalerConfig:
     def test_get_autoscaler(self):
         """In test context autoscaler is set to metaci.build.autoscaling.LocalAutoscaler"""
@@ -1,22 +1,49 @@
 import datetime
 import os
+import threading
+from collections import Counter
 from pathlib import Path
 from unittest import mock
 
 import pytest
 from cumulusci.core.config import OrgConfig
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from watson import search as watson
 
-from metaci.build.models import Build
+from metaci.build.models import (
+    SUMMARY_TEXT_LENGTH,
+    Build,
+    BuildFlow,
+    BuildTestSummary,
+    DirtyFieldsMixin,
+    FlowTask,
+    Rebuild,
+)
+from metaci.build.utils import (
+    BUILD_KEYSET,
+    encode_cursor,
+    format_log,
+    get_keyset_page,
+    set_build_info,
+    view_queryset,
+)
 from metaci.conftest import (
     BranchFactory,
     BuildFactory,
     BuildFlowFactory,
+    FlowTaskFactory,
     PlanFactory,
     PlanRepositoryFactory,
     PlanScheduleFactory,
+    RebuildFactory,
     RepositoryFactory,
     ScratchOrgInstanceFactory,
+    TestResultFactory,
 )
+from metaci.cumulusci.logger import init_logger
 from metaci.release.models import ChangeCaseTemplate, Release
 
 
@@ -278,6 +305,416 @@ class TestBuildFlow:
         expected = f"{datetime.date.today().isoformat()}T21:00:00+00:00"
         assert options["push_all"]["start_time"] == expected
 
+    def test_load_test_results__counted_outcomes(
+        self, tmp_path, monkeypatch, django_assert_num_queries
+    ):
+        monkeypatch.chdir(tmp_path)
+        build_flow = BuildFlowFactory()
+        build_flow.build.plan.junit_path = None
+        build_flow.test_outcomes = Counter({"Pass": 3, "Fail": 1, "CompileFail": 1})
+
+        # Only the save, which skips the search index; the counters come
+        # from the import
+        with mock.patch("metaci.build.models.BuildTestSummary.objects.refresh"):
+            with django_assert_num_queries(1):
+                build_flow.load_test_results()
+
+        assert build_flow.tests_total == 5
+        assert build_flow.tests_pass == 3
+        assert build_flow.tests_fail == 2
+
+    def test_load_test_results__not_counted(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        build_flow = BuildFlowFactory()
+        build_flow.build.plan.junit_path = None
+        for outcome in ("Pass", "Pass", "Fail", "CompileFail", "Skip"):
+            TestResultFactory(build_flow=build_flow, outcome=outcome)
+
+        build_flow.load_test_results()
+
+        assert build_flow.tests_total == 5
+        assert build_flow.tests_pass == 2
+        assert build_flow.tests_fail == 2
+
+    def test_load_test_results__xml(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        junit = Path(__file__).parents[2] / "testresults" / "tests" / "junit_output.xml"
+        Path("test_results.xml").write_bytes(junit.read_bytes())
+        build_flow = BuildFlowFactory()
+        build_flow.build.plan.junit_path = None
+
+        build_flow.load_test_results()
+
+        assert build_flow.tests_total == 2
+        assert build_flow.test_results.count() == 2
+
+    def test_load_test_results__empty_xml(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        Path("test_results.xml").write_text("<testsuite></testsuite>")
+        build_flow = BuildFlowFactory()
+        build_flow.build.plan.junit_path = None
+
+        with mock.patch("metaci.build.models.import_test_results") as import_results:
+            build_flow.load_test_results()
+
+        import_results.assert_not_called()
+        assert build_flow.tests_total == 0
+
+    def test_test_counts(self, django_assert_num_queries):
+        build = BuildFactory()
+        BuildFlowFactory(build=build, tests_total=10, tests_pass=8, tests_fail=2)
+        BuildFlowFactory(build=build, tests_total=5, tests_pass=5, tests_fail=None)
+        BuildFlowFactory(build=build, tests_total=None)
+
+        with django_assert_num_queries(1):
+            counts = build.flows.test_counts()
+
+        assert counts == {"total": 15, "pass": 13, "fail": 2}
+
+    def test_load_test_results__refreshes_summary(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        build_flow = BuildFlowFactory()
+        build_flow.build.plan.junit_path = None
+        failed = TestResultFactory(
+            build_flow=build_flow, outcome="Fail", message="Assertion failed"
+        )
+        TestResultFactory(build_flow=build_flow, outcome="Pass")
+
+        build_flow.load_test_results()
+
+        summary = BuildTestSummary.objects.get(build=build_flow.build).summary
+        assert summary["total"] == 2
+        assert summary["pass"] == 1
+        assert summary["fail"] == 1
+        assert summary["failed_tests"] == [
+            {
+                "id": failed.id,
+                "method_id": failed.method_id,
+                "method": failed.method.name,
+                "testclass": failed.method.testclass.name,
+                "message": "Assertion failed",
+                "stacktrace": failed.stacktrace,
+            }
+        ]
+
+    def test_test_summary__capped(self, settings):
+        settings.METACI_BUILD_SUMMARY_FAILED_TESTS = 2
+        build_flow = BuildFlowFactory(tests_total=3, tests_pass=0, tests_fail=3)
+        for _ in range(3):
+            TestResultFactory(build_flow=build_flow, outcome="Fail", message="x" * 5000)
+
+        summary = build_flow.build.flows.test_summary()
+
+        assert summary["fail"] == 3
+        assert len(summary["failed_tests"]) == 2
+        assert len(summary["failed_tests"][0]["message"]) == SUMMARY_TEXT_LENGTH + 3
+
+
+@pytest.mark.django_db
+class TestChunkedLog:
+    def test_append_log(self, django_assert_num_queries):
+        build = BuildFactory()
+        build.append_log("one\n")
+        build.append_log("two\n")
+
+        with django_assert_num_queries(1):
+            build.store_log()
+
+        assert build.log_chunks.count() == 1
+        assert Build.objects.get(id=build.id).log == "one\ntwo\n"
+
+    def test_log_assignment__appends_delta(self):
+        build = BuildFactory()
+        build.log = "one\n"
+        build.save()
+        build.log += "two\n"
+        build.save()
+
+        assert list(build.log_chunks.values_list("text", flat=True)) == [
+            "one\n",
+            "two\n",
+        ]
+        assert Build.objects.get(id=build.id).log == "one\ntwo\n"
+
+    def test_log_assignment__replaces(self):
+        build_flow = BuildFlowFactory()
+        build_flow.log = "one\n"
+        build_flow.save()
+        build_flow.log = "Waiting"
+        build_flow.save()
+
+        assert build_flow.log_chunks.count() == 1
+        assert BuildFlow.objects.get(id=build_flow.id).log == "Waiting"
+
+    def test_read_log(self, django_assert_num_queries):
+        build = BuildFactory()
+        for text in ("one\n", "two\n", "three\n"):
+            build.append_log(text)
+            build.store_log()
+
+        assert list(build.log_chunks.values_list("start", flat=True)) == [0, 4, 8]
+        with django_assert_num_queries(2):
+            assert build.read_log(6) == ("o\nthree\n", 14)
+        assert build.read_log(2, limit=3) == ("e\nt", 5)
+        assert build.read_log(0) == ("one\ntwo\nthree\n", 14)
+        assert build.read_log(14) == ("", 14)
+        assert build.read_log(20) == ("one\ntwo\nthree\n", 14)
+
+    def test_get_log_html__cached_when_finished(self):
+        cache = LocMemCache("log-html-tests", {})
+        build = BuildFactory(status="running")
+        build.log = "\x1b[32mok\x1b[0m\n"
+        build.save()
+
+        with mock.patch("metaci.build.utils.cache", cache), mock.patch(
+            "metaci.build.utils.format_log", wraps=format_log
+        ) as format_log_mock:
+            build.get_log_html()
+            build.get_log_html()
+            assert format_log_mock.call_count == 2
+
+            build.status = "success"
+            first = build.get_log_html()
+            second = build.get_log_html()
+            assert format_log_mock.call_count == 3
+
+        assert first == second
+        assert "ok" in first
+
+    def test_get_log_html__window(self, settings):
+        settings.METACI_LOG_HTML_WINDOW = 10
+        build_flow = BuildFlowFactory(status="running")
+        build_flow.log = "first line\nsecond line\nlast\n"
+        build_flow.save()
+
+        log_html = build_flow.get_log_html()
+
+        assert "Load earlier output" in log_html
+        assert build_flow.get_log_url() in log_html
+        assert 'data-log-offset="23"' in log_html
+        assert "second" not in log_html
+        assert "last" in log_html
+
+    def test_logger_flush__writes_log_only(self, django_assert_num_queries):
+        build = BuildFactory()
+        build.logger = init_logger(build)
+        build.logger.info("hello")
+
+        with django_assert_num_queries(1):
+            for handler in build.logger.handlers:
+                handler.stream.flush(force=True)
+
+        assert "hello" in Build.objects.get(id=build.id).log
+        detach_logger(build)
+
+
+@pytest.mark.django_db
+class TestDirtyFields:
+    def test_save__changed_fields_only(self):
+        build = Build.objects.get(id=BuildFactory(status="queued").id)
+        build.status = "running"
+
+        with CaptureQueriesContext(connection) as ctx:
+            build.save()
+
+        assert len(ctx.captured_queries) == 1
+        sql = ctx.captured_queries[0]["sql"]
+        assert '"status"' in sql
+        assert '"commit"' not in sql
+
+    def test_save__unchanged(self, django_assert_num_queries):
+        build_flow = BuildFlow.objects.get(id=BuildFlowFactory().id)
+        build_flow.status = build_flow.status
+
+        with django_assert_num_queries(0):
+            build_flow.save()
+
+    def test_save__concurrent_writers(self):
+        build = BuildFactory(status="running")
+        status_writer = Build.objects.get(id=build.id)
+        error_writer = Build.objects.get(id=build.id)
+
+        status_writer.status = "error"
+        status_writer.save()
+        error_writer.error_message = "Org creation failed"
+        error_writer.save()
+
+        build.refresh_from_db()
+        assert build.status == "error"
+        assert build.error_message == "Org creation failed"
+
+    def test_save__bytes_written(self):
+        build_id = BuildFactory(status="queued", traceback="x" * 100000).id
+        build_flow_id = BuildFlowFactory(build_id=build_id, status="queued").id
+
+        def run_build():
+            """Returns the bytes of SQL sent for the status changes of a build"""
+            build = Build.objects.get(id=build_id)
+            build_flow = BuildFlow.objects.get(id=build_flow_id)
+            with CaptureQueriesContext(connection) as ctx:
+                set_build_info(build, status="running", time_start=timezone.now())
+                set_build_info(build_flow, status="running")
+                set_build_info(build_flow, status="success", time_end=timezone.now())
+                set_build_info(build, status="success", time_end=timezone.now())
+            return sum(len(query["sql"]) for query in ctx.captured_queries)
+
+        def all_fields(instance):
+            return [f.name for f in instance._meta.concrete_fields if not f.primary_key]
+
+        written = run_build()
+        with mock.patch.object(DirtyFieldsMixin, "get_dirty_fields", all_fields):
+            written_all_fields = run_build()
+
+        assert written_all_fields > 200000
+        assert written < 2000
+
+    def test_save__uncopyable_json(self, django_assert_num_queries):
+        flow_task = FlowTask.objects.get(id=FlowTaskFactory().id)
+        # Tasks return objects which can't be copied, such as locks
+        flow_task.return_values = {"lock": threading.Lock()}
+
+        flow_task.save()
+        with django_assert_num_queries(0):
+            flow_task.save()
+
+        flow_task = FlowTask.objects.get(id=flow_task.id)
+        assert flow_task.return_values["lock"].startswith("<unlocked _thread.lock")
+
+
+@pytest.mark.django_db
+class TestSearchIndex:
+    def test_save__search_fields(self):
+        build = Build.objects.get(id=BuildFactory(traceback="x" * 100000).id)
+        build.error_message = "Org creation failed"
+        build.save()
+
+        entries = list(watson.search("creation", models=(Build,)))
+        assert [entry.object_id_int for entry in entries] == [build.id]
+        assert "x" * 100 not in entries[0].content
+
+    def test_save__other_fields(self):
+        build = Build.objects.get(id=BuildFactory(status="queued").id)
+        build.status = "running"
+
+        engine = watson.default_search_engine
+        with mock.patch.object(engine, "update_obj_index") as update_obj_index:
+            build.save()
+
+        update_obj_index.assert_not_called()
+
+
+@pytest.mark.django_db
+class TestEffectiveStatus:
+    def test_build_status(self):
+        build = BuildFactory(status="running")
+        assert build.effective_status == "running"
+
+        time_end = timezone.now()
+        set_build_info(build, status="success", time_end=time_end)
+
+        build = Build.objects.get(id=build.id)
+        assert build.effective_status == "success"
+        assert build.effective_time_end == time_end
+
+    def test_rebuild_status(self):
+        build = BuildFactory(status="fail", time_end=timezone.now())
+        rebuild = RebuildFactory(build=build, status="queued")
+        build.current_rebuild = rebuild
+        build.save()
+        assert Build.objects.get(id=build.id).effective_status == "queued"
+
+        time_end = timezone.now()
+        set_build_info(rebuild, status="success", time_end=time_end)
+
+        build = Build.objects.get(id=build.id)
+        assert build.status == "fail"
+        assert build.effective_status == "success"
+        assert build.effective_time_end == time_end
+
+    def test_rebuild_status__stale_build(self):
+        build = BuildFactory(status="fail")
+        rebuild = RebuildFactory(build=build, status="running")
+        build.current_rebuild = rebuild
+        build.save()
+
+        stale = Build.objects.get(id=build.id)
+        set_build_info(Rebuild.objects.get(id=rebuild.id), status="success")
+        stale.commit_message = "Updated"
+        stale.save()
+
+        assert Build.objects.get(id=build.id).effective_status == "success"
+
+    def test_view_queryset__status(self, rf, superuser):
+        success = BuildFactory(status="success")
+        rebuilt = BuildFactory(status="fail")
+        rebuilt.current_rebuild = RebuildFactory(build=rebuilt, status="success")
+        rebuilt.save()
+        BuildFactory(status="fail")
+        request = rf.get("/", {"per_page": 10})
+        request.user = superuser
+
+        builds = view_queryset(request, status="success")
+
+        assert {build.id for build in builds} == {success.id, rebuilt.id}
+
+    def test_view_queryset__order_by(self, rf, superuser):
+        builds = [
+            BuildFactory(status="success", time_end=timezone.now()) for _ in range(3)
+        ]
+        request = rf.get("/", {"order_by": "time_end,plan__name,-unknown"})
+        request.user = superuser
+
+        assert [build.id for build in view_queryset(request)] == [
+            build.id for build in builds
+        ]
+
+
+@pytest.mark.django_db
+class TestKeysetPage:
+    def test_pages(self):
+        builds = [BuildFactory() for _ in range(5)]
+        # Give some builds the same queue time, to be ordered by id
+        Build.objects.filter(id__in=[build.id for build in builds[1:4]]).update(
+            time_queue=timezone.now()
+        )
+        expected = list(
+            Build.objects.order_by(*BUILD_KEYSET).values_list("id", flat=True)
+        )
+
+        queryset = Build.objects.all()
+        first = get_keyset_page(queryset, BUILD_KEYSET, 2)
+        second = get_keyset_page(queryset, BUILD_KEYSET, 2, first.next_cursor)
+        third = get_keyset_page(queryset, BUILD_KEYSET, 2, second.next_cursor)
+
+        assert [build.id for page in (first, second, third) for build in page] == (
+            expected
+        )
+        assert not first.has_previous()
+        assert not third.has_next()
+        previous = get_keyset_page(queryset, BUILD_KEYSET, 2, third.previous_cursor)
+        assert [build.id for build in previous] == expected[2:4]
+        assert previous.has_next() and previous.has_previous()
+
+    def test_invalid_cursor(self):
+        with pytest.raises(ValueError):
+            get_keyset_page(Build.objects.all(), BUILD_KEYSET, 2, "nonsense")
+        with pytest.raises(ValueError):
+            get_keyset_page(
+                Build.objects.all(), BUILD_KEYSET, 2, encode_cursor(["yesterday", 1])
+            )
+
+    def test_view_queryset__cursor(self, rf, superuser):
+        builds = [BuildFactory() for _ in range(3)]
+        request = rf.get("/", {"per_page": 2})
+        request.user = superuser
+        first = view_queryset(request)
+
+        request = rf.get("/", {"per_page": 2, "cursor": first.next_cursor})
+        request.user = superuser
+        second = view_queryset(request)
+
+        assert [build.id for build in second] == [builds[0].id]
+
 
 def detach_logger(model):
     for handler in model.logger.handlers:
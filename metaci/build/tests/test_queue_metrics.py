@@ -0,0 +1,40 @@
+from unittest import mock
+
+import django_rq
+from django.core.cache.backends.locmem import LocMemCache
+from rq import Worker
+from rq.registry import DeferredJobRegistry, FinishedJobRegistry, StartedJobRegistry
+
+from metaci.build.queue_metrics import (
+    QueueMetrics,
+    collect_queue_metrics,
+    get_queue_metrics,
+)
+
+
+def test_collect_queue_metrics():
+    queue = django_rq.get_queue("medium")
+    job = queue.enqueue("metaci.build.tasks.reset_database_connection")
+    try:
+        metrics = collect_queue_metrics()["medium"]
+    finally:
+        job.delete()
+
+    assert metrics.name == "medium"
+    assert metrics.jobs == queue.count + 1
+    assert metrics.started_jobs == len(StartedJobRegistry(queue=queue))
+    assert metrics.deferred_jobs == len(DeferredJobRegistry(queue=queue))
+    assert metrics.finished_jobs == len(FinishedJobRegistry(queue=queue))
+    assert metrics.workers == Worker.count(queue=queue)
+    assert metrics.oldest_job_age >= 0
+    assert set(collect_queue_metrics()) >= {"default", "medium", "high", "short"}
+
+
+@mock.patch("metaci.build.queue_metrics.cache", LocMemCache("queue-metrics", {}))
+@mock.patch("metaci.build.queue_metrics.collect_queue_metrics")
+def test_get_queue_metrics__cached(collect_queue_metrics):
+    collect_queue_metrics.return_value = {
+        "default": QueueMetrics("default", 1, 0, 0, 0, 1, 2.5)
+    }
+    assert get_queue_metrics() == get_queue_metrics()
+    collect_queue_metrics.assert_called_once()
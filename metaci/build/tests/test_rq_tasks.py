@@ -1,13 +1,31 @@
 # Lots of work to be done here!!!!
+import datetime
 import json
+import tempfile
 from unittest import mock
 
 import responses
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django_redis import get_redis_connection
 
-from metaci.build.tasks import check_queued_build
+from metaci.build.models import Build, BuildFlow
+from metaci.build.tasks import (
+    WAITING_ORGS_KEY,
+    archive_logs,
+    cancel_superseded_builds,
+    check_queued_build,
+    check_waiting_builds,
+    first_waiting_build,
+    release_org_lock,
+    run_build,
+    waiting_builds_key,
+)
 from metaci.conftest import (
+    BranchFactory,
     BuildFactory,
+    BuildFlowFactory,
     OrgFactory,
     PlanFactory,
     PlanRepositoryFactory,
@@ -34,6 +52,19 @@ class TestRunBuild(TestCase):
         assert lock_org.mock_calls
         assert lock_org.mock_calls[0][1][2] == build_timeout
 
+    @mock.patch("metaci.build.tasks.release_org_lock")
+    @mock.patch("metaci.build.tasks.set_build_info", side_effect=Exception("boom"))
+    @mock.patch("metaci.build.models.Build.run", side_effect=Exception("failed"))
+    def test_lock_released_when_error_handling_fails(
+        self, run, set_build_info, release_org_lock, reset_database_connection
+    ):
+        build = BuildFactory()
+
+        with self.assertRaises(Exception):
+            run_build(build.id, "metaci-org-lock-1")
+
+        release_org_lock.assert_called_once_with("metaci-org-lock-1")
+
 
 @mock.patch("metaci.build.tasks.reset_database_connection", lambda: ...)
 @mock.patch(
@@ -118,3 +149,232 @@ class TestLongRunningBuild(TestCase):
         check_queued_build(build.id)
 
         assert fake_lock_org.was_called
+
+
+@mock.patch("metaci.build.tasks.reset_database_connection")
+class TestArchiveLogs(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root.name, METACI_LOG_ARCHIVE_DAYS=30
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def make_build(self, days_ago, status="success"):
+        time_end = timezone.now() - datetime.timedelta(days=days_ago)
+        build = BuildFactory(status=status, time_end=time_end)
+        build.log = "build log\n"
+        build.save()
+        build_flow = BuildFlowFactory(build=build, status="success")
+        build_flow.log = "flow log\n"
+        build_flow.save()
+        return build, build_flow
+
+    def test_archive_logs(self, reset_database_connection):
+        build, build_flow = self.make_build(days_ago=40)
+        recent_build, _ = self.make_build(days_ago=1)
+        running_build, _ = self.make_build(days_ago=40, status="running")
+
+        archive_logs()
+
+        build = Build.objects.get(id=build.id)
+        build_flow = BuildFlow.objects.get(id=build_flow.id)
+        assert build.log_archive.name.endswith(f"build/{build.id}.log.gz")
+        assert not build.log_chunks.exists()
+        assert build.log == "build log\n"
+        assert build_flow.log_archive
+        assert build_flow.read_log(5) == ("log\n", 9)
+        for other in (recent_build, running_build):
+            other = Build.objects.get(id=other.id)
+            assert not other.log_archive
+            assert other.log_chunks.exists()
+
+    def test_archive_log__appended_after_archiving(self, reset_database_connection):
+        build, _ = self.make_build(days_ago=40)
+        build.archive_log()
+        first_archive = build.log_archive.name
+
+        build = Build.objects.get(id=build.id)
+        build.log += "rebuilt\n"
+        build.save()
+        assert Build.objects.get(id=build.id).log == "build log\nrebuilt\n"
+
+        build.archive_log()
+        assert not build.log_archive.storage.exists(first_archive)
+        assert not build.log_chunks.exists()
+        assert Build.objects.get(id=build.id).log == "build log\nrebuilt\n"
+
+    def test_log_replaced_after_archiving(self, reset_database_connection):
+        build, _ = self.make_build(days_ago=40)
+        build.archive_log()
+        archive = build.log_archive.name
+
+        build.log = "Waiting on build #1 to complete"
+        build.save()
+
+        build = Build.objects.get(id=build.id)
+        assert not build.log_archive
+        assert not build.log_archive.storage.exists(archive)
+        assert build.log == "Waiting on build #1 to complete"
+
+
+@mock.patch("metaci.build.tasks.reset_database_connection")
+@mock.patch("metaci.build.tasks.dispatch_build")
+@mock.patch(
+    "metaci.build.tasks.check_queued_build.delay", return_value=mock.Mock(id="job")
+)
+class TestOrgWaitQueue(TestCase):
+    def setUp(self):
+        self.org = OrgFactory(scratch=False)
+        self.addCleanup(self.clear_waiting)
+
+    def clear_waiting(self):
+        redis = get_redis_connection("default")
+        redis.delete(waiting_builds_key(self.org.lock_id))
+        redis.srem(WAITING_ORGS_KEY, self.org.lock_id)
+        cache.delete(self.org.lock_id)
+
+    def make_build(self):
+        return BuildFactory(org=self.org, status="queued")
+
+    def test_wait_in_order(self, delay, dispatch_build, reset_database_connection):
+        cache.add(self.org.lock_id, "build-0")
+        first, second = self.make_build(), self.make_build()
+        delay.reset_mock()
+
+        check_queued_build(second.id)
+        check_queued_build(first.id)
+
+        assert first_waiting_build(self.org.lock_id) == first.id
+        assert Build.objects.get(id=second.id).effective_status == "waiting"
+        dispatch_build.assert_not_called()
+        delay.assert_not_called()
+
+        release_org_lock(self.org.lock_id)
+        delay.assert_called_once_with(first.id)
+
+    def test_woken_build_runs(self, delay, dispatch_build, reset_database_connection):
+        cache.add(self.org.lock_id, "build-0")
+        build = self.make_build()
+        check_queued_build(build.id)
+        cache.delete(self.org.lock_id)
+
+        check_queued_build(build.id)
+
+        dispatch_build.assert_called_once()
+        assert first_waiting_build(self.org.lock_id) is None
+
+    def test_new_build_waits_behind_queue(
+        self, delay, dispatch_build, reset_database_connection
+    ):
+        cache.add(self.org.lock_id, "build-0")
+        waiting = self.make_build()
+        check_queued_build(waiting.id)
+        cache.delete(self.org.lock_id)
+
+        new = self.make_build()
+        check_queued_build(new.id)
+
+        dispatch_build.assert_not_called()
+        assert first_waiting_build(self.org.lock_id) == waiting.id
+        # The unlocked org's first build is woken
+        delay.assert_called_with(waiting.id)
+
+    def test_deleted_build_skipped(
+        self, delay, dispatch_build, reset_database_connection
+    ):
+        cache.add(self.org.lock_id, "build-0")
+        deleted, waiting = self.make_build(), self.make_build()
+        check_queued_build(deleted.id)
+        check_queued_build(waiting.id)
+        Build.objects.filter(id=deleted.id).update(effective_status="error")
+        delay.reset_mock()
+
+        release_org_lock(self.org.lock_id)
+
+        delay.assert_called_once_with(waiting.id)
+
+    def test_check_waiting_builds(
+        self, delay, dispatch_build, reset_database_connection
+    ):
+        cache.add(self.org.lock_id, "build-0")
+        waiting = self.make_build()
+        check_queued_build(waiting.id)
+        not_queued = BuildFactory(status="waiting")
+        delay.reset_mock()
+
+        check_waiting_builds()
+        delay.assert_called_once_with(not_queued.id)
+
+        # A missed wakeup is retried once the org is unlocked
+        cache.delete(self.org.lock_id)
+        delay.reset_mock()
+        check_waiting_builds()
+        assert mock.call(waiting.id) in delay.mock_calls
+
+
+@mock.patch("metaci.build.tasks.reset_database_connection")
+@mock.patch("metaci.build.tasks.dispatch_build")
+class TestCoalescing(TestCase):
+    def setUp(self):
+        self.planrepo = PlanRepositoryFactory(plan__coalesce_builds=True)
+        self.branch = BranchFactory(repo=self.planrepo.repo)
+        self.org = OrgFactory(repo=self.planrepo.repo, scratch=True)
+
+    def make_build(self, commit, **kwargs):
+        kwargs.setdefault("status", "queued")
+        kwargs.setdefault("branch", self.branch)
+        return BuildFactory(
+            planrepo=self.planrepo,
+            org=self.org,
+            commit=commit,
+            build_type="auto",
+            **kwargs,
+        )
+
+    def test_cancel_superseded_builds(self, dispatch_build, reset_database_connection):
+        queued = self.make_build("a")
+        waiting = self.make_build("b", status="waiting")
+        running = self.make_build("c", status="running")
+        manual = self.make_build("d")
+        Build.objects.filter(id=manual.id).update(build_type="manual")
+        other_branch = self.make_build("e", branch=BranchFactory(repo=self.branch.repo))
+        same_commit = self.make_build("f")
+        new = self.make_build("f")
+
+        assert sorted(cancel_superseded_builds(new)) == [queued.id, waiting.id]
+        assert Build.objects.get(id=queued.id).effective_status == "canceled"
+        assert f"superseded by build #{new.id}" in Build.objects.get(id=queued.id).log
+        for build in (running, manual, other_branch, same_commit, new):
+            assert Build.objects.get(id=build.id).effective_status != "canceled"
+
+    def test_cancel_superseded_builds__disabled(
+        self, dispatch_build, reset_database_connection
+    ):
+        self.planrepo.plan.coalesce_builds = False
+        self.planrepo.plan.save()
+        self.make_build("a")
+        assert cancel_superseded_builds(self.make_build("b")) == []
+
+    @mock.patch("metaci.build.tasks.scratch_org_limits")
+    def test_check_queued_build__superseded(
+        self, scratch_org_limits, dispatch_build, reset_database_connection
+    ):
+        old = self.make_build("a")
+        self.make_build("b")
+
+        assert check_queued_build(old.id) == "The build was canceled"
+        dispatch_build.assert_not_called()
+        assert Build.objects.get(id=old.id).effective_status == "canceled"
+
+    def test_running_build_superseded(self, dispatch_build, reset_database_connection):
+        old = self.make_build("a", status="running")
+        new = self.make_build("b")
+        assert old.get_superseding_build(running=True) is None
+
+        self.planrepo.plan.coalesce_running_builds = True
+        self.planrepo.plan.save()
+        old = Build.objects.get(id=old.id)
+        assert old.get_superseding_build(running=True) == new
@@ -0,0 +1,156 @@
+from unittest import mock
+
+import pytest
+from django.core.cache import cache
+
+from metaci.build.models import ScheduledBuild
+from metaci.build.scheduler import (
+    Candidate,
+    finish_build,
+    plan_dispatch,
+    schedule_builds,
+    submit_build,
+)
+from metaci.conftest import BuildFactory, RepositoryFactory
+
+ROLE_WEIGHTS = {"deploy": 3}
+
+
+def dispatched(decisions):
+    return [decision.candidate.key for decision in decisions if decision.dispatch]
+
+
+class TestPlanDispatch:
+    def plan(self, candidates, running=None, slots=1, now=0, aging_seconds=10000):
+        return plan_dispatch(
+            candidates, running or {}, slots, now, ROLE_WEIGHTS, aging_seconds
+        )
+
+    def test_shares_slots_between_repos(self):
+        candidates = [
+            Candidate("a1", "a", "qa", 0),
+            Candidate("a2", "a", "qa", 1),
+            Candidate("b1", "b", "qa", 2),
+        ]
+        assert dispatched(self.plan(candidates, slots=2)) == ["a1", "b1"]
+
+    def test_busy_repo_waits(self):
+        candidates = [Candidate("a", "a", "qa", 0), Candidate("b", "b", "qa", 1)]
+        assert dispatched(self.plan(candidates, running={"a": 1}, slots=2)) == ["b"]
+
+    def test_repo_weight(self):
+        candidates = [
+            Candidate("a", "a", "qa", 0),
+            Candidate("b", "b", "qa", 1, repo_weight=3),
+        ]
+        assert dispatched(self.plan(candidates, running={"b": 1}, slots=2)) == ["b"]
+
+    def test_role_weight(self):
+        candidates = [
+            Candidate("qa", "a", "qa", 0),
+            Candidate("deploy", "a", "deploy", 1),
+        ]
+        assert dispatched(self.plan(candidates)) == ["deploy"]
+
+    def test_repo_limit(self):
+        candidates = [
+            Candidate("a", "a", "qa", 0, max_concurrent=1),
+            Candidate("b", "b", "qa", 1),
+        ]
+        decisions = self.plan(candidates, running={"a": 1, "b": 2}, slots=4)
+        assert dispatched(decisions) == ["b"]
+        assert "limit of 1 builds" in decisions[-1].reason
+
+    def test_aging(self):
+        candidates = [Candidate("a", "a", "qa", 0), Candidate("b", "b", "qa", 90)]
+        running = {"a": 2}
+        assert dispatched(self.plan(candidates, running, slots=3, now=100)) == ["b"]
+        decisions = self.plan(candidates, running, slots=3, now=100, aging_seconds=30)
+        assert dispatched(decisions) == ["a"]
+
+    def test_no_free_slots(self):
+        decisions = self.plan([Candidate("a", "a", "qa", 0)], running={"b": 1})
+        assert dispatched(decisions) == []
+        assert decisions[0].reason == "waiting for a free slot"
+
+
+@pytest.mark.django_db
+@mock.patch("metaci.build.scheduler.dispatch_build")
+class TestScheduleBuilds:
+    @pytest.fixture(autouse=True)
+    def slots(self, settings):
+        settings.METACI_SCHEDULER_SLOTS = 2
+
+    def make_build(self, repo):
+        return BuildFactory(planrepo__repo=repo, status="queued")
+
+    def test_fills_slots_fairly(
+        self, dispatch_build, django_capture_on_commit_callbacks
+    ):
+        busy, quiet = RepositoryFactory(), RepositoryFactory()
+        first, second, third = [self.make_build(busy) for _ in range(3)]
+        other = self.make_build(quiet)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            assert submit_build(first) == [first.id]
+            assert submit_build(second) == [second.id]
+            assert submit_build(third) == []
+            assert submit_build(other) == []
+
+            assert finish_build(first.id) == [other.id]
+        assert ScheduledBuild.objects.get(build=third).time_dispatched is None
+        assert dispatch_build.call_count == 3
+
+    def test_dispatches_after_commit(
+        self, dispatch_build, django_capture_on_commit_callbacks
+    ):
+        build = self.make_build(RepositoryFactory())
+
+        with django_capture_on_commit_callbacks() as callbacks:
+            assert submit_build(build) == [build.id]
+        dispatch_build.assert_not_called()
+
+        callbacks[0]()
+        dispatch_build.assert_called_once_with(build, None)
+
+    def test_refreshes_org_lock(
+        self, dispatch_build, django_capture_on_commit_callbacks
+    ):
+        build = self.make_build(RepositoryFactory())
+        lock_id = f"metaci-scheduler-test-{build.id}"
+        cache.set(lock_id, f"build-{build.id}", timeout=5)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            assert submit_build(build, lock_id) == [build.id]
+        dispatch_build.assert_called_once_with(build, lock_id)
+        assert cache.ttl(lock_id) > build.plan.build_timeout - 60
+        cache.delete(lock_id)
+
+    @mock.patch("metaci.build.scheduler.check_queued_build")
+    def test_org_taken_while_waiting(
+        self, check_queued_build, dispatch_build, django_capture_on_commit_callbacks
+    ):
+        build = self.make_build(RepositoryFactory())
+        lock_id = f"metaci-scheduler-test-{build.id}"
+        cache.set(lock_id, "build-0", timeout=60)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            assert submit_build(build, lock_id) == []
+        cache.delete(lock_id)
+
+        dispatch_build.assert_not_called()
+        check_queued_build.delay.assert_called_once_with(build.id)
+        assert not ScheduledBuild.objects.filter(build=build).exists()
+
+    def test_drops_finished_builds(self, dispatch_build):
+        repo = RepositoryFactory()
+        builds = [self.make_build(repo) for _ in range(3)]
+        for build in builds:
+            submit_build(build)
+        builds[2].status = "error"
+        builds[2].save()
+
+        with mock.patch("metaci.build.scheduler.release_org_lock") as release:
+            assert schedule_builds() == []
+        release.assert_not_called()
+        assert not ScheduledBuild.objects.filter(build=builds[2]).exists()
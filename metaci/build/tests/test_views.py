@@ -1,7 +1,10 @@
+from unittest import mock
+
 import pytest
 from django.urls import reverse
 from guardian.shortcuts import assign_perm
 
+from metaci.build.models import BuildTestSummary
 from metaci.fixtures.factories import RebuildFactory
 
 
@@ -70,6 +73,57 @@ class TestBuildViews:
 
         assert response.status_code == 200
 
+    def test_build_detail_tests__summary(self, client, superuser, data):
+        build = data["build"]
+        BuildTestSummary.objects.create(
+            build=build,
+            summary={
+                "total": 500,
+                "pass": 499,
+                "fail": 1,
+                "failed_tests": [
+                    {
+                        "id": 1,
+                        "method_id": 1,
+                        "method": "test_from_summary",
+                        "testclass": "SummaryTest",
+                        "message": "",
+                        "stacktrace": "",
+                    }
+                ],
+            },
+        )
+        client.force_login(superuser)
+        url = reverse("build_detail_tests", kwargs={"build_id": build.id})
+        response = client.get(url)
+
+        assert response.status_code == 200
+        assert "499 of 500 tests passed" in str(response.content)
+        assert "SummaryTest.test_from_summary" in str(response.content)
+
+    def test_build_detail_tests__stores_summary(self, client, superuser, data):
+        build = data["build"]
+        build.status = "success"
+        build.save()
+        client.force_login(superuser)
+        url = reverse("build_detail_tests", kwargs={"build_id": build.id})
+        response = client.get(url)
+
+        assert response.status_code == 200
+        summary = BuildTestSummary.objects.get(build=build)
+        assert summary.rebuild is None
+        assert summary.summary["total"] == build.flows.test_counts()["total"]
+
+    def test_build_detail_tests__rebuild_invalidates_summary(
+        self, client, superuser, data
+    ):
+        build = data["build"]
+        BuildTestSummary.objects.create(build=build, summary={})
+
+        RebuildFactory(build=build)
+
+        assert not BuildTestSummary.objects.filter(build=build).exists()
+
     def test_build_detail_rebuilds(self, client, superuser, data):
         client.force_login(superuser)
         url = reverse("build_detail_rebuilds", kwargs={"build_id": data["build"].id})
@@ -127,6 +181,93 @@ class TestBuildViews:
 
         assert response.status_code == 403
 
+    def test_build_log(self, client, superuser, data):
+        build = data["build"]
+        build.status = "running"
+        build.append_log("one\ntwo\npart")
+        build.save()
+        client.force_login(superuser)
+        url = reverse("build_log", kwargs={"build_id": build.id})
+
+        response = client.get(url)
+        tail = response.json()
+        assert tail["text"] == "one\ntwo\n"
+        assert tail["offset"] == 8
+        assert not tail["finished"]
+
+        build.append_log("ial\nthree\n")
+        build.save()
+        response = client.get(url, {"offset": tail["offset"]})
+        tail = response.json()
+        assert tail["text"] == "partial\nthree\n"
+        assert tail["offset"] == 22
+        assert not tail["reset"]
+
+    def test_build_log__finished(self, client, superuser, data):
+        build_flow = data["buildflow"]
+        build_flow.status = "success"
+        build_flow.append_log("\x1b[31mred\x1b[0m without newline")
+        build_flow.save()
+        client.force_login(superuser)
+        url = reverse(
+            "build_flow_log",
+            kwargs={"build_id": build_flow.build_id, "build_flow_id": build_flow.id},
+        )
+
+        tail = client.get(url, {"offset": 5, "wait": 10}).json()
+
+        assert tail["finished"]
+        assert tail["text"] == "red\x1b[0m without newline"
+        assert "\x1b" not in tail["html"]
+
+    def test_build_log__reset(self, client, superuser, data):
+        build = data["build"]
+        build.status = "running"
+        build.log = "Waiting on build #1 to complete\n"
+        build.save()
+        client.force_login(superuser)
+        url = reverse("build_log", kwargs={"build_id": build.id})
+
+        tail = client.get(url, {"offset": 1000}).json()
+
+        assert tail["reset"]
+        assert tail["text"] == "Waiting on build #1 to complete\n"
+
+    @mock.patch("metaci.build.views.time")
+    def test_build_log__wait_capped(self, time, client, superuser, data, settings):
+        settings.METACI_LOG_TAIL_WAIT = 2
+        time.monotonic.side_effect = range(100)
+        build = data["build"]
+        build.status = "running"
+        build.save()
+        client.force_login(superuser)
+        url = reverse("build_log", kwargs={"build_id": build.id})
+
+        tail = client.get(url, {"wait": 60}).json()
+
+        assert tail["text"] == ""
+        assert time.sleep.call_count == 1
+
+    def test_build_log__limit(self, client, superuser, data):
+        build = data["build"]
+        build.status = "success"
+        build.log = "one\ntwo\nthree\n"
+        build.save()
+        client.force_login(superuser)
+        url = reverse("build_log", kwargs={"build_id": build.id})
+
+        tail = client.get(url, {"offset": 4, "limit": 4}).json()
+
+        assert tail["text"] == "two\n"
+        assert tail["offset"] == 8
+
+    def test_build_log__permission_denied(self, client, user, data):
+        client.force_login(user)
+        url = reverse("build_log", kwargs={"build_id": data["build"].id})
+        response = client.get(url)
+
+        assert response.status_code == 403
+
     def test_build_rebuild(self, client, superuser, data):
         client.force_login(superuser)
         url = reverse("build_rebuild", kwargs={"build_id": data["build"].id})
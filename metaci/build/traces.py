@@ -0,0 +1,81 @@
+"""Recorded build arrivals, for replaying a day of builds in simulations
+of how builds are scheduled and how workers are scaled.
+
+A trace is a CSV with a row per build: the seconds since the start of
+the day it was queued, its repository, plan role and plan, and the
+seconds it ran for.
+"""
+import csv
+import datetime
+import typing as T
+
+from django.utils import timezone
+
+from metaci.build.models import Build
+
+
+class Arrival(T.NamedTuple):
+    seconds: float  # since the start of the day
+    repo: str
+    role: str
+    duration: float
+    plan: str = ""
+
+
+def record_arrivals(date):
+    """Returns the arrivals of the builds queued on a day which finished."""
+    start = timezone.make_aware(datetime.datetime.combine(date, datetime.time()))
+    builds = (
+        Build.objects.filter(
+            time_queue__gte=start,
+            time_queue__lt=start + datetime.timedelta(days=1),
+            time_start__isnull=False,
+            time_end__isnull=False,
+        )
+        .order_by("time_queue")
+        .values_list(
+            "time_queue",
+            "repo__owner",
+            "repo__name",
+            "plan__role",
+            "time_start",
+            "time_end",
+            "plan__name",
+        )
+    )
+    return [
+        Arrival(
+            (time_queue - start).total_seconds(),
+            f"{owner}/{name}",
+            role,
+            (time_end - time_start).total_seconds(),
+            plan,
+        )
+        for time_queue, owner, name, role, time_start, time_end, plan in builds
+    ]
+
+
+def read_arrivals(path):
+    with open(path, newline="") as f:
+        return [
+            Arrival(
+                float(row["seconds"]),
+                row["repo"],
+                row["role"],
+                float(row["duration"]),
+                row.get("plan") or "",
+            )
+            for row in csv.DictReader(f)
+        ]
+
+
+def write_arrivals(path, arrivals):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(Arrival._fields)
+        writer.writerows(arrivals)
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
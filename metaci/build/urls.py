@@ -43,6 +43,16 @@ urlpatterns = [
         views.build_detail_tests,
         name="build_detail_tests",
     ),
+    re_path(
+        r"^(?P<build_id>\d+)/log$",
+        views.build_log,
+        name="build_log",
+    ),
+    re_path(
+        r"^(?P<build_id>\d+)/flows/(?P<build_flow_id>\d+)/log$",
+        views.build_log,
+        name="build_flow_log",
+    ),
     re_path(
         r"^(?P<build_id>\d+)(?:/rebuilds/(?P<rebuild_id>[\d]+|original))?$",
         views.build_detail,
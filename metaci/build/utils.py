@@ -1,13 +1,22 @@
+import base64
+import binascii
+import hashlib
+import json
 import subprocess
 
 from ansi2html import Ansi2HTMLConverter
 from cumulusci.core.exceptions import CommandException
 from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.core.paginator import EmptyPage
 from django.core.paginator import PageNotAnInteger
 from django.core.paginator import Paginator
 from django.db.models import Q
 
+from metaci.testresults.models import compress_text, decompress_text
+
 
 def paginate(build_list, request):
     page = request.GET.get("page")
@@ -24,12 +33,150 @@ def paginate(build_list, request):
     return builds
 
 
+# Build lists are paged through by queue time, newest first, with the id
+# breaking ties
+BUILD_KEYSET = ("-time_queue", "-id")
+
+
+def encode_cursor(values, reverse=False):
+    # Datetimes keep their microseconds, unlike with DjangoJSONEncoder
+    data = json.dumps(
+        {"k": values, "r": reverse}, default=lambda value: value.isoformat()
+    )
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """Returns the key values and direction of a cursor.
+    Raises ValueError if the cursor is invalid."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return list(data["k"]), bool(data["r"])
+    except (binascii.Error, UnicodeError, TypeError, KeyError) as err:
+        raise ValueError(f"Invalid cursor: {err}")
+
+
+class KeysetPage:
+    """A page of results found by filtering on the key of the last row
+    of the previous page, rather than with OFFSET.
+
+    Fetching any page costs the same as fetching the first one, as long as
+    an index matches the ordering. Pages link to each other with cursors
+    instead of page numbers, and there is no total.
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def get_keyset_page(queryset, ordering, per_page, cursor=None):
+    """Returns the KeysetPage of queryset after (or before) the cursor.
+
+    The fields in ordering must all sort in the same direction
+    and together identify a row. Raises ValueError if the cursor is invalid.
+    """
+    descending = ordering[0].startswith("-")
+    fields = [field.lstrip("-") for field in ordering]
+    values, reverse = decode_cursor(cursor) if cursor else (None, False)
+    if values is not None:
+        if len(values) != len(fields):
+            raise ValueError("Invalid cursor: wrong number of values")
+        try:
+            values = [
+                queryset.query.resolve_ref(field).output_field.to_python(value)
+                for field, value in zip(fields, values)
+            ]
+        except ValidationError as err:
+            raise ValueError(f"Invalid cursor: {err}")
+        queryset = queryset.filter(keyset_filter(fields, values, descending != reverse))
+    if reverse:
+        ordering = [field if descending else f"-{field}" for field in fields]
+    rows = list(queryset.order_by(*ordering)[: per_page + 1])
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if reverse:
+        rows.reverse()
+
+    def row_cursor(row, reverse):
+        return encode_cursor([getattr(row, field) for field in fields], reverse)
+
+    next_cursor = previous_cursor = None
+    if rows and (more or reverse):
+        next_cursor = row_cursor(rows[-1], False)
+    if rows and values is not None and (more or not reverse):
+        previous_cursor = row_cursor(rows[0], True)
+    return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+def keyset_filter(fields, values, descending):
+    """Returns a filter for the rows sorting after values, written so the
+    database can seek to the position on an index of fields:
+    a <= x AND (a < x OR (a = x AND b < y))"""
+    op = "lt" if descending else "gt"
+    after = Q(**{f"{fields[-1]}__{op}": values[-1]})
+    for field, value in zip(fields[-2::-1], values[-2::-1]):
+        after = Q(**{f"{field}__{op}": value}) | (Q(**{field: value}) & after)
+    return Q(**{f"{fields[0]}__{op}e": values[0]}) & after
+
+
+def keyset_paginate(queryset, request, ordering=BUILD_KEYSET):
+    per_page = int(request.GET.get("per_page", "25"))
+    try:
+        return get_keyset_page(queryset, ordering, per_page, request.GET.get("cursor"))
+    except ValueError:
+        # If the cursor is invalid, deliver the first page.
+        return get_keyset_page(queryset, ordering, per_page)
+
+
+def estimate_count(queryset):
+    """Returns the number of rows the database planner expects the
+    queryset to return, without counting them."""
+    plan = json.loads(queryset.order_by().explain(format="json"))
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
 def set_build_info(build, **kwargs):
     for attr, value in kwargs.items():
         setattr(build, attr, value)
     build.save()
 
 
+# Columns build lists may be sorted by, keyed by the order_by parameter
+BUILD_ORDERING_FIELDS = {
+    "id": "id",
+    "time_queue": "time_queue",
+    "time_start": "time_start",
+    "time_end": "effective_time_end",
+    "status": "effective_status",
+}
+
+
+def get_build_ordering(request):
+    """Returns the ordering requested by the order_by parameter, ignoring
+    any columns build lists can't be sorted by."""
+    ordering = []
+    for field in request.GET.get("order_by", "").split(","):
+        descending = field.startswith("-")
+        field = BUILD_ORDERING_FIELDS.get(field.lstrip("-"))
+        if field:
+            ordering.append(f"-{field}" if descending else field)
+    return ordering or ["-time_queue"]
+
+
 def view_queryset(request, query=None, status=None, filterset_class=None):
     if not query:
         query = {}
@@ -39,21 +186,23 @@ def view_queryset(request, query=None, status=None, filterset_class=None):
     if query:
         builds = builds.filter(**query)
     if status:
-        builds = builds.filter(
-            Q(current_rebuild__isnull=True, status=status)
-            | Q(current_rebuild__isnull=False, current_rebuild__status=status)
-        )
+        builds = builds.filter(effective_status=status)
+    ordering = get_build_ordering(request)
+    builds = builds.order_by(*ordering)
 
-    order_by = request.GET.get("order_by", "-time_queue")
-    order_by = order_by.split(",")
-    builds = builds.order_by(*order_by)
+    # Lists in the default order are paged through with cursors.
+    # Other orderings, and links to page numbers, use OFFSET.
+    if ordering == ["-time_queue"] and "page" not in request.GET:
+        pager = keyset_paginate
+    else:
+        pager = paginate
 
     if filterset_class:
         build_filter = filterset_class(request.GET, builds)
-        paginated = paginate(build_filter.qs, request)
+        paginated = pager(build_filter.qs, request)
         return build_filter, paginated
     else:
-        builds = paginate(builds, request)
+        builds = pager(builds, request)
         return builds
 
 
@@ -65,6 +214,38 @@ def format_log(log):
     return headers + content
 
 
+def render_log_html(log, cache_html=False):
+    """Returns format_log(log), cached by a hash of the log if cache_html
+    is set. Only logs which won't change any more should be cached."""
+    if not cache_html:
+        return format_log(log)
+    key = "log-html:" + hashlib.sha1(log.encode("utf-8")).hexdigest()
+    cached = cache.get(key)
+    if cached is not None:
+        return decompress_text(cached)
+    log_html = format_log(log)
+    cache.set(key, compress_text(log_html), settings.METACI_LOG_HTML_CACHE_TIMEOUT)
+    return log_html
+
+
+def log_window_start(log):
+    """Returns where the part of a log shown on the build page starts:
+    the first full line of the last METACI_LOG_HTML_WINDOW characters."""
+    window = settings.METACI_LOG_HTML_WINDOW
+    if not window or len(log) <= window:
+        return 0
+    start = len(log) - window
+    newline = log.find("\n", start, len(log) - 1)
+    return newline + 1 if newline != -1 else start
+
+
+def format_log_lines(lines):
+    """Converts part of a log to html, for appending to the
+    content of a log already converted by format_log."""
+    conv = Ansi2HTMLConverter(dark_bg=False, scheme="solarized")
+    return conv.convert(lines, full=False)
+
+
 def run_command(command, env=None, cwd=None):
     kwargs = {}
     if env:
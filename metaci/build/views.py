@@ -1,16 +1,28 @@
+import time
+
 from django.conf import settings
 from django.contrib.auth.decorators import permission_required
 from django.core.exceptions import PermissionDenied
 from django.db import transaction
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseBadRequest, HttpResponseRedirect, JsonResponse
 from django.shortcuts import get_object_or_404, render
 from django.utils import timezone
 from watson import search as watson
 
 from metaci.build.filters import BuildFilter
 from metaci.build.forms import QATestingForm
-from metaci.build.models import Build, Rebuild
-from metaci.build.utils import view_queryset
+from metaci.build.models import (
+    FINISHED_FLOW_STATUSES,
+    FINISHED_STATUSES,
+    Build,
+    BuildFlow,
+    BuildTestSummary,
+    Rebuild,
+)
+from metaci.build.utils import format_log_lines, view_queryset
+
+# Seconds between checks for new log output while waiting for it
+LOG_TAIL_POLL_INTERVAL = 1
 
 
 def build_list(request):
@@ -47,17 +59,21 @@ def build_detail_base(request, build_id, rebuild_id):
 
     flows = flows.order_by("time_queue")
 
-    tests = {"total": 0, "pass": 0, "fail": 0, "failed_tests": []}
-
-    for flow in flows.all():
-        if flow.tests_total:
-            tests["total"] += flow.tests_total
-        if flow.tests_pass:
-            tests["pass"] += flow.tests_pass
-        if flow.tests_fail:
-            tests["fail"] += flow.tests_fail
-            tests["failed_tests"].extend(
-                list(flow.test_results.filter(outcome__in=["Fail", "CompileFail"]))
+    tests = None
+    if not rebuild_id:
+        tests = (
+            BuildTestSummary.objects.filter(
+                build=build, rebuild_id=build.current_rebuild_id
+            )
+            .values_list("summary", flat=True)
+            .first()
+        )
+    if tests is None:
+        tests = flows.test_summary()
+        if not rebuild_id and build.get_status() in FINISHED_STATUSES:
+            BuildTestSummary.objects.update_or_create(
+                build=build,
+                defaults={"rebuild": build.current_rebuild, "summary": tests},
             )
 
     obj_perms = {
@@ -147,6 +163,80 @@ def build_detail_qa(request, build_id, rebuild_id=None):
     return render(request, "build/detail_qa.html", context=context)
 
 
+@transaction.non_atomic_requests
+def build_log(request, build_id, build_flow_id=None):
+    """Returns the log of a build or build flow after the `offset` query
+    parameter, so a running build can be followed by fetching only its
+    new output.
+
+    The response has the new text, the same text converted to html, and
+    the offset to ask for next. While the build is running only complete
+    lines are returned. `limit` caps the number of characters returned,
+    for loading a long log in windows. With `wait=<seconds>` the request
+    waits a few seconds at most for new output before responding, as it
+    holds a web worker while it waits.
+    """
+    build = get_object_or_404(Build, id=build_id)
+    if not request.user.has_perm("plan.view_builds", build.planrepo):
+        raise PermissionDenied("You are not authorized to view this build")
+    owner = build
+    if build_flow_id:
+        owner = get_object_or_404(BuildFlow, build_id=build.id, id=build_flow_id)
+
+    try:
+        offset = max(int(request.GET.get("offset", 0)), 0)
+        limit = request.GET.get("limit")
+        limit = max(int(limit), 1) if limit else None
+        wait = min(float(request.GET.get("wait", 0)), settings.METACI_LOG_TAIL_WAIT)
+    except ValueError:
+        return HttpResponseBadRequest("offset, limit and wait must be numbers")
+
+    deadline = time.monotonic() + wait
+    tail = read_log_tail(owner, offset, limit)
+    while not has_log_news(tail) and time.monotonic() < deadline:
+        time.sleep(LOG_TAIL_POLL_INTERVAL)
+        tail = read_log_tail(owner, offset, limit)
+    return JsonResponse(tail)
+
+
+def read_log_tail(owner, offset, limit=None):
+    # Check the status before reading, so no output is missed
+    # when the build finishes in between
+    if isinstance(owner, BuildFlow):
+        status = (
+            BuildFlow.objects.filter(id=owner.id)
+            .values_list("status", flat=True)
+            .first()
+        )
+        finished = status in FINISHED_FLOW_STATUSES
+    else:
+        status = (
+            Build.objects.filter(id=owner.id)
+            .values_list("effective_status", flat=True)
+            .first()
+        )
+        finished = status in FINISHED_STATUSES
+
+    text, end = owner.read_log(offset, limit)
+    reset = end - len(text) != offset
+    if not finished:
+        # The rest of a partial line arrives with the next flush
+        complete = text.rfind("\n") + 1
+        end -= len(text) - complete
+        text = text[:complete]
+    return {
+        "offset": end,
+        "reset": reset,
+        "finished": finished,
+        "text": text,
+        "html": format_log_lines(text),
+    }
+
+
+def has_log_news(tail):
+    return bool(tail["text"]) or tail["reset"] or tail["finished"]
+
+
 def build_rebuild(request, build_id):
     build = get_object_or_404(Build, id=build_id)
 
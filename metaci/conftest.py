@@ -1,7 +1,9 @@
 import os
+from unittest import mock
 
 import pytest
 import responses
+from django.core.cache.backends.locmem import LocMemCache
 
 from metaci.fixtures.data_fixtures import data, superuser, user
 from metaci.fixtures.factories import (
@@ -36,6 +38,20 @@ def restore_cwd():
         os.chdir(cwd)
 
 
+@pytest.fixture(autouse=True)
+def permission_scope_cache():
+    """Give each test its own permission scope cache.
+
+    Test transactions never commit, so permission changes drop the cached
+    scopes straight away instead of waiting for the commit."""
+    scope_cache = LocMemCache("permission-scopes", {})
+    scope_cache.clear()
+    with mock.patch("metaci.plan.models.cache", scope_cache), mock.patch(
+        "metaci.plan.handlers.transaction.on_commit", lambda func: func()
+    ):
+        yield scope_cache
+
+
 @pytest.fixture()
 def mocked_responses():
     with responses.RequestsMock() as mocked:
@@ -15,20 +15,20 @@ class LogStream(object):
     """File-like interface to Django model."""
 
     def __init__(self, model):
-        if not hasattr(model, "log"):
-            raise LoggerException('Model does not have "log" attribute.')
+        if not hasattr(model, "append_log"):
+            raise LoggerException('Model does not have "append_log" method.')
         self.model = model
         self.buffer = ""
         self.last_save_time = timezone.now()
 
     def flush(self, force=False):
-        if self.model.log is None:
-            self.model.log = u""
-        self.model.log += self.buffer
-        self.buffer = ""
+        if self.buffer:
+            self.model.append_log(self.buffer)
+            self.buffer = ""
         now = timezone.now()
         if force or now - self.last_save_time > datetime.timedelta(seconds=1):
-            self.model.save()
+            # Only the new log text is written, not the whole model
+            self.model.store_log()
             self.last_save_time = now
 
     def write(self, s):
@@ -31,7 +31,9 @@ class OrgQuerySet(models.QuerySet):
         if perms is None:
             perms = "plan.org_login"
         PlanRepository = apps.get_model("plan.PlanRepository")
-        planrepos = PlanRepository.objects.for_user(user, perms)
+        planrepos = PlanRepository.objects.filter(
+            id__in=PlanRepository.objects.ids_for_user(user, perms)
+        )
         planrepos = planrepos.values("plan__org", "repo")
         q = models.Q()
         for plan_org in planrepos:
@@ -3,10 +3,11 @@ from typing import Iterable
 
 from django.core.management.base import BaseCommand
 from django.db import transaction
+from django.db.models import Exists, OuterRef
 from django.utils import timezone
 
-from metaci.build.models import BuildFlow
-from metaci.testresults.models import TestResult, TestResultAsset
+from metaci.build.models import BuildFlow, BuildFlowLogChunk
+from metaci.testresults.models import RobotSuiteFragment, TestResult, TestResultAsset
 
 
 class Command(BaseCommand):
@@ -42,7 +43,12 @@ class Command(BaseCommand):
                 self.stdout.write(
                     f"Clearing {count} build flow logs from over a year ago..."
                 )
-                build_flows.update(log="")
+                BuildFlowLogChunk.objects.filter(build_flow__in=build_flows).delete()
+            archived = build_flows.exclude(log_archive="").exclude(
+                log_archive__isnull=True
+            )
+            for build_flow in commit_periodically(archived.iterator()):
+                build_flow.delete_log_archive()
             self.stdout.write("Done.\n")
 
         # test result assets
@@ -72,3 +78,17 @@ class Command(BaseCommand):
         # and aren't using signals with this model.
         old_test_results._raw_delete(old_test_results.db)
         self.stdout.write("Done.\n")
+
+        # robot suite fragments
+        self.stdout.write("Querying unused robot suite fragments...")
+        unused_fragments = RobotSuiteFragment.objects.filter(
+            build_flow__time_queue__lte=year_ago
+        ).exclude(
+            Exists(TestResult.objects.filter(robot_suite_fragment=OuterRef("pk")))
+        )
+        count = unused_fragments.count()
+        self.stdout.write(f"Deleting {count} robot suite fragments...")
+        # No test results reference these fragments any more,
+        # so nothing would be cascaded or protected.
+        unused_fragments._raw_delete(unused_fragments.db)
+        self.stdout.write("Done.\n")
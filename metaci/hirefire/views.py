@@ -3,10 +3,8 @@ import json
 from django.conf import settings
 from django.core.exceptions import PermissionDenied
 from django.http import HttpResponse, HttpResponseBadRequest
-from django_rq.queues import get_connection, get_queue_by_index
-from django_rq.settings import QUEUES_LIST
-from rq import Worker
-from rq.registry import DeferredJobRegistry, FinishedJobRegistry, StartedJobRegistry
+
+from metaci.build.queue_metrics import get_queue_metrics
 
 
 def test(request):
@@ -27,41 +25,9 @@ def info(request, token):
     if token != settings.HIREFIRE_TOKEN:
         raise PermissionDenied("Invalid token")
 
-    current_tasks = 0
-
-    queues = []
-    for index, config in enumerate(QUEUES_LIST):
-
-        queue = get_queue_by_index(index)
-        connection = queue.connection
-
-        # Only look at the default queue
-        if queue.name != "default":
-            continue
-
-        queue_data = {
-            "name": queue.name,
-            "jobs": queue.count,
-            "index": index,
-            "connection_kwargs": connection.connection_pool.connection_kwargs,
-        }
-
-        connection = get_connection(queue.name)
-        all_workers = Worker.all(connection=connection)
-        queue_workers = [worker for worker in all_workers if queue in worker.queues]
-        queue_data["workers"] = len(queue_workers)
-
-        finished_job_registry = FinishedJobRegistry(queue.name, connection)
-        started_job_registry = StartedJobRegistry(queue.name, connection)
-        deferred_job_registry = DeferredJobRegistry(queue.name, connection)
-        queue_data["finished_jobs"] = len(finished_job_registry)
-        queue_data["started_jobs"] = len(started_job_registry)
-        queue_data["deferred_jobs"] = len(deferred_job_registry)
-
-        current_tasks += queue_data["jobs"]
-        current_tasks += queue_data["started_jobs"]
-
-        queues.append(queue_data)
+    # Only look at the default queue
+    metrics = get_queue_metrics()["default"]
+    current_tasks = metrics.jobs + metrics.started_jobs
 
     payload = [{"quantity": current_tasks, "name": "worker"}]
 
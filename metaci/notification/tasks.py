@@ -33,6 +33,9 @@ def queue_build_notifications(build_id):
     if build.get_status() in ["queued", "waiting", "in_progress"]:
         return "Skipping, build not done yet"
 
+    if build.get_status() == "canceled":
+        return "Skipping, build was canceled"
+
     if build.get_status() == "success":
         status_query["on_success"] = True
     elif build.get_status() == "fail":
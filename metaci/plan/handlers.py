@@ -1,7 +1,16 @@
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
+from guardian.models import GroupObjectPermission, UserObjectPermission
 
 from metaci.build.signals import build_complete
-from metaci.plan.models import PlanRepositoryTrigger
+from metaci.plan.models import (
+    PlanRepository,
+    PlanRepositoryTrigger,
+    invalidate_permission_scopes,
+)
+from metaci.users.models import User
 
 
 @receiver(build_complete)
@@ -24,3 +33,23 @@ def trigger_dependent_builds(sender, **kwargs):
             build.save()
             # Intentionally swallow the exception,
             # so that we don't error the trigger build or block other triggers.
+
+
+@receiver(post_save, sender=UserObjectPermission)
+@receiver(post_delete, sender=UserObjectPermission)
+@receiver(post_save, sender=GroupObjectPermission)
+@receiver(post_delete, sender=GroupObjectPermission)
+@receiver(post_save, sender=PlanRepository)
+@receiver(post_delete, sender=PlanRepository)
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def permissions_changed(sender, **kwargs):
+    """Cached permission scopes are dropped whenever object permissions,
+    global permissions, group memberships or plan repositories change.
+
+    The drop waits for the change to commit, so a concurrent request can't
+    cache the old scope again under the new version."""
+    action = kwargs.get("action", "post_")
+    if action.startswith("post_") and not kwargs.get("raw"):
+        transaction.on_commit(invalidate_permission_scopes)
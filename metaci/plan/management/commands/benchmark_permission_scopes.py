@@ -0,0 +1,79 @@
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from guardian.shortcuts import assign_perm, get_objects_for_user
+
+from metaci import conftest as fact
+from metaci.build.models import Build
+from metaci.plan import models as plan_models
+from metaci.plan.models import Plan, PlanRepository
+from metaci.repository.models import Repository
+
+
+def guardian_scopes(user):
+    """The for_user querysets as they were before scopes were cached,
+    each repeating guardian's permission subqueries."""
+    planrepos = get_objects_for_user(user, "plan.view_builds", PlanRepository)
+    return [
+        Build.objects.filter(planrepo__in=planrepos),
+        Repository.objects.filter(planrepository__in=planrepos).distinct(),
+        Plan.objects.filter(planrepository__in=planrepos).distinct(),
+    ]
+
+
+def cached_scopes(user):
+    return [
+        Build.objects.for_user(user),
+        Repository.objects.for_user(user),
+        Plan.objects.for_user(user),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares for_user querysets using guardian permission subqueries "
+        "with the cached permission scopes. All rows are rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--planrepos", type=int, default=200, help="Number of plan repositories"
+        )
+        parser.add_argument(
+            "--builds", type=int, default=5, help="Builds per plan repository"
+        )
+        parser.add_argument(
+            "--requests", type=int, default=50, help="Number of simulated requests"
+        )
+
+    def handle(self, *args, **options):
+        cache = LocMemCache("benchmark-permission-scopes", {})
+        original_cache = plan_models.cache
+        plan_models.cache = cache
+        try:
+            with transaction.atomic():
+                user = fact.UserFactory()
+                for i in range(options["planrepos"]):
+                    planrepo = fact.PlanRepositoryFactory()
+                    fact.BuildFactory.create_batch(options["builds"], planrepo=planrepo)
+                    if i % 2:
+                        assign_perm("plan.view_builds", user, planrepo)
+
+                for label, scopes in (
+                    ("guardian subqueries", guardian_scopes),
+                    ("cached scopes", cached_scopes),
+                ):
+                    cache.clear()
+                    start = time.perf_counter()
+                    for _ in range(options["requests"]):
+                        counts = [queryset.count() for queryset in scopes(user)]
+                    elapsed = time.perf_counter() - start
+                    self.stdout.write(
+                        f"{label}: {options['requests']} requests in "
+                        f"{elapsed:.2f}s (builds, repos, plans: {counts})"
+                    )
+                transaction.set_rollback(True)
+        finally:
+            plan_models.cache = original_cache
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.16 on 2026-10-18 22:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("plan", "0040_plan_commit_status_regex"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="plan",
+            name="coalesce_builds",
+            field=models.BooleanField(
+                default=False,
+                help_text="If set, a push to a branch cancels the queued and waiting builds of this plan for older commits on the branch.",
+            ),
+        ),
+        migrations.AddField(
+            model_name="plan",
+            name="coalesce_running_builds",
+            field=models.BooleanField(
+                default=False,
+                help_text="If set along with coalesce builds, running builds of older commits also stop before their next flow.",
+            ),
+        ),
+    ]
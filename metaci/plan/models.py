@@ -2,6 +2,8 @@ import re
 
 import yaml
 from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.http import Http404
@@ -56,15 +58,25 @@ def validate_yaml_field(value):
         raise ValidationError(f"Error parsing additional YAML: {err}")
 
 
+PERMISSION_SCOPE_VERSION_KEY = "permission-scope:version"
+
+
+def invalidate_permission_scopes():
+    """Drops the cached plan repository ids of every user."""
+    try:
+        cache.incr(PERMISSION_SCOPE_VERSION_KEY)
+    except ValueError:
+        cache.set(PERMISSION_SCOPE_VERSION_KEY, 1, None)
+
+
 class PlanQuerySet(models.QuerySet):
     def for_user(self, user, perms=None):
         if user.is_superuser:
             return self
-        if perms is None:
-            perms = "plan.view_builds"
+        planrepo_ids = PlanRepository.objects.ids_for_user(user, perms)
         return self.filter(
-            planrepository__in=PlanRepository.objects.for_user(user, perms)
-        ).distinct()
+            id__in=PlanRepository.objects.filter(id__in=planrepo_ids).values("plan_id")
+        )
 
     def get_for_user_or_404(self, user, query, perms=None):
         try:
@@ -111,6 +123,14 @@ class Plan(models.Model):
         help_text="Default is set to False, set to true to toggle change traffic control integration on this plan.",
     )
     active = models.BooleanField(default=True)
+    coalesce_builds = models.BooleanField(
+        default=False,
+        help_text="If set, a push to a branch cancels the queued and waiting builds of this plan for older commits on the branch.",
+    )
+    coalesce_running_builds = models.BooleanField(
+        default=False,
+        help_text="If set along with coalesce builds, running builds of older commits also stop before their next flow.",
+    )
     keep_org_on_error = models.BooleanField(default=False)
     keep_org_on_fail = models.BooleanField(default=False)
     dashboard = models.CharField(
@@ -239,9 +259,29 @@ class PlanRepositoryQuerySet(models.QuerySet):
     def for_user(self, user, perms=None):
         if user.is_superuser:
             return self
+        return self.filter(id__in=self.ids_for_user(user, perms))
+
+    def ids_for_user(self, user, perms=None):
+        """Returns the ids of all plan repositories the user has perms on.
+
+        The ids are cached per user and permission until permissions
+        change, so querysets can filter on them instead of repeating
+        guardian's permission subqueries.
+        """
         if not perms:
             perms = "plan.view_builds"
-        return get_objects_for_user(user, perms, PlanRepository)
+        perms_key = perms if isinstance(perms, str) else ",".join(sorted(perms))
+        version = cache.get_or_set(PERMISSION_SCOPE_VERSION_KEY, 1, None)
+        key = f"permission-scope:{version}:{user.pk}:{perms_key}"
+        ids = cache.get(key)
+        if ids is None:
+            ids = list(
+                get_objects_for_user(user, perms, PlanRepository).values_list(
+                    "id", flat=True
+                )
+            )
+            cache.set(key, ids, settings.METACI_PERMISSION_SCOPE_CACHE_TIMEOUT)
+        return ids
 
     def get_for_user_or_404(self, user, query, perms=None):
         try:
@@ -1,8 +1,15 @@
+from unittest import mock
+
 import pytest
 from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from guardian.shortcuts import assign_perm, remove_perm
 
-from metaci.plan.models import Plan
+from metaci.build.models import Build
+from metaci.conftest import BuildFactory, PlanRepositoryFactory, UserFactory
+from metaci.plan.models import Plan, PlanRepository
 from metaci.repository.models import Repository
 
 
@@ -193,3 +200,59 @@ class PlanTestCase(TestCase):
             match="Only Plans with a Commit Status trigger may specify a Commit Status Regex.",
         ):
             self.commit_plan.clean()
+
+
+@pytest.mark.django_db
+class TestPermissionScopes:
+    def test_ids_for_user__cached(self):
+        user = UserFactory()
+        planrepo = PlanRepositoryFactory()
+        PlanRepositoryFactory()
+        assign_perm("plan.view_builds", user, planrepo)
+
+        assert PlanRepository.objects.ids_for_user(user) == [planrepo.id]
+        with CaptureQueriesContext(connection) as queries:
+            assert PlanRepository.objects.ids_for_user(user) == [planrepo.id]
+        assert len(queries) == 0
+
+    def test_ids_for_user__perms(self):
+        user = UserFactory()
+        planrepo = PlanRepositoryFactory()
+        assign_perm("plan.view_builds", user, planrepo)
+
+        assert PlanRepository.objects.ids_for_user(user, "plan.org_login") == []
+        assert PlanRepository.objects.ids_for_user(user) == [planrepo.id]
+
+    def test_ids_for_user__invalidated(self):
+        user = UserFactory()
+        planrepo = PlanRepositoryFactory()
+        assert PlanRepository.objects.ids_for_user(user) == []
+
+        assign_perm("plan.view_builds", user, planrepo)
+        assert PlanRepository.objects.ids_for_user(user) == [planrepo.id]
+
+        remove_perm("plan.view_builds", user, planrepo)
+        assert PlanRepository.objects.ids_for_user(user) == []
+
+    def test_ids_for_user__invalidated_on_commit(self):
+        user = UserFactory()
+        planrepo = PlanRepositoryFactory()
+        assert PlanRepository.objects.ids_for_user(user) == []
+
+        with mock.patch("metaci.plan.handlers.transaction.on_commit") as on_commit:
+            assign_perm("plan.view_builds", user, planrepo)
+        assert PlanRepository.objects.ids_for_user(user) == []
+
+        on_commit.call_args[0][0]()
+        assert PlanRepository.objects.ids_for_user(user) == [planrepo.id]
+
+    def test_for_user(self):
+        user = UserFactory()
+        build = BuildFactory()
+        BuildFactory()
+        assign_perm("plan.view_builds", user, build.planrepo)
+
+        assert list(Build.objects.for_user(user)) == [build]
+        assert list(Repository.objects.for_user(user)) == [build.repo]
+        assert list(Plan.objects.for_user(user)) == [build.plan]
+        assert list(PlanRepository.objects.for_user(user)) == [build.planrepo]
@@ -0,0 +1,154 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F
+from django.db.models.expressions import RawSQL, Window
+from django.db.models.functions import RowNumber
+from django.urls import reverse
+
+from metaci.build.models import Build
+from metaci.plan.models import Plan, PlanRepository
+from metaci.repository.models import Repository
+
+# Number of builds shown per repository for each plan dashboard setting
+DASHBOARD_BUILDS = {"last": 1, "recent": 5}
+
+VERSION_KEY = "repo-dashboard:version"
+
+
+def get_repo_dashboard(user, owner=None):
+    """Returns the repositories and dashboard plan columns of the repo list,
+    cached for everyone who can see the same plan repositories.
+
+    The cache is cleared whenever a build completes.
+    """
+    if user.is_superuser:
+        scope = "all"
+    else:
+        planrepo_ids = PlanRepository.objects.ids_for_user(user)
+        scope = hashlib.sha1(
+            ",".join(str(pk) for pk in sorted(planrepo_ids)).encode("utf-8")
+        ).hexdigest()
+    version = cache.get_or_set(VERSION_KEY, 1, None)
+    key = f"repo-dashboard:{version}:{scope}:{owner or ''}"
+    dashboard = cache.get(key)
+    if dashboard is None:
+        dashboard = build_repo_dashboard(user, owner)
+        cache.set(key, dashboard, settings.METACI_REPO_DASHBOARD_CACHE_TIMEOUT)
+    return dashboard
+
+
+def invalidate_repo_dashboards():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+
+def build_repo_dashboard(user, owner=None):
+    """Builds the repo list in a fixed number of queries:
+    the repositories, their build counts, their dashboard plans,
+    and the latest builds of each repository and plan."""
+    repos = Repository.objects.for_user(user)
+    if owner:
+        repos = repos.filter(owner=owner)
+    repos = list(repos.values_list("id", "name", "owner"))
+    repo_ids = [repo_id for repo_id, _, _ in repos]
+
+    build_counts = dict(
+        Build.objects.for_user(user)
+        .filter(repo_id__in=repo_ids)
+        .order_by()
+        .values("repo_id")
+        .annotate(count=Count("id"))
+        .values_list("repo_id", "count")
+    )
+
+    dashboard_plans = {}  # repo id -> [(plan id, plan name, dashboard)]
+    plan_ids = set()
+    planrepos = (
+        PlanRepository.objects.filter(
+            repo_id__in=repo_ids,
+            plan_id__in=Plan.objects.for_user(user).values("id"),
+            plan__dashboard__isnull=False,
+        )
+        .order_by()
+        .values_list("repo_id", "plan_id", "plan__name", "plan__dashboard")
+    )
+    for repo_id, plan_id, plan_name, dashboard in planrepos:
+        dashboard_plans.setdefault(repo_id, []).append((plan_id, plan_name, dashboard))
+        plan_ids.add(plan_id)
+
+    latest_builds = {}  # (repo id, plan id) -> builds, newest first
+    if plan_ids:
+        for build in get_latest_builds(repo_ids, plan_ids):
+            latest_builds.setdefault((build["repo_id"], build["plan_id"]), []).append(
+                {
+                    "url": reverse("build_detail", kwargs={"build_id": build["id"]}),
+                    "commit": build["commit"],
+                    "status": build["effective_status"],
+                    "time_start": build["current_rebuild__time_start"]
+                    if build["current_rebuild_id"]
+                    else build["time_start"],
+                }
+            )
+
+    columns = sorted(
+        {plan_name for plans in dashboard_plans.values() for _, plan_name, _ in plans}
+    )
+    repo_list = []
+    for repo_id, name, repo_owner in repos:
+        repo_columns = {}
+        for plan_id, plan_name, dashboard in dashboard_plans.get(repo_id, []):
+            builds = latest_builds.get((repo_id, plan_id), [])
+            builds = builds[: DASHBOARD_BUILDS.get(dashboard, 0)]
+            if builds:
+                repo_columns[plan_name] = builds
+        repo_list.append(
+            {
+                "name": name,
+                "owner": repo_owner,
+                "title": f"{repo_owner}/{name}",
+                "build_count": build_counts.get(repo_id, 0),
+                "columns": [repo_columns.get(column) for column in columns],
+            }
+        )
+    return {"repos": repo_list, "columns": columns}
+
+
+def get_latest_builds(repo_ids, plan_ids):
+    """Returns the most recent builds of each repository and plan,
+    using a window function to number them."""
+    ranked = (
+        Build.objects.filter(repo_id__in=repo_ids, plan_id__in=plan_ids)
+        .annotate(
+            build_rank=Window(
+                RowNumber(),
+                partition_by=[F("repo_id"), F("plan_id")],
+                order_by=[F("time_queue").desc(), F("id").desc()],
+            )
+        )
+        .order_by()
+        .values("id", "build_rank")
+    )
+    sql, params = ranked.query.sql_with_params()
+    return (
+        Build.objects.filter(
+            id__in=RawSQL(
+                f"SELECT id FROM ({sql}) ranked WHERE build_rank <= %s",
+                (*params, max(DASHBOARD_BUILDS.values())),
+            )
+        )
+        .order_by("-time_queue", "-id")
+        .values(
+            "id",
+            "repo_id",
+            "plan_id",
+            "commit",
+            "effective_status",
+            "time_start",
+            "current_rebuild_id",
+            "current_rebuild__time_start",
+        )
+    )
@@ -1,6 +1,8 @@
 from django.db.models.signals import pre_save
 from django.dispatch import receiver
 
+from metaci.build.signals import build_complete
+from metaci.repository.dashboard import invalidate_repo_dashboards
 from metaci.repository.models import Repository
 
 
@@ -10,3 +12,8 @@ def get_github_id(sender, **kwargs):
     if not repo.github_id:
         gh = repo.get_github_api()
         repo.github_id = gh.id
+
+
+@receiver(build_complete)
+def refresh_repo_dashboards(sender, **kwargs):
+    invalidate_repo_dashboards()
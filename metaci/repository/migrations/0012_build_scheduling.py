@@ -0,0 +1,32 @@
+# Generated by Django 3.2.16 on 2026-10-18 21:40
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("repository", "0011_metadata"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="repository",
+            name="build_weight",
+            field=models.PositiveIntegerField(
+                default=1,
+                help_text="Share of worker slots the fair-share scheduler gives this repository's builds, relative to other repositories.",
+                validators=[django.core.validators.MinValueValidator(1)],
+            ),
+        ),
+        migrations.AddField(
+            model_name="repository",
+            name="max_concurrent_builds",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="If set, the fair-share scheduler runs at most this many of this repository's builds at a time.",
+                null=True,
+            ),
+        ),
+    ]
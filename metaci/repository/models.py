@@ -2,6 +2,7 @@ import github3.exceptions
 from cumulusci.core.exceptions import GithubException
 from cumulusci.core.github import get_github_api_for_repo
 from django.apps import apps
+from django.core.validators import MinValueValidator
 from django.db import models
 from django.http import Http404
 from django.urls import reverse
@@ -15,12 +16,11 @@ class RepositoryQuerySet(models.QuerySet):
     def for_user(self, user, perms=None):
         if user.is_superuser:
             return self
-        if perms is None:
-            perms = "plan.view_builds"
         PlanRepository = apps.get_model("plan.PlanRepository")
+        planrepo_ids = PlanRepository.objects.ids_for_user(user, perms)
         return self.filter(
-            planrepository__in=PlanRepository.objects.for_user(user, perms)
-        ).distinct()
+            id__in=PlanRepository.objects.filter(id__in=planrepo_ids).values("repo_id")
+        )
 
     def get_for_user_or_404(self, user, query, perms=None):
         try:
@@ -37,6 +37,16 @@ class Repository(models.Model):
     release_tag_regex = models.CharField(max_length=255, blank=True, null=True)
     default_implementation_steps = models.JSONField(null=True, blank=True, default=list)
     metadata = models.JSONField(null=True, blank=True, default=dict)
+    build_weight = models.PositiveIntegerField(
+        default=1,
+        validators=[MinValueValidator(1)],
+        help_text="Share of worker slots the fair-share scheduler gives this repository's builds, relative to other repositories.",
+    )
+    max_concurrent_builds = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="If set, the fair-share scheduler runs at most this many of this repository's builds at a time.",
+    )
 
     objects = RepositoryQuerySet.as_manager()
 
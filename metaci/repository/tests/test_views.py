@@ -4,15 +4,20 @@ from unittest import mock
 from unittest.mock import patch
 
 import pytest
+from django.core.cache.backends.locmem import LocMemCache
 from django.core.exceptions import PermissionDenied
+from django.db import connection
 from django.test import Client, TestCase
 from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from guardian.shortcuts import assign_perm
 
 from metaci.build.models import Build
+from metaci.build.signals import build_complete
 from metaci.conftest import (
     BranchFactory,
+    BuildFactory,
     PlanFactory,
     PlanRepositoryFactory,
     ReleaseFactory,
@@ -41,6 +46,11 @@ class TestRepositoryViews(TestCase):
         cls.branch = BranchFactory(name="test-branch", repo=cls.repo)
         super(TestRepositoryViews, cls).setUpTestData()
 
+    def setUp(self):
+        # LocMemCaches with the same name share their storage
+        self.repo_list_cache = LocMemCache("repo-list-tests", {})
+        self.repo_list_cache.clear()
+
     @pytest.mark.django_db
     def test_repo_list(self):
         self.client.force_login(self.superuser)
@@ -49,6 +59,77 @@ class TestRepositoryViews(TestCase):
         response = self.client.get(url)
         assert response.status_code == 200
 
+    @pytest.mark.django_db
+    def test_repo_list__queries(self):
+        planrepos = [self.planrepo]
+        for i in range(10):
+            repo = RepositoryFactory(name=f"Repo{i}")
+            planrepos.append(PlanRepositoryFactory(plan=self.plan, repo=repo))
+        for planrepo in planrepos:
+            for _ in range(3):
+                BuildFactory(planrepo=planrepo)
+        self.client.force_login(self.superuser)
+        url = reverse("repo_list")
+
+        with mock.patch("metaci.repository.dashboard.cache", self.repo_list_cache):
+            with CaptureQueriesContext(connection) as uncached:
+                response = self.client.get(url)
+            assert response.status_code == 200
+            with CaptureQueriesContext(connection) as cached:
+                response = self.client.get(url)
+            assert response.status_code == 200
+
+        # The repos, build counts, dashboard plans and latest builds
+        # take one query each however many repos there are
+        assert len(uncached.captured_queries) - len(cached.captured_queries) == 4
+
+        repos = response.context["repos"]
+        assert len(repos) == 11
+        assert all(repo["build_count"] == 3 for repo in repos)
+        assert response.context["columns"] == ["Plan1"]
+        latest = Build.objects.filter(planrepo=self.planrepo).order_by("-time_queue")[0]
+        public_repo = next(repo for repo in repos if repo["name"] == "PublicRepo")
+        assert public_repo["columns"] == [
+            [
+                {
+                    "url": latest.get_absolute_url(),
+                    "commit": latest.commit,
+                    "status": latest.status,
+                    "time_start": latest.time_start,
+                }
+            ]
+        ]
+
+    @pytest.mark.django_db
+    @mock.patch("metaci.notification.handlers.queue_build_notifications")
+    def test_repo_list__refreshed_on_build_complete(self, queue_build_notifications):
+        self.client.force_login(self.superuser)
+        url = reverse("repo_list")
+
+        with mock.patch("metaci.repository.dashboard.cache", self.repo_list_cache):
+            response = self.client.get(url)
+            assert response.context["repos"][0]["build_count"] == 0
+
+            build = BuildFactory(planrepo=self.planrepo, status="success")
+            build_complete.send(sender=Build, build=build, status="success")
+            response = self.client.get(url)
+
+        assert response.context["repos"][0]["build_count"] == 1
+        assert build.get_absolute_url() in response.content.decode()
+
+    @pytest.mark.django_db
+    def test_repo_list__as_user(self):
+        other_repo = RepositoryFactory(name="OtherRepo")
+        PlanRepositoryFactory(plan=self.plan, repo=other_repo)
+        assign_perm("plan.view_builds", self.user, self.planrepo)
+        self.client.force_login(self.user)
+        url = reverse("repo_list")
+
+        with mock.patch("metaci.repository.dashboard.cache", self.repo_list_cache):
+            response = self.client.get(url)
+
+        assert [repo["name"] for repo in response.context["repos"]] == ["PublicRepo"]
+
     @pytest.mark.django_db
     def test_repo_detail__as_superuser(self):
         self.client.force_login(self.superuser)
@@ -43,20 +43,17 @@ def create_status(build):
         state = "error"
         description = "An error occurred during the build"
 
+    elif build_status == "canceled":
+        state = "error"
+        description = "The build was canceled for a build of a newer commit"
+
     elif build_status == "fail":
         state = "failure"
         if build.plan.role == "qa":
             description = f"{build.qa_user} rejected. See details for QA comments"
         else:
-            total_tests = 0
-            failed_tests = 0
-            for bf in build.flows.filter(rebuild=build.current_rebuild):
-                if bf.tests_fail:
-                    failed_tests += bf.tests_fail
-                if bf.tests_total:
-                    total_tests += bf.tests_total
-
-            description = f"⚠ ️{failed_tests}/{total_tests} failed"
+            tests = build.flows.filter(rebuild=build.current_rebuild).test_counts()
+            description = f"⚠ ️{tests['fail']}/{tests['total']} failed"
             target_url = f"{build.get_external_url()}/tests"
 
     else:
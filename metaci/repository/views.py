@@ -13,9 +13,11 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 
 from metaci.build.models import Build
+from metaci.build.tasks import cancel_superseded_builds
 from metaci.build.utils import view_queryset
 from metaci.release.models import Release
 from metaci.release.tasks import set_merge_freeze_status_for_commit
+from metaci.repository.dashboard import get_repo_dashboard
 from metaci.repository.models import Branch, Repository
 
 logger = logging.getLogger(__name__)
@@ -24,44 +26,7 @@ TAG_BRANCH_PREFIX = "refs/tags/"
 
 
 def repo_list(request, owner=None):
-    repos = Repository.objects.for_user(request.user)
-
-    if owner:
-        repos = repos.filter(owner=owner)
-
-    repo_list = []
-    columns = []
-
-    for repo in repos:
-        repo_info = {}
-        repo_info["name"] = repo.name
-        repo_info["owner"] = repo.owner
-        repo_info["title"] = str(repo)
-        repo_info["build_count"] = repo.builds.for_user(request.user).count()
-        repo_info["columns"] = {}
-        for plan in repo.plans.for_user(request.user).filter(dashboard__isnull=False):
-            if plan.name not in columns:
-                columns.append(plan.name)
-            builds = []
-            latest_builds = plan.builds.filter(repo=repo).order_by("-time_queue")
-            if plan.dashboard == "last":
-                builds.extend(latest_builds[:1])
-            elif plan.dashboard == "recent":
-                builds.extend(latest_builds[:5])
-            if builds:
-                repo_info["columns"][plan.name] = builds
-        repo_list.append(repo_info)
-
-    columns.sort()
-
-    for repo in repo_list:
-        repo_columns = []
-        for column in columns:
-            repo_columns.append(repo["columns"].get(column))
-        repo["columns"] = repo_columns
-
-    context = {"repos": repo_list, "columns": columns}
-    print(context)
+    context = get_repo_dashboard(request.user, owner)
     return render(request, "repository/repo_list.html", context=context)
 
 
@@ -265,6 +230,7 @@ def create_builds(event, payload, repo, branch, release):
                 build.release = release
                 build.release_relationship_type = "test"
             build.save()
+            cancel_superseded_builds(build)
 
 
 def is_tag(ref):
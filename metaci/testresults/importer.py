@@ -1,4 +1,10 @@
+import xml.etree.ElementTree as ET
+
+from django.conf import settings
+from django.db import transaction
+
 from metaci.testresults.models import TestClass, TestMethod, TestResult
+from metaci.utils import split_seq
 
 STATS_MAP = {
     "email_invocations": "Number of Email Invocations",
@@ -43,53 +49,182 @@ LIMIT_TYPES = (
 )
 
 
-def import_test_results(build_flow, results, test_type):
+def import_test_results(build_flow, results, test_type, outcomes=None):
+    """Import Apex/JUnit test results for a BuildFlow in batches.
+
+    TestClass and TestMethod rows are resolved with set-based queries per
+    batch (creating any that are missing in bulk) and the TestResults are
+    inserted with bulk_create, all inside a single transaction.
+
+    If `outcomes` is a Counter, the outcome of each imported result is
+    counted in it.
+    """
+    batch_size = settings.METACI_TEST_RESULT_IMPORT_BATCH_SIZE
+    repo = build_flow.build.repo
     classes = {}
     methods = {}
 
-    for result in results:
-        class_and_method = f"{result['ClassName']}.{result['Method']}"
-
-        testclass = classes.get(result["ClassName"], None)
-        if not testclass:
-            testclass, created = TestClass.objects.get_or_create(
-                name=result["ClassName"],
-                repo=build_flow.build.repo,
-                test_type=test_type,
+    with transaction.atomic():
+        for batch in split_seq(results, batch_size):
+            resolve_test_classes(
+                repo, test_type, {result["ClassName"] for result in batch}, classes
             )
-            classes[result["ClassName"]] = testclass
-
-        method = methods.get(class_and_method, None)
-        if not method:
-            method, created = TestMethod.objects.get_or_create(
-                testclass=testclass, name=result["Method"]
+            resolve_test_methods(
+                {(result["ClassName"], result["Method"]) for result in batch},
+                classes,
+                methods,
             )
-            methods[class_and_method] = method
-
-        duration = None
-        if (
-            "Stats" in result
-            and result["Stats"]
-            and "duration" in result["Stats"]
-            and result["Stats"]["duration"]
-        ):
-            duration = result["Stats"]["duration"]
-
-        testresult = TestResult(
-            build_flow=build_flow,
-            method=method,
-            duration=duration,
-            outcome=result["Outcome"],
-            stacktrace=result["StackTrace"],
-            message=result["Message"],
-            source_file=result["SourceFile"],
-        )
-        populate_limit_fields(testresult, result["Stats"])
-        testresult.save()
+
+            testresults = []
+            for result in batch:
+                method = methods[(result["ClassName"], result["Method"])]
+
+                duration = None
+                if (
+                    "Stats" in result
+                    and result["Stats"]
+                    and "duration" in result["Stats"]
+                    and result["Stats"]["duration"]
+                ):
+                    duration = result["Stats"]["duration"]
+
+                testresult = TestResult(
+                    build_flow=build_flow,
+                    method=method,
+                    duration=duration,
+                    outcome=result["Outcome"],
+                    stacktrace=result["StackTrace"],
+                    message=result["Message"],
+                    source_file=result["SourceFile"],
+                )
+                populate_limit_fields(testresult, result["Stats"])
+                testresults.append(testresult)
+
+            TestResult.objects.bulk_create(testresults, batch_size=batch_size)
+            if outcomes is not None:
+                outcomes.update(testresult.outcome for testresult in testresults)
 
     return build_flow
 
 
+def iter_junit_results(source):
+    """Stream test results out of a JUnit XML file, one testcase at a time.
+
+    `source` may be a filename or a file object. The file is opened
+    immediately (so a missing file raises right away), but parsed lazily
+    with iterparse; each testcase element is discarded once it has been
+    turned into a result dict, so memory use does not grow with file size.
+    """
+    if hasattr(source, "read"):
+        return _iter_junit_results(source, getattr(source, "name", source))
+    return _iter_junit_results(open(source, "rb"), source, close=True)
+
+
+def _iter_junit_results(f, filename, close=False):
+    try:
+        # Stack of open elements, so finished testcases can be
+        # detached from their parent suite.
+        stack = []
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            if event == "start":
+                stack.append(elem)
+                continue
+            stack.pop()
+            if elem.tag != "testcase":
+                continue
+            yield _junit_testcase_result(elem, filename)
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
+    except ET.ParseError as err:
+        err.filename = filename
+        raise err
+    finally:
+        if close:
+            f.close()
+
+
+def _junit_testcase_result(testcase, filename):
+    result = {
+        "ClassName": testcase.attrib["classname"],
+        "Method": testcase.attrib["name"],
+        "Outcome": "Pass",
+        "StackTrace": "",
+        "Message": "",
+        "Stats": {"duration": testcase.get("time")},
+        "SourceFile": filename,
+    }
+    for element in testcase.iter():
+        if element.tag not in ["failure", "error"]:
+            continue
+        result["Outcome"] = "Fail"
+        if element.text:
+            result["StackTrace"] += element.text + "\n"
+        message = element.get("type", "")
+        if element.get("message"):
+            message += ": " + element.get("message", "")
+            result["Message"] += message + "\n"
+    return result
+
+
+def resolve_test_classes(repo, test_type, names, classes):
+    """Populate `classes` (name -> TestClass) for the given class names,
+    creating any TestClass rows which don't exist yet."""
+    missing = set(names) - classes.keys()
+    if not missing:
+        return classes
+
+    existing = TestClass.objects.filter(
+        repo=repo, test_type=test_type, name__in=missing
+    ).order_by("-id")
+    for testclass in existing:
+        # If there are duplicates, prefer the oldest one
+        classes[testclass.name] = testclass
+
+    created = TestClass.objects.bulk_create(
+        [
+            TestClass(name=name, repo=repo, test_type=test_type)
+            for name in sorted(missing - classes.keys())
+        ]
+    )
+    for testclass in created:
+        classes[testclass.name] = testclass
+    return classes
+
+
+def resolve_test_methods(class_and_method_names, classes, methods):
+    """Populate `methods` ((class name, method name) -> TestMethod) for the
+    given pairs, creating any TestMethod rows which don't exist yet.
+
+    All of the classes must already be present in `classes`.
+    """
+    missing = set(class_and_method_names) - methods.keys()
+    if not missing:
+        return methods
+
+    class_names = {class_name for class_name, _ in missing}
+    by_class_id = {classes[name].id: name for name in class_names}
+    existing = TestMethod.objects.filter(
+        testclass_id__in=by_class_id.keys(),
+        name__in={method_name for _, method_name in missing},
+    ).order_by("-id")
+    for method in existing:
+        key = (by_class_id[method.testclass_id], method.name)
+        if key in missing:
+            method.testclass = classes[key[0]]
+            methods[key] = method
+
+    created = TestMethod.objects.bulk_create(
+        [
+            TestMethod(testclass=classes[class_name], name=method_name)
+            for class_name, method_name in sorted(missing - methods.keys())
+        ]
+    )
+    for method in created:
+        methods[(method.testclass.name, method.name)] = method
+    return methods
+
+
 def populate_limit_fields(testresult, code_unit):
     for limit_type in LIMIT_TYPES:
         try:
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from metaci import conftest as fact
+from metaci.testresults.importer import import_test_results, iter_junit_results
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures peak memory used to stream synthetic JUnit files of increasing "
+        "size. Peak memory should stay flat regardless of file size."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="1000,10000,100000",
+            help="Comma-separated numbers of testcases to generate",
+        )
+        parser.add_argument(
+            "--with-import",
+            action="store_true",
+            help="Also import the results into the database (rolled back afterwards)",
+        )
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["sizes"].split(",")]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for size in sizes:
+                path = os.path.join(tmpdir, f"junit-{size}.xml")
+                write_junit_file(path, size)
+                file_size = os.path.getsize(path)
+
+                tracemalloc.start()
+                start = time.perf_counter()
+                if options["with_import"]:
+                    with transaction.atomic():
+                        build_flow = fact.BuildFlowFactory()
+                        import_test_results(
+                            build_flow, iter_junit_results(path), "JUnit"
+                        )
+                        transaction.set_rollback(True)
+                else:
+                    for _ in iter_junit_results(path):
+                        pass
+                elapsed = time.perf_counter() - start
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                self.stdout.write(
+                    f"{size} testcases ({file_size / 2**20:.1f} MB): "
+                    f"peak {peak / 2**20:.2f} MB in {elapsed:.2f}s"
+                )
+
+
+def write_junit_file(path, num_tests):
+    with open(path, "w") as f:
+        f.write('<?xml version="1.0" encoding="utf-8" ?>\n<testsuites>\n')
+        f.write(f'<testsuite name="benchmark" tests="{num_tests}">\n')
+        for i in range(num_tests):
+            f.write(
+                f'<testcase classname="benchmark.Class{i % 100}" '
+                f'name="test_{i}" time="0.5">'
+            )
+            if i % 10 == 0:
+                f.write(
+                    '<failure type="AssertionError" message="assertion failed">'
+                    + "Traceback (most recent call last):\n" * 20
+                    + "</failure>"
+                )
+            f.write("</testcase>\n")
+        f.write("</testsuite>\n</testsuites>\n")
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from metaci.testresults.robot_importer import parse_robot_output
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares serial and parallel parsing/rendering of robot test results "
+        "on a generated output.xml file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--tests", type=int, default=4000, help="Number of tests to generate"
+        )
+        parser.add_argument(
+            "--workers",
+            default=f"1,2,{os.cpu_count()}",
+            help="Comma-separated worker counts to compare",
+        )
+        parser.add_argument(
+            "--chunksize", type=int, default=50, help="Tests per worker chunk"
+        )
+
+    def handle(self, *args, **options):
+        worker_counts = [int(count) for count in options["workers"].split(",")]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "output.xml")
+            write_robot_output(path, options["tests"])
+            self.stdout.write(
+                f"Generated {options['tests']} tests "
+                f"({os.path.getsize(path) / 2**20:.1f} MB)"
+            )
+
+            baseline = None
+            for workers in worker_counts:
+                start = time.perf_counter()
+                count = sum(
+                    1
+                    for _ in parse_robot_output(
+                        path, workers=workers, chunksize=options["chunksize"]
+                    )
+                )
+                elapsed = time.perf_counter() - start
+                baseline = baseline or elapsed
+                self.stdout.write(
+                    f"{workers} worker(s): {count} tests in {elapsed:.2f}s "
+                    f"({baseline / elapsed:.1f}x)"
+                )
+
+
+def write_robot_output(
+    path, num_tests, tests_per_suite=50, keywords_per_test=20, screenshot_every=0
+):
+    status = 'starttime="20210101 00:00:00.000" endtime="20210101 00:00:01.000"'
+    with open(path, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write('<robot generator="Robot 4.0 (benchmark)" rpa="false">\n')
+        f.write('<suite id="s1" name="Benchmark" source="/tmp/benchmark">\n')
+        for start in range(0, num_tests, tests_per_suite):
+            suite_num = start // tests_per_suite + 1
+            f.write(
+                f'<suite id="s1-s{suite_num}" name="Suite {suite_num}" '
+                f'source="/tmp/benchmark/suite_{suite_num}.robot">\n'
+                f'<kw name="Open Test Browser" type="SETUP">'
+                f'<status status="PASS" {status}/></kw>\n'
+            )
+            for test_num in range(start, min(start + tests_per_suite, num_tests)):
+                outcome = "FAIL" if test_num % 25 == 0 else "PASS"
+                f.write(
+                    f'<test id="s1-s{suite_num}-t{test_num}" name="Test {test_num}">\n'
+                )
+                for kw in range(keywords_per_test):
+                    f.write(
+                        f'<kw name="Keyword {kw}" library="Benchmark">'
+                        f"<arg>argument {kw}</arg>"
+                        f'<msg timestamp="20210101 00:00:00.500" level="INFO">'
+                        f"Message from keyword {kw} of test {test_num}</msg>"
+                        f'<status status="PASS" {status}/></kw>\n'
+                    )
+                if screenshot_every and test_num % screenshot_every == 0:
+                    f.write(
+                        f'<kw name="Capture Page Screenshot" library="Benchmark">'
+                        f'<msg timestamp="20210101 00:00:00.500" level="INFO" '
+                        f'html="true">&lt;a href="screenshot-{test_num}.png"&gt;'
+                        f'&lt;img src="screenshot-{test_num}.png"&gt;&lt;/a&gt;</msg>'
+                        f'<status status="PASS" {status}/></kw>\n'
+                    )
+                f.write(
+                    f"<tag>benchmark</tag>"
+                    f'<status status="{outcome}" {status}>'
+                    f'{"Assertion failed" if outcome == "FAIL" else ""}</status>\n'
+                    f"</test>\n"
+                )
+            f.write(
+                f'<kw name="Close Browser" type="TEARDOWN">'
+                f'<status status="PASS" {status}/></kw>\n'
+                f'<status status="PASS" {status}/>\n</suite>\n'
+            )
+        f.write(f'<status status="PASS" {status}/>\n</suite>\n')
+        f.write("<statistics></statistics>\n<errors>\n</errors>\n</robot>\n")
@@ -0,0 +1,119 @@
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+
+from metaci import conftest as fact
+from metaci.build.models import BuildFlowAsset
+from metaci.testresults.management.commands.benchmark_robot_parse import (
+    write_robot_output,
+)
+from metaci.testresults.models import TestResultAsset
+from metaci.testresults.robot_importer import import_robot_test_results
+
+
+class LatencyStorage(FileSystemStorage):
+    """Local file storage which waits before each save, standing in
+    for the network round trip of a remote storage backend."""
+
+    def __init__(self, latency, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+
+    def _save(self, name, content):
+        time.sleep(self.latency)
+        return super()._save(name, content)
+
+
+@contextmanager
+def asset_storage(storage):
+    fields = [
+        BuildFlowAsset._meta.get_field("asset"),
+        TestResultAsset._meta.get_field("asset"),
+    ]
+    original = [field.storage for field in fields]
+    for field in fields:
+        field.storage = storage
+    try:
+        yield
+    finally:
+        for field, field_storage in zip(fields, original):
+            field.storage = field_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares robot imports with different numbers of screenshot upload "
+        "threads, using local storage with simulated upload latency. "
+        "All rows are rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--tests", type=int, default=500, help="Number of tests to generate"
+        )
+        parser.add_argument(
+            "--screenshot-every",
+            type=int,
+            default=2,
+            help="Generate a screenshot for every nth test",
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=50,
+            help="Simulated milliseconds per upload",
+        )
+        parser.add_argument(
+            "--workers", default="1,4,8,16", help="Comma-separated thread counts"
+        )
+
+    def handle(self, *args, **options):
+        worker_counts = [int(count) for count in options["workers"].split(",")]
+        baseline = None
+        for workers in worker_counts:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                output_dir = os.path.join(tmpdir, "output")
+                os.mkdir(output_dir)
+                write_robot_output(
+                    os.path.join(output_dir, "output.xml"),
+                    options["tests"],
+                    screenshot_every=options["screenshot_every"],
+                )
+                storage = LatencyStorage(
+                    options["latency"] / 1000, location=os.path.join(tmpdir, "media")
+                )
+                screenshots = write_screenshots(
+                    output_dir, options["tests"], options["screenshot_every"]
+                )
+
+                with asset_storage(storage), override_settings(
+                    METACI_ROBOT_SCREENSHOT_UPLOAD_WORKERS=workers,
+                    METACI_ROBOT_LOG_PRERENDER=False,
+                ), transaction.atomic():
+                    flowtask = fact.FlowTaskFactory()
+                    start = time.perf_counter()
+                    import_robot_test_results(flowtask, output_dir)
+                    elapsed = time.perf_counter() - start
+                    transaction.set_rollback(True)
+
+            baseline = baseline or elapsed
+            self.stdout.write(
+                f"{workers} upload thread(s): {options['tests']} tests with "
+                f"{screenshots} screenshots in {elapsed:.2f}s "
+                f"({baseline / elapsed:.1f}x)"
+            )
+
+
+def write_screenshots(output_dir, num_tests, screenshot_every):
+    count = 0
+    for test_num in range(0, num_tests, screenshot_every):
+        with open(os.path.join(output_dir, f"screenshot-{test_num}.png"), "wb") as f:
+            f.write(os.urandom(64 * 1024))
+        count += 1
+    return count
@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from metaci import conftest as fact
+from metaci.testresults.importer import import_test_results
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures test result import throughput on a synthetic payload. "
+        "All rows are rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--tests", type=int, default=20000, help="Number of test results"
+        )
+        parser.add_argument(
+            "--classes", type=int, default=400, help="Number of test classes"
+        )
+
+    def handle(self, *args, **options):
+        results = list(synthetic_results(options["tests"], options["classes"]))
+
+        with transaction.atomic():
+            build_flow = fact.BuildFlowFactory()
+            start = time.perf_counter()
+            import_test_results(build_flow, results, "Apex")
+            elapsed = time.perf_counter() - start
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"Imported {len(results)} test results in {elapsed:.2f}s "
+            f"({len(results) / elapsed:.0f} rows/sec)"
+        )
+
+
+def synthetic_results(num_tests, num_classes):
+    for i in range(num_tests):
+        failed = i % 50 == 0
+        yield {
+            "ClassName": f"BenchmarkTestClass{i % num_classes}",
+            "Method": f"test_method_{i}",
+            "Outcome": "Fail" if failed else "Pass",
+            "StackTrace": "Class.BenchmarkTestClass: line 1" if failed else "",
+            "Message": "System.AssertException: Assertion Failed" if failed else "",
+            "Stats": {
+                "duration": 0.25,
+                "TESTING_LIMITS: Number of SOQL queries": {
+                    "used": i % 100,
+                    "allowed": 100,
+                },
+                "TESTING_LIMITS: Maximum CPU time": {
+                    "used": i % 10000,
+                    "allowed": 10000,
+                },
+            },
+            "SourceFile": "test_results.json",
+        }
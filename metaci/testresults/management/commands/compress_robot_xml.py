@@ -0,0 +1,71 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from metaci.testresults.models import TestResult
+
+
+class Command(BaseCommand):
+    help = (
+        "Converts robot test results stored as full xml documents to "
+        "compressed storage, sharing suite xml between the tests of a flow."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of test results to convert per transaction",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        results = TestResult.objects.filter(robot_xml__isnull=False).exclude(
+            robot_xml=""
+        )
+        self.stdout.write(
+            f"Compressing robot xml for {results.count()} test results..."
+        )
+
+        converted = size_before = size_after = 0
+        last_pk = 0
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    results.filter(pk__gt=last_pk)
+                    .select_related("build_flow")
+                    .order_by("pk")[:batch_size]
+                )
+                if not batch:
+                    break
+                # Suite fragments are shared within a build flow
+                fragments = defaultdict(dict)
+                seen_fragments = set()
+                for result in batch:
+                    size_before += len(result.robot_xml.encode("utf-8"))
+                    result.set_robot_xml(
+                        result.robot_xml,
+                        compress=True,
+                        fragments=fragments[result.build_flow_id],
+                    )
+                    size_after += len(result.robot_xml_compressed)
+                    fragment = result.robot_suite_fragment
+                    if fragment is not None and fragment.pk not in seen_fragments:
+                        seen_fragments.add(fragment.pk)
+                        size_after += len(fragment.head) + len(fragment.tail)
+                TestResult.objects.bulk_update(
+                    batch,
+                    ["robot_xml", "robot_xml_compressed", "robot_suite_fragment"],
+                )
+            converted += len(batch)
+            last_pk = batch[-1].pk
+            self.stdout.write(f"{converted}")
+
+        reduction = (1 - size_after / size_before) * 100 if size_before else 0
+        self.stdout.write(
+            f"Done. Converted {converted} test results: "
+            f"{size_before / 2**20:.1f} MB -> {size_after / 2**20:.1f} MB "
+            f"({reduction:.0f}% smaller)"
+        )
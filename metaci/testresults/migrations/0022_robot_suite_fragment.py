@@ -0,0 +1,59 @@
+# Generated by Django 3.2.16 on 2026-10-18 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("build", "0036_update_jsonfield"),
+        ("testresults", "0021_delete_testresultperfweeklysummary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RobotSuiteFragment",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("digest", models.CharField(max_length=64)),
+                ("head", models.BinaryField()),
+                ("tail", models.BinaryField()),
+                (
+                    "build_flow",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="robot_suite_fragments",
+                        to="build.buildflow",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("build_flow", "digest")},
+            },
+        ),
+        migrations.AddField(
+            model_name="testresult",
+            name="robot_xml_compressed",
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="testresult",
+            name="robot_suite_fragment",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="test_results",
+                to="testresults.robotsuitefragment",
+            ),
+        ),
+    ]
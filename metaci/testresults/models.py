@@ -1,13 +1,18 @@
 from __future__ import unicode_literals
 
+import hashlib
 import os
+import zlib
 from collections import OrderedDict, namedtuple
 
+from django.conf import settings
 from django.db import models
 from django.urls import reverse
 
 from metaci.testresults.choices import OUTCOME_CHOICES, TEST_TYPE_CHOICES
 
+FAIL_OUTCOMES = ("Fail", "CompileFail")
+
 
 class TestClass(models.Model):
     name = models.CharField(max_length=255, db_index=True)
@@ -48,6 +53,16 @@ class TestMethod(models.Model):
 
 
 class TestResultManager(models.Manager):
+    def test_counts(self):
+        """Counts all, passing and failing test results in one query."""
+        return self.aggregate(
+            total=models.Count("id"),
+            **{
+                "pass": models.Count("id", filter=models.Q(outcome="Pass")),
+                "fail": models.Count("id", filter=models.Q(outcome__in=FAIL_OUTCOMES)),
+            },
+        )
+
     def update_summary_fields(self):
         for summary in self.all():
             summary.update_summary_fields()
@@ -136,6 +151,17 @@ class TestResult(models.Model):
     )
     robot_tags = models.TextField(null=True, blank=True)
     robot_xml = models.TextField(null=True, blank=True)
+    # When robot xml is stored compressed, robot_xml is empty and
+    # robot_xml_compressed holds the (zlib-compressed) test element,
+    # while the surrounding suite xml is shared through robot_suite_fragment.
+    robot_xml_compressed = models.BinaryField(null=True, blank=True)
+    robot_suite_fragment = models.ForeignKey(
+        "testresults.RobotSuiteFragment",
+        related_name="test_results",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+    )
     email_invocations_used = models.IntegerField(null=True, blank=True)
     email_invocations_allowed = models.IntegerField(null=True, blank=True)
     email_invocations_percent = models.IntegerField(null=True, blank=True)
@@ -230,6 +256,48 @@ class TestResult(models.Model):
     def get_robot_url(self):
         return reverse("test_result_robot", kwargs={"result_id": str(self.id)})
 
+    @property
+    def has_robot_xml(self):
+        return bool(self.robot_xml) or self.robot_xml_compressed is not None
+
+    def get_robot_xml(self):
+        """Returns the robot xml for this test, reassembling it if it is compressed."""
+        if self.robot_xml_compressed is None:
+            return self.robot_xml
+        body = decompress_text(self.robot_xml_compressed)
+        if self.robot_suite_fragment is None:
+            return body
+        fragment = self.robot_suite_fragment
+        return fragment.get_head() + body + fragment.get_tail()
+
+    def set_robot_xml(self, robot_xml, compress=None, fragments=None):
+        """Stores the robot xml for this test.
+
+        If compression is enabled (by default, when METACI_ROBOT_XML_STORAGE
+        is "compressed") the suite xml around the test is saved once per
+        BuildFlow as a RobotSuiteFragment. `fragments` is an optional dict
+        used to cache the fragments across calls.
+        """
+        if compress is None:
+            compress = settings.METACI_ROBOT_XML_STORAGE == "compressed"
+        if not compress or robot_xml is None:
+            self.robot_xml = robot_xml
+            self.robot_xml_compressed = None
+            self.robot_suite_fragment = None
+            return
+
+        parts = split_robot_xml(robot_xml)
+        if parts is None:
+            self.robot_suite_fragment = None
+            body = robot_xml
+        else:
+            head, body, tail = parts
+            self.robot_suite_fragment = RobotSuiteFragment.objects.get_for_parts(
+                self.build_flow, head, tail, fragments
+            )
+        self.robot_xml = None
+        self.robot_xml_compressed = compress_text(body)
+
     def get_limit_types(self):
         types = (
             "email_invocations",
@@ -249,6 +317,79 @@ class TestResult(models.Model):
         return types
 
 
+def count_outcomes(outcomes):
+    """Returns test counts shaped like TestResultManager.test_counts
+    from a Counter of test result outcomes."""
+    return {
+        "total": sum(outcomes.values()),
+        "pass": outcomes["Pass"],
+        "fail": sum(outcomes[outcome] for outcome in FAIL_OUTCOMES),
+    }
+
+
+def compress_text(text):
+    return zlib.compress(text.encode("utf-8"))
+
+
+def decompress_text(data):
+    return zlib.decompress(bytes(data)).decode("utf-8")
+
+
+def split_robot_xml(robot_xml):
+    """Splits a single-test robot xml document into the xml before
+    the test element, the test element and the xml after it.
+
+    Returns None if the document doesn't contain exactly one test.
+    """
+    start = robot_xml.find("<test ")
+    end = robot_xml.find("</test>")
+    if start == -1 or end < start or robot_xml.find("<test ", start + 1) != -1:
+        return None
+    end += len("</test>")
+    return robot_xml[:start], robot_xml[start:end], robot_xml[end:]
+
+
+class RobotSuiteFragmentManager(models.Manager):
+    def get_for_parts(self, build_flow, head, tail, fragments=None):
+        digest = hashlib.sha256(f"{head}\0{tail}".encode("utf-8")).hexdigest()
+        if fragments is not None and digest in fragments:
+            return fragments[digest]
+        fragment, _ = self.get_or_create(
+            build_flow=build_flow,
+            digest=digest,
+            defaults={"head": compress_text(head), "tail": compress_text(tail)},
+        )
+        if fragments is not None:
+            fragments[digest] = fragment
+        return fragment
+
+
+class RobotSuiteFragment(models.Model):
+    """Robot xml shared by the tests of a suite in a BuildFlow: everything
+    before the test element (including the suite setup) and everything after
+    it (the suite teardown and status, and any execution errors)."""
+
+    build_flow = models.ForeignKey(
+        "build.BuildFlow",
+        related_name="robot_suite_fragments",
+        on_delete=models.CASCADE,
+    )
+    digest = models.CharField(max_length=64)
+    head = models.BinaryField()
+    tail = models.BinaryField()
+
+    objects = RobotSuiteFragmentManager()
+
+    class Meta:
+        unique_together = ("build_flow", "digest")
+
+    def get_head(self):
+        return decompress_text(self.head)
+
+    def get_tail(self):
+        return decompress_text(self.tail)
+
+
 def asset_upload_to(instance, filename):
     folder = instance.result.build_flow.asset_hash
     return os.path.join(folder, filename)
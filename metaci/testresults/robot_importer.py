@@ -2,25 +2,30 @@ import logging
 import os
 import re
 import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import List
 
 import requests
 import robot
-from cumulusci.utils import elementtree_parse_file
 from cumulusci.utils.xml.robot_xml import pattern as ELAPSED_TIME_PATTERN
 from django.conf import settings
-from django.core.files.base import ContentFile
+from django.core.files import File
+from django.db import transaction
 
 from metaci.build.exceptions import BuildError
 from metaci.release.utils import jwt_for_webhook
-from metaci.testresults.models import TestClass, TestMethod, TestResult, TestResultAsset
+from metaci.testresults.importer import resolve_test_classes, resolve_test_methods
+from metaci.testresults.models import TestResult, TestResultAsset
+from metaci.testresults.tasks import render_robot_logs
+from metaci.utils import split_seq
 
 logger = logging.getLogger(__name__)
 
 
-def import_robot_test_results(flowtask, results_dir: str) -> List:
+def import_robot_test_results(flowtask, results_dir: str, outcomes=None) -> List:
     """Given a flowtask for a robot task, and a path to the
     test results output file:
 
@@ -32,9 +37,16 @@ def import_robot_test_results(flowtask, results_dir: str) -> List:
         (d) TestMethod for each method in the class (if they don't already exist)
         (e) TestResult associated with the BuildFlow, TestMethod, and FlowTask
         (f) TestResultAsset for any screenshots in the TestResult
+    (3) Queue a job to render the logs of the failed tests into the cache
+
+    The output file is streamed: tests are parsed one suite at a time and
+    written to the DB in batches of METACI_TEST_RESULT_IMPORT_BATCH_SIZE.
+    Each batch's screenshots are uploaded concurrently by a pool of
+    METACI_ROBOT_SCREENSHOT_UPLOAD_WORKERS threads.
 
     @param1 (FlowTask) The flowtask associated with the robot task
     @param1 (str) The filepath to the robot results
+    @param3 (Counter) If given, counts the outcomes of the imported tests
     """
     results = []
     results_dir = Path(results_dir)
@@ -48,140 +60,351 @@ def import_robot_test_results(flowtask, results_dir: str) -> List:
     # import is here to avoid import cycle
     from metaci.build.models import BuildFlowAsset
 
+    # Passing a File (rather than its contents) lets the storage
+    # backend upload it in chunks.
     with open(results_file, "rb") as f:
         asset = BuildFlowAsset(
             build_flow=flowtask.build_flow,
-            asset=ContentFile(f.read(), f"step-{flowtask.stepnum}-output.xml"),
+            asset=File(f, f"step-{flowtask.stepnum}-output.xml"),
             category="robot-output",
         )
         asset.save()
 
+    build_flow = flowtask.build_flow
+    repo = build_flow.build.repo
     classes = {}
     methods = {}
     suite_screenshots = {}
-    for result in parse_robot_output(results_file):
-        testclass = classes.get(result["suite"]["name"], None)
-        if not testclass:
-            testclass, created = TestClass.objects.get_or_create(
-                name=result["suite"]["name"],
-                repo=flowtask.build_flow.build.repo,
-                test_type="Robot",
-            )
-            classes[result["suite"]["name"]] = testclass
-
-        # Create screenshot assets for corresponding BuildFlow
-        # These screenshots are generated during robot test suite setup/teardown
-        for i, screenshot in enumerate(result["suite"]["screenshots"]):
-
-            if screenshot in suite_screenshots:
-                continue
-
-            screenshot_path = results_dir / screenshot
-
-            with open(screenshot_path, "rb") as f:
-                asset = BuildFlowAsset(
-                    build_flow=flowtask.build_flow,
-                    asset=ContentFile(
-                        f.read(), f"step-{flowtask.stepnum}-{screenshot}"
-                    ),
-                    category="robot-screenshot",
+    fragments = {}
+    batch_size = settings.METACI_TEST_RESULT_IMPORT_BATCH_SIZE
+    upload_workers = settings.METACI_ROBOT_SCREENSHOT_UPLOAD_WORKERS
+    with ThreadPoolExecutor(max_workers=upload_workers) as upload_pool:
+        for batch in split_seq(parse_robot_output(results_file), batch_size):
+            with transaction.atomic():
+                resolve_test_classes(
+                    repo,
+                    "Robot",
+                    {result["suite"]["name"] for result in batch},
+                    classes,
                 )
-                asset.save()
-                suite_screenshots[screenshot] = asset.id
-            screenshot_path.unlink()
-
-        # Set TestMethod in `method` dict, and associate it
-        # with the corresponding TestClass
-        class_and_method = f"{result['suite']['name']}.{result['name']}"
-        method = methods.get(class_and_method, None)
-        if not method:
-            method, created = TestMethod.objects.get_or_create(
-                testclass=testclass, name=result["name"]
-            )
-            methods[class_and_method] = method
-
-        # Create TestResult associated with the BuildFlow,
-        # TestMethod, and FlowTask
-        testresult = TestResult(
-            build_flow=flowtask.build_flow,
-            method=method,
-            duration=result["duration"],
-            outcome=result["status"],
-            source_file=result["suite"]["file"],
-            message=result["message"],
-            robot_keyword=result["failing_keyword"],
-            robot_xml=result["xml"],
-            robot_tags=",".join(result["tags"]),
-            task=flowtask,
-        )
-        testresult.save()
-
-        # Attach test case screenshots to test result
-        if result["screenshots"] or suite_screenshots:
-            for screenshot in result["screenshots"]:
-                screenshot_path = results_dir / screenshot
-                with open(screenshot_path, "rb") as f:
-                    asset = TestResultAsset(
-                        result=testresult, asset=ContentFile(f.read(), screenshot)
+                resolve_test_methods(
+                    {(result["suite"]["name"], result["name"]) for result in batch},
+                    classes,
+                    methods,
+                )
+
+                # Upload screenshot files while nothing else is waiting on them:
+                # BuildFlowAssets for screenshots generated during robot test suite
+                # setup/teardown, TestResultAssets for those taken during tests.
+                uploads = []
+                flow_assets = {}
+                for result in batch:
+                    for screenshot in result["suite"]["screenshots"]:
+                        if screenshot in suite_screenshots or screenshot in flow_assets:
+                            continue
+                        asset = BuildFlowAsset(
+                            build_flow=build_flow, category="robot-screenshot"
+                        )
+                        flow_assets[screenshot] = asset
+                        uploads.append(
+                            (
+                                asset,
+                                results_dir / screenshot,
+                                f"step-{flowtask.stepnum}-{screenshot}",
+                            )
+                        )
+
+                testresults = []
+                result_assets = []
+                for result in batch:
+                    # Create TestResult associated with the BuildFlow,
+                    # TestMethod, and FlowTask
+                    testresult = TestResult(
+                        build_flow=build_flow,
+                        method=methods[(result["suite"]["name"], result["name"])],
+                        duration=result["duration"],
+                        outcome=result["status"],
+                        source_file=result["suite"]["file"],
+                        message=result["message"],
+                        robot_keyword=result["failing_keyword"],
+                        robot_tags=",".join(result["tags"]),
+                        task=flowtask,
                     )
-                    asset.save()
-                    # replace references to local files with TestResultAsset ids
-                    testresult.robot_xml = testresult.robot_xml.replace(
-                        f'"{screenshot}"', f'"asset://{asset.id}"'
+                    testresults.append(testresult)
+                    assets = {}
+                    for screenshot in result["screenshots"]:
+                        if screenshot in assets:
+                            continue
+                        asset = TestResultAsset(result=testresult)
+                        assets[screenshot] = asset
+                        uploads.append((asset, results_dir / screenshot, screenshot))
+                    result_assets.append(assets)
+
+                for future in [
+                    upload_pool.submit(_upload_screenshot, *upload)
+                    for upload in uploads
+                ]:
+                    future.result()
+
+                BuildFlowAsset.objects.bulk_create(flow_assets.values())
+                suite_screenshots.update(
+                    (screenshot, asset.id) for screenshot, asset in flow_assets.items()
+                )
+
+                # Results with screenshots need the TestResultAsset ids in their
+                # xml, so those are completed after the assets are inserted.
+                with_screenshots = []
+                for testresult, result, assets in zip(
+                    testresults, batch, result_assets
+                ):
+                    if assets:
+                        with_screenshots.append((testresult, result, assets))
+                    else:
+                        _set_robot_xml(
+                            testresult, result, suite_screenshots, {}, fragments
+                        )
+                TestResult.objects.bulk_create(testresults)
+
+                for testresult, _, assets in with_screenshots:
+                    for asset in assets.values():
+                        asset.result = testresult
+                TestResultAsset.objects.bulk_create(
+                    [
+                        asset
+                        for _, _, assets in with_screenshots
+                        for asset in assets.values()
+                    ]
+                )
+                for testresult, result, assets in with_screenshots:
+                    _set_robot_xml(
+                        testresult, result, suite_screenshots, assets, fragments
                     )
-                screenshot_path.unlink()
-            # replace references to suite screenshots with BuildFlowAsset ids
-            for screenshot, asset_id in suite_screenshots.items():
-                testresult.robot_xml = testresult.robot_xml.replace(
-                    f'"{screenshot}"', f'"buildflowasset://{asset_id}"'
+                TestResult.objects.bulk_update(
+                    [testresult for testresult, _, _ in with_screenshots],
+                    ["robot_xml", "robot_xml_compressed", "robot_suite_fragment"],
+                )
+
+            if outcomes is not None:
+                outcomes.update(testresult.outcome for testresult in testresults)
+            for result in batch:
+                results.append(
+                    {
+                        "name": result["name"],
+                        "group": result["suite"]["name"],
+                        "status": result["status"].capitalize(),
+                        "start_time": result["start_time"],
+                        "end_time": result["end_time"],
+                        "exception": result["message"],
+                        "tags": result["tags"],
+                        "doc": result["doc"],
+                    }
                 )
 
-            testresult.save()
-        results.append(
-            {
-                "name": result["name"],
-                "group": result["suite"]["name"],
-                "status": result["status"].capitalize(),
-                "start_time": result["start_time"],
-                "end_time": result["end_time"],
-                "exception": result["message"],
-                "tags": result["tags"],
-                "doc": result["doc"],
+    if settings.METACI_ROBOT_LOG_PRERENDER:
+        transaction.on_commit(lambda: render_robot_logs.delay(flowtask.id))
+    return results
+
+
+def _upload_screenshot(asset, path, name):
+    """Streams a screenshot file to the storage backend for an unsaved asset,
+    then removes the local file. Runs on the upload thread pool, so it must
+    not touch the database."""
+    with open(path, "rb") as f:
+        asset.asset.save(name, File(f), save=False)
+    path.unlink()
+
+
+def _set_robot_xml(testresult, result, suite_screenshots, assets, fragments):
+    """Replaces references to local screenshot files in a test's robot xml
+    with asset ids, in one pass, and stores the xml on the test result."""
+    replacements = {
+        f'"{screenshot}"': f'"buildflowasset://{asset_id}"'
+        for screenshot, asset_id in suite_screenshots.items()
+        if screenshot not in result["screenshots"]
+    }
+    replacements.update(
+        (f'"{screenshot}"', f'"asset://{asset.id}"')
+        for screenshot, asset in assets.items()
+    )
+    robot_xml = result["xml"]
+    if replacements:
+        pattern = re.compile("|".join(map(re.escape, replacements)))
+        robot_xml = pattern.sub(lambda m: replacements[m.group(0)], robot_xml)
+    testresult.set_robot_xml(robot_xml, fragments=fragments)
+
+
+def parse_robot_output(path, workers=None, chunksize=None):
+    """Parses a robotframework output.xml file into individual test xml files
+
+    Returns an iterator which yields one parsed test at a time. The file is
+    read incrementally with iterparse and each suite is discarded once its
+    tests have been yielded, so memory use is bounded by the largest suite
+    rather than by the size of the file.
+
+    Parsing and rendering the per-test xml is CPU bound, so with more than
+    one worker it is spread over a process pool in chunks of `chunksize`
+    tests. Tests are always yielded in document order.
+    """
+    if workers is None:
+        workers = settings.METACI_ROBOT_IMPORT_WORKERS
+    if chunksize is None:
+        chunksize = settings.METACI_ROBOT_IMPORT_CHUNKSIZE
+
+    suites = iter_robot_suites(path)
+    if workers <= 1:
+        for suite, root in suites:
+            for test in suite["elem"].iter("test"):
+                yield parse_test(test, suite, root)
+    else:
+        yield from _parse_robot_suites_in_pool(suites, workers, chunksize)
+
+
+def _parse_robot_suites_in_pool(suites, workers, chunksize):
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for suite, root in suites:
+            # Elements are serialized here rather than by the executor, since
+            # the suite is discarded as soon as we move on to the next one.
+            # (Plain xml is also much faster to pass around than pickled elements.)
+            context = {
+                key: _dump_element(value) if ET.iselement(value) else value
+                for key, value in suite.items()
+                if key != "elem"
             }
-        )
+            root = (root.tag, root.attrib)
+            for tests in split_seq(suite["elem"].iter("test"), chunksize):
+                tests = [_dump_element(test) for test in tests]
+                future = executor.submit(_parse_test_chunk, tests, context, root)
+                pending.append((future, suite))
+                # Bound the number of chunks in flight
+                while len(pending) > workers * 2:
+                    yield from _collect_test_chunk(*pending.popleft())
+        while pending:
+            yield from _collect_test_chunk(*pending.popleft())
+
+
+def _dump_element(elem):
+    tail, elem.tail = elem.tail, None
+    try:
+        return ET.tostring(elem), tail
+    finally:
+        elem.tail = tail
+
+
+def _load_element(dumped):
+    source, tail = dumped
+    elem = ET.fromstring(source)
+    elem.tail = tail
+    return elem
+
+
+def _parse_test_chunk(tests, context, root):
+    suite = {
+        key: _load_element(value) if isinstance(value, tuple) else value
+        for key, value in context.items()
+    }
+    root = ET.Element(*root)
+    results = []
+    for test in tests:
+        test_info = parse_test(_load_element(test), suite, root)
+        # The caller already has the suite, and doesn't need the element
+        del test_info["suite"]
+        del test_info["elem"]
+        results.append(test_info)
     return results
 
 
-def parse_robot_output(path):
-    """Parses a robotframework output.xml file into individual test xml files"""
-    tree = elementtree_parse_file(path)
-    root = tree.getroot()
-    return get_robot_tests(root, root)
-
-
-def get_robot_tests(root, elem, parents=()):
-    tests = []
-    has_children_suites = False
-    for child in elem:
-        if child.tag == "suite":
-            has_children_suites = True
-            tests += get_robot_tests(root, child, parents + (child,))
-    if not has_children_suites:  # base case of recursion
-        suite_file = elem.attrib["source"].replace(os.getcwd(), "")
-        setup = elem.find("kw[@type='SETUP']")
-        teardown = elem.find("kw[@type='TEARDOWN']")
-        suite = {
-            "file": suite_file,
-            "elem": elem,
-            "name": "/".join([suite.attrib["name"] for suite in parents]),
-            "setup": setup,
-            "status": elem.find("status"),
-            "teardown": teardown,
-            "screenshots": find_screenshots(setup) + find_screenshots(teardown),
-        }
-        for test in elem.iter("test"):
-            tests.append(parse_test(test, suite, root))
-    return tests
+def _collect_test_chunk(future, suite):
+    for test_info in future.result():
+        test_info["suite"] = suite
+        yield test_info
+
+
+def iter_robot_suites(path):
+    """Yields (suite, root) for each suite in an output.xml file which has tests.
+
+    The suite element is detached and cleared once the caller moves on to
+    the next suite.
+    """
+    errors = read_robot_errors(path)
+    root = None
+    # Stack of currently open elements, the ids of the open suite elements
+    # and the ids of those suites which contain other suites.
+    stack = []
+    suites = set()
+    parent_suites = set()
+    for event, elem in ET.iterparse(str(path), events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            elif elem.tag == "suite" and (stack[-1] is root or id(stack[-1]) in suites):
+                suites.add(id(elem))
+                parent_suites.add(id(stack[-1]))
+            stack.append(elem)
+            continue
+
+        stack.pop()
+        if id(elem) in suites:
+            suites.discard(id(elem))
+            if id(elem) in parent_suites:
+                parent_suites.discard(id(elem))
+            else:
+                parents = [e for e in stack if id(e) in suites] + [elem]
+                yield get_robot_suite(elem, parents, errors), root
+        elif len(stack) != 1:
+            # Keep everything inside a suite until the suite is complete
+            continue
+
+        # This element is complete; detach it so the tree doesn't grow
+        elem.clear()
+        if stack:
+            stack[-1].remove(elem)
+
+
+def get_robot_suite(elem, parents, errors=None):
+    """Returns the context shared by all tests of a (leaf) suite element"""
+    suite_file = elem.attrib["source"].replace(os.getcwd(), "")
+    setup = elem.find("kw[@type='SETUP']")
+    teardown = elem.find("kw[@type='TEARDOWN']")
+    return {
+        "file": suite_file,
+        "elem": elem,
+        "name": "/".join([suite.attrib["name"] for suite in parents]),
+        "setup": setup,
+        "status": elem.find("status"),
+        "teardown": teardown,
+        "screenshots": find_screenshots(setup) + find_screenshots(teardown),
+        "errors": errors,
+    }
+
+
+def read_robot_errors(path, block_size=2 ** 20):
+    """Returns the <errors> element of an output.xml file.
+
+    Robot writes the execution errors as the last element of the file,
+    so rather than parsing the whole document we read backwards from
+    the end until we find it.
+    """
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        tail = b""
+        while pos > 0:
+            size = min(block_size, pos)
+            pos -= size
+            f.seek(pos)
+            tail = f.read(size) + tail
+            index = tail.rfind(b"<errors")
+            if index != -1:
+                end = tail.rfind(b"</robot>")
+                source = tail[index:end] if end > index else tail[index:]
+                errors = ET.fromstring(source)
+                # preserve the trailing whitespace, as a full parse would
+                errors.tail = source[len(source.rstrip()) :].decode() or None
+                return errors
+            if b"</statistics>" in tail:
+                break
+    return None
 
 
 def _parse_robot_time(timestring):
@@ -281,8 +504,6 @@ def find_screenshots(root):
 
 def render_robot_test_xml(root, test):
     testroot = ET.Element(root.tag, root.attrib)
-    suite_attrib = test["suite"]["elem"].attrib.copy()
-    suite_attrib.update({"id": "s1", "name": test["suite"]["name"]})
     suite = ET.SubElement(
         testroot,
         "suite",
@@ -298,7 +519,7 @@ def render_robot_test_xml(root, test):
     # Append text execution errors, if any. These are errors that
     # happen outside of an individual test, such as problems importing
     # a library or resource file.
-    execution_errors = root.find("errors")
+    execution_errors = test["suite"].get("errors")
     if execution_errors:
         testroot.append(execution_errors)
 
@@ -0,0 +1,180 @@
+import hashlib
+import html
+import json
+import os
+import re
+import time
+from tempfile import mkstemp
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+from robot import rebot
+
+from metaci.build.models import BuildFlowAsset
+from metaci.testresults.models import TestResultAsset, compress_text, decompress_text
+
+ASSET_URL_RE = re.compile(r'"(buildflow)?asset://(\d+)"')
+
+# Subset of robot task options that affect the log
+ROBOT_LOG_OPTIONS = (
+    "name",
+    "doc",
+    "metadata",
+    "settag",
+    "critical",
+    "noncritical",
+    "logtitle",
+    "suitestatlevel",
+    "tagstatinclude",
+    "tagstatexclude",
+    "tagstatcombine",
+    "tagdoc",
+    "tagstatlink",
+    "removekeywords",
+    "flattenkeywords",
+)
+
+# How long a render may hold the lock, and how long others wait for it
+RENDER_LOCK_TIMEOUT = 300
+RENDER_POLL_INTERVAL = 0.5
+
+
+def get_robot_log_options(result):
+    """Returns the rebot options copied from the result's robot task"""
+    if not result.task:
+        return {}
+    options = (result.task.options or {}).get("options") or {}
+    return {k: options[k] for k in ROBOT_LOG_OPTIONS if k in options}
+
+
+def robot_log_cache_key(result, options):
+    options_hash = hashlib.sha1(
+        json.dumps(options, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    return f"robot-log:{result.id}:{options_hash}"
+
+
+def get_robot_log_html(result):
+    """Returns the robot log html for a test result, from the cache if possible.
+
+    Only one process renders a given log at a time; others wait for it
+    to show up in the cache, and render it themselves if it doesn't
+    appear within METACI_ROBOT_LOG_RENDER_WAIT seconds.
+    """
+    options = get_robot_log_options(result)
+    key = robot_log_cache_key(result, options)
+    cached = cache.get(key)
+    if cached is not None:
+        return decompress_text(cached)
+
+    lock_key = f"{key}:lock"
+    locked = cache.add(lock_key, "rendering", timeout=RENDER_LOCK_TIMEOUT)
+    if not locked:
+        deadline = time.monotonic() + settings.METACI_ROBOT_LOG_RENDER_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(RENDER_POLL_INTERVAL)
+            cached = cache.get(key)
+            if cached is not None:
+                return decompress_text(cached)
+
+    try:
+        log_html = render_robot_log(result, options)
+        cache.set(key, compress_text(log_html), settings.METACI_ROBOT_LOG_CACHE_TIMEOUT)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return log_html
+
+
+def cache_robot_log(result):
+    """Renders the robot log for a test result into the cache
+    unless it is already there."""
+    options = get_robot_log_options(result)
+    key = robot_log_cache_key(result, options)
+    if cache.get(key) is None:
+        get_robot_log_html(result)
+
+
+def render_robot_log(result, options):
+    """Runs rebot on the robot xml of a test result and returns the log html"""
+    # resolve linked assets into download URLs
+    robot_xml = result.get_robot_xml()
+    robot_xml = ASSET_URL_RE.sub(make_asset_resolver(result, robot_xml), robot_xml)
+
+    source = mkstemp()[1]
+    log = mkstemp(".html")[1]
+    rebot_options = {"log": log, "output": None, "report": None}
+    rebot_options.update(options)
+    try:
+        with open(source, "w") as f:
+            f.write(robot_xml)
+        rebot(source, **rebot_options)
+        with open(log, "r") as f:
+            log_html = f.read()
+    finally:
+        os.remove(source)
+        os.remove(log)
+    return patch_html(log_html)
+
+
+def make_asset_resolver(result, robot_xml):
+    """Returns a function for ASSET_URL_RE.sub which replaces asset references
+    in robot_xml with download URLs, or an empty string for missing assets.
+
+    All the referenced assets are looked up up front, in one query per kind.
+    """
+    asset_ids = {"buildflow": set(), None: set()}
+    for m in ASSET_URL_RE.finditer(robot_xml):
+        asset_ids[m.group(1)].add(int(m.group(2)))
+
+    urls = {}
+    if asset_ids["buildflow"]:
+        build_flow_assets = BuildFlowAsset.objects.filter(
+            build_flow_id=result.build_flow_id, id__in=asset_ids["buildflow"]
+        ).values_list("id", "build_flow__build_id", "build_flow__flow")
+        for asset_id, build_id, flow in build_flow_assets:
+            urls["buildflow", asset_id] = reverse(
+                "build_flow_download_asset",
+                kwargs={
+                    "build_id": build_id,
+                    "flow": flow,
+                    "build_flow_asset_id": asset_id,
+                },
+            )
+    if asset_ids[None]:
+        test_result_assets = TestResultAsset.objects.filter(
+            result_id=result.id, id__in=asset_ids[None]
+        ).values_list("id", flat=True)
+        for asset_id in test_result_assets:
+            urls[None, asset_id] = reverse(
+                "testresult_download_asset",
+                kwargs={"result_id": result.id, "testresult_asset_id": asset_id},
+            )
+
+    def resolve_asset_url(m):
+        url = urls.get((m.group(1), int(m.group(2))), "")
+        return '"{}"'.format(html.escape(url))
+
+    return resolve_asset_url
+
+
+def patch_html(html):
+    """Patch anchor elements to specify the target attribute
+
+    The links created by the tagstatlink option will fail to
+    open when viewed within a frame. Even if that weren't the
+    case, I don't think we want them to open up in the frame
+    inside a metaci test result page.
+
+    This adds `target=_top` to the generated links.
+    """
+    # Yeah, I know patching HTML is fraught with peril. The robot
+    # code to generate the logs is pretty stable, so I think
+    # this is a reasonably safe way to do it. It results in a
+    # much better experience for our users.
+    html = html.replace(
+        r'<span>[<a href="{{html $value.url}}" title="{{html $value.url}}">',
+        r'<span>[<a href="{{html $value.url}}" title="{{html $value.url}}" target="_top">',
+    )
+    return html
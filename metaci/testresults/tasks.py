@@ -0,0 +1,19 @@
+import django_rq
+
+from metaci.testresults.models import TestResult
+from metaci.testresults.robot_log import cache_robot_log
+
+
+@django_rq.job("short", timeout=1800)
+def render_robot_logs(flowtask_id):
+    """Renders the logs of a robot task's failed tests into the cache,
+    since those are the ones people open."""
+    results = TestResult.objects.filter(
+        task_id=flowtask_id, outcome="Fail"
+    ).select_related("task", "build_flow", "build_flow__build")
+    rendered = 0
+    for result in results.iterator():
+        if result.has_robot_xml:
+            cache_robot_log(result)
+            rendered += 1
+    return f"Rendered {rendered} robot logs for flow task {flowtask_id}"
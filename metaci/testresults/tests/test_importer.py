@@ -1,7 +1,15 @@
+import io
+from collections import Counter
+
 import pytest
 
-from metaci.testresults.importer import import_test_results, populate_limit_fields
-from metaci.testresults.models import TestClass, TestMethod, TestResult
+from metaci.conftest import BuildFlowFactory
+from metaci.testresults.importer import (
+    import_test_results,
+    iter_junit_results,
+    populate_limit_fields,
+)
+from metaci.testresults.models import TestClass, TestMethod, TestResult, count_outcomes
 
 
 @pytest.mark.django_db
@@ -23,6 +31,69 @@ class TestImporter:
         assert test_result.duration == 5.99
         assert test_result.outcome == "Pass"
 
+    def test_import_test_results__batched(self, data, settings):
+        settings.METACI_TEST_RESULT_IMPORT_BATCH_SIZE = 2
+        # A flow in the same repo, without the fixture's existing results
+        build_flow = BuildFlowFactory(build=data["build"])
+        testclass = data["testclass"]
+        results = [
+            _result(testclass.name, data["testmethod"].name),
+            _result(testclass.name, "new_method"),
+            _result("NewClass", "test_one", outcome="Fail"),
+            _result("NewClass", "test_two"),
+            _result("NewClass", "test_one"),
+        ]
+        num_test_classes = TestClass.objects.count()
+        num_test_methods = TestMethod.objects.count()
+
+        import_test_results(build_flow, iter(results), "Apex")
+
+        assert TestClass.objects.count() == num_test_classes + 1
+        assert TestMethod.objects.count() == num_test_methods + 3
+        assert build_flow.test_results.count() == 5
+        assert build_flow.test_results.filter(method=data["testmethod"]).count() == 1
+        assert (
+            build_flow.test_results.filter(
+                method__testclass__name="NewClass", method__name="test_one"
+            ).count()
+            == 2
+        )
+        assert build_flow.test_results.filter(outcome="Fail").count() == 1
+
+    def test_import_test_results__counts_outcomes(self, settings):
+        settings.METACI_TEST_RESULT_IMPORT_BATCH_SIZE = 2
+        build_flow = BuildFlowFactory()
+        results = [
+            _result("Class", "test_one"),
+            _result("Class", "test_two", outcome="Fail"),
+            _result("Class", "test_three", outcome="CompileFail"),
+        ]
+        outcomes = Counter({"Pass": 1})
+
+        import_test_results(build_flow, results, "Apex", outcomes=outcomes)
+
+        assert outcomes == Counter({"Pass": 2, "Fail": 1, "CompileFail": 1})
+        assert count_outcomes(outcomes) == {"total": 4, "pass": 2, "fail": 2}
+        assert build_flow.test_results.test_counts() == {
+            "total": 3,
+            "pass": 1,
+            "fail": 2,
+        }
+
+    def test_import_test_results__query_count(
+        self, settings, django_assert_max_num_queries
+    ):
+        settings.METACI_TEST_RESULT_IMPORT_BATCH_SIZE = 100
+        build_flow = BuildFlowFactory()
+        results = [
+            _result(f"Class{i % 10}", f"test_{i}", outcome="Pass") for i in range(300)
+        ]
+        # 3 batches x (2 selects + 2 inserts + 1 bulk insert) + savepoint
+        with django_assert_max_num_queries(20):
+            import_test_results(build_flow, results, "Apex")
+
+        assert build_flow.test_results.count() == 300
+
     def test_populate_limit_fields(self, data):
         test_result = data["testresult"]
         code_unit = {
@@ -38,3 +109,46 @@ class TestImporter:
         assert test_result.worst_limit_percent == worst_limit_percent
         assert test_result.worst_limit_test == worst_limit
         assert test_result.worst_limit_test_percent == worst_limit_percent
+
+
+def test_iter_junit_results():
+    results = list(iter_junit_results("metaci/testresults/tests/junit_output.xml"))
+
+    assert [result["Method"] for result in results] == ["test_method1", "test_method2"]
+    assert results[0]["SourceFile"] == "metaci/testresults/tests/junit_output.xml"
+    assert results[0]["Stats"] == {"duration": "5.990"}
+
+
+def test_iter_junit_results__failures():
+    junit = io.BytesIO(
+        b"""<testsuite>
+            <testcase classname="a.B" name="test_fail" time="1.0">
+                <failure type="AssertionError" message="boom">trace</failure>
+            </testcase>
+            <testcase classname="a.B" name="test_pass" time="1.0" />
+        </testsuite>"""
+    )
+
+    fail, success = iter_junit_results(junit)
+
+    assert fail["Outcome"] == "Fail"
+    assert fail["StackTrace"] == "trace\n"
+    assert fail["Message"] == "AssertionError: boom\n"
+    assert success["Outcome"] == "Pass"
+
+
+def test_iter_junit_results__missing_file():
+    with pytest.raises(IOError):
+        iter_junit_results("does/not/exist.xml")
+
+
+def _result(class_name, method_name, outcome="Pass"):
+    return {
+        "ClassName": class_name,
+        "Method": method_name,
+        "Outcome": outcome,
+        "StackTrace": "",
+        "Message": "",
+        "Stats": {"duration": 1.5},
+        "SourceFile": "test_results.json",
+    }
@@ -2,6 +2,7 @@ import fnmatch
 import json
 import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta
+from io import StringIO
 from pathlib import Path, PurePath
 from shutil import copyfile
 from unittest import mock
@@ -11,6 +12,7 @@ import responses
 import robot
 from cumulusci.utils import elementtree_parse_file, temporary_dir
 from django.conf import settings
+from django.core.management import call_command
 from django.utils import timezone
 
 from metaci.build.exceptions import BuildError
@@ -45,6 +47,106 @@ def test_nested_suites():
     assert test_result.method.testclass.name == "Nested/Cumulusci/Base"
 
 
+@pytest.mark.django_db
+def test_nested_suites__batched(settings):
+    settings.METACI_TEST_RESULT_IMPORT_BATCH_SIZE = 5
+    with temporary_dir() as output_dir:
+        copyfile(
+            TEST_ROBOT_OUTPUT_FILES / "robot_with_nested_suites.xml",
+            Path(output_dir) / "output.xml",
+        )
+
+        flowtask = FlowTaskFactory()
+        results = robot_importer.import_robot_test_results(flowtask, output_dir)
+
+    assert len(results) == 73
+    assert models.TestResult.objects.filter(task=flowtask).count() == 73
+    assert models.TestClass.objects.filter(name="Nested/Cumulusci/Base").count() == 1
+
+
+@pytest.mark.django_db
+def test_compressed_robot_xml(settings):
+    path = TEST_ROBOT_OUTPUT_FILES / "robot_with_setup_teardown.xml"
+    expected = {
+        test["name"]: test["xml"] for test in robot_importer.parse_robot_output(path)
+    }
+    settings.METACI_ROBOT_XML_STORAGE = "compressed"
+    with temporary_dir() as output_dir:
+        copyfile(path, Path(output_dir) / "output.xml")
+        flowtask = FlowTaskFactory()
+        robot_importer.import_robot_test_results(flowtask, output_dir)
+
+    test_results = models.TestResult.objects.filter(task=flowtask)
+    assert len(test_results) == len(expected)
+    for test_result in test_results:
+        assert test_result.robot_xml is None
+        assert test_result.has_robot_xml
+        assert test_result.get_robot_xml() == expected[test_result.method.name]
+    # all of the tests are in one suite, so they share a fragment
+    assert flowtask.build_flow.robot_suite_fragments.count() == 1
+
+
+@pytest.mark.django_db
+def test_compress_robot_xml_command():
+    with temporary_dir() as output_dir:
+        copyfile(
+            TEST_ROBOT_OUTPUT_FILES / "robot_with_nested_suites.xml",
+            Path(output_dir) / "output.xml",
+        )
+        robot_importer.import_robot_test_results(FlowTaskFactory(), output_dir)
+    expected = {
+        result.id: result.robot_xml for result in models.TestResult.objects.all()
+    }
+
+    call_command("compress_robot_xml", batch_size=10, stdout=StringIO())
+
+    for test_result in models.TestResult.objects.all():
+        assert test_result.robot_xml is None
+        assert test_result.get_robot_xml() == expected[test_result.id]
+
+
+def test_parse_robot_output__streams_suites():
+    tests = robot_importer.parse_robot_output(
+        TEST_ROBOT_OUTPUT_FILES / "robot_with_nested_suites.xml"
+    )
+
+    first = next(tests)
+    assert first["name"] == "AAAAA Test Set Login Url"
+    assert first["suite"]["name"] == "Nested/Cumulusci/Base"
+    assert len(list(tests)) == 72
+
+
+def test_parse_robot_output__parallel():
+    path = TEST_ROBOT_OUTPUT_FILES / "robot_with_nested_suites.xml"
+
+    serial = list(robot_importer.parse_robot_output(path, workers=1))
+    parallel = list(robot_importer.parse_robot_output(path, workers=2, chunksize=4))
+
+    assert [test["name"] for test in parallel] == [test["name"] for test in serial]
+    assert [test["xml"] for test in parallel] == [test["xml"] for test in serial]
+    assert [test["suite"]["name"] for test in parallel] == [
+        test["suite"]["name"] for test in serial
+    ]
+
+
+def test_read_robot_errors():
+    path = TEST_ROBOT_OUTPUT_FILES / "robot_with_import_errors.xml"
+
+    # use a tiny block size to make sure the errors element is found
+    # even when it spans several blocks
+    errors = robot_importer.read_robot_errors(path, block_size=16)
+
+    assert errors.tag == "errors"
+    assert len(errors.findall("msg")) == 2
+
+
+def test_read_robot_errors__no_errors():
+    errors = robot_importer.read_robot_errors(TEST_ROBOT_OUTPUT_FILES / "robot_1.xml")
+
+    assert errors.tag == "errors"
+    assert len(errors) == 0
+
+
 @pytest.mark.django_db
 def test_basic_parsing():
     with temporary_dir() as output_dir:
@@ -292,6 +394,36 @@ def test_screenshots_generated():
         assert 1 == test_ui.assets.count()
 
 
+@pytest.mark.django_db
+def test_screenshot_references_replaced(settings):
+    settings.METACI_ROBOT_SCREENSHOT_UPLOAD_WORKERS = 2
+    with temporary_dir() as output_dir:
+        output_dir = Path(output_dir)
+        copyfile(
+            TEST_ROBOT_OUTPUT_FILES / "robot_screenshots.xml",
+            output_dir / "output.xml",
+        )
+        open(output_dir / "selenium-screenshot-1.png", mode="w+")
+        open(output_dir / "selenium-screenshot-2.png", mode="w+")
+
+        flowtask = FlowTaskFactory()
+        robot_importer.import_robot_test_results(flowtask, output_dir)
+
+        # uploaded files are removed
+        assert not list(output_dir.glob("*.png"))
+
+    flow_asset = BuildFlowAsset.objects.get(category="robot-screenshot")
+    assert flow_asset.asset.name.endswith("-selenium-screenshot-1.png")
+    test_ui = models.TestResult.objects.get(method__name="Via UI", task=flowtask)
+    asset = test_ui.assets.get()
+    assert asset.asset.name.endswith("selenium-screenshot-2.png")
+
+    robot_xml = test_ui.get_robot_xml()
+    assert f'"asset://{asset.id}"' in robot_xml
+    assert f'"buildflowasset://{flow_asset.id}"' in robot_xml
+    assert '"selenium-screenshot-' not in robot_xml
+
+
 @pytest.mark.django_db
 def test_find_screenshots():
     path = PurePath(__file__).parent / "robot_screenshots.xml"
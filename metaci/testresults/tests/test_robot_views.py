@@ -2,9 +2,11 @@ from pathlib import Path
 from unittest import mock
 
 import pytest
-from django.test import Client, TestCase
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
+from metaci.build.models import BuildFlowAsset
 from metaci.conftest import (
     BuildFactory,
     FlowTaskFactory,
@@ -12,6 +14,14 @@ from metaci.conftest import (
     TestResultFactory,
     UserFactory,
 )
+from metaci.testresults.models import TestResult, TestResultAsset, compress_text
+from metaci.testresults.robot_log import (
+    ASSET_URL_RE,
+    get_robot_log_options,
+    make_asset_resolver,
+    robot_log_cache_key,
+)
+from metaci.testresults.tasks import render_robot_logs
 
 
 @pytest.mark.django_db
@@ -24,6 +34,15 @@ class BaseRobotResultsTestCase(TestCase):
         cls.user = UserFactory()
         cls.build = BuildFactory()
 
+    def setUp(self):
+        super().setUp()
+        # Keep rendered logs from leaking between tests
+        self.cache = LocMemCache("robot-log-tests", {})
+        self.cache.clear()
+        patcher = mock.patch("metaci.testresults.robot_log.cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     def _get_xml(self, filename):
         """Return the contents of the named XML file
 
@@ -48,7 +67,7 @@ class TestResultRobotView(BaseRobotResultsTestCase):
         response = self.client.get(url)
         assert response.status_code == 404, "Ordinary user was able to see results"
 
-    @mock.patch("metaci.testresults.views.rebot")
+    @mock.patch("metaci.testresults.robot_log.rebot")
     def test_rebot_options(self, mock_rebot):
         """Verify subset of robot options are passed to rebot
 
@@ -94,7 +113,7 @@ class TestResultRobotView(BaseRobotResultsTestCase):
         (args, kwargs) = mock_rebot.call_args
         assert set(task_options.items()).issubset(set(kwargs.items()))
 
-    @mock.patch("metaci.testresults.views.rebot")
+    @mock.patch("metaci.testresults.robot_log.rebot")
     def test_result_robot_no_options(self, mock_rebot):
         """Verify the test_result_robot view works even in the absense of robot options"""
         task = FlowTaskFactory(options={})
@@ -112,6 +131,12 @@ class TestResultRobotView(BaseRobotResultsTestCase):
         (args, kwargs) = mock_rebot.call_args
         self.assertTupleEqual(tuple(kwargs.keys()), ("log", "output", "report"))
 
+    def test_get_robot_log_options__null_options(self):
+        for options in (None, {"options": None}):
+            task = FlowTaskFactory(options=options)
+            test_result = TestResultFactory(task=task)
+            assert get_robot_log_options(test_result) == {}
+
     def test_patched_tagstat_links(self):
         """Verify that the target attribute is in some of the links
 
@@ -140,3 +165,130 @@ class TestResultRobotView(BaseRobotResultsTestCase):
             str(response.content),
             "didn't find 'target=top' attribute in generated html links",
         )
+
+
+class TestRobotLogCache(BaseRobotResultsTestCase):
+    def _get_log(self, test_result):
+        self.client.force_login(self.superuser)
+        url = reverse("test_result_robot", kwargs={"result_id": test_result.id})
+        response = self.client.get(url)
+        assert response.status_code == 200
+        return response.content.decode("utf-8")
+
+    @mock.patch("metaci.testresults.robot_log.render_robot_log")
+    def test_rendered_once(self, render_robot_log):
+        render_robot_log.return_value = "<html>log</html>"
+        test_result = TestResultFactory(robot_xml=self._get_xml("robot_1.xml"))
+
+        assert self._get_log(test_result) == "<html>log</html>"
+        assert self._get_log(test_result) == "<html>log</html>"
+        render_robot_log.assert_called_once()
+
+    @mock.patch("metaci.testresults.robot_log.render_robot_log")
+    def test_cached_per_options(self, render_robot_log):
+        render_robot_log.return_value = "<html>log</html>"
+        task = FlowTaskFactory(options={"options": {"logtitle": "One"}})
+        test_result = TestResultFactory(
+            robot_xml=self._get_xml("robot_1.xml"), task=task
+        )
+        self._get_log(test_result)
+
+        task.options = {"options": {"logtitle": "Two"}}
+        task.save()
+        self._get_log(test_result)
+
+        assert render_robot_log.call_count == 2
+
+    @override_settings(METACI_ROBOT_LOG_RENDER_WAIT=1)
+    @mock.patch("metaci.testresults.robot_log.RENDER_POLL_INTERVAL", 0)
+    @mock.patch("metaci.testresults.robot_log.render_robot_log")
+    def test_waits_for_render_in_progress(self, render_robot_log):
+        test_result = TestResultFactory(robot_xml=self._get_xml("robot_1.xml"))
+        key = robot_log_cache_key(test_result, get_robot_log_options(test_result))
+        self.cache.add(f"{key}:lock", "rendering")
+
+        # Another process finishes rendering while we wait
+        rendered = [None, compress_text("<html>theirs</html>")]
+        with mock.patch.object(self.cache, "get", side_effect=rendered):
+            assert self._get_log(test_result) == "<html>theirs</html>"
+        render_robot_log.assert_not_called()
+
+    @override_settings(METACI_ROBOT_LOG_RENDER_WAIT=0)
+    @mock.patch("metaci.testresults.robot_log.render_robot_log")
+    def test_renders_when_lock_is_stale(self, render_robot_log):
+        render_robot_log.return_value = "<html>log</html>"
+        test_result = TestResultFactory(robot_xml=self._get_xml("robot_1.xml"))
+        key = robot_log_cache_key(test_result, get_robot_log_options(test_result))
+        self.cache.add(f"{key}:lock", "rendering")
+
+        assert self._get_log(test_result) == "<html>log</html>"
+        # the lock belongs to someone else
+        assert self.cache.get(f"{key}:lock") == "rendering"
+
+    @mock.patch("metaci.testresults.robot_log.render_robot_log")
+    def test_render_robot_logs__failed_only(self, render_robot_log):
+        render_robot_log.return_value = "<html>log</html>"
+        task = FlowTaskFactory()
+        failed = TestResultFactory(
+            robot_xml=self._get_xml("robot_1.xml"), task=task, outcome="Fail"
+        )
+        TestResultFactory(
+            robot_xml=self._get_xml("robot_1.xml"), task=task, outcome="Pass"
+        )
+
+        render_robot_logs(task.id)
+
+        render_robot_log.assert_called_once()
+        assert self._get_log(failed) == "<html>log</html>"
+        render_robot_log.assert_called_once()
+
+
+class TestAssetResolver(BaseRobotResultsTestCase):
+    def _make_result(self, num_assets):
+        test_result = TestResultFactory()
+        references = []
+        for i in range(num_assets):
+            asset = TestResultAsset.objects.create(
+                result=test_result, asset=f"screenshot-{i}.png"
+            )
+            references.append(f'<msg>"asset://{asset.id}"</msg>')
+            flow_asset = BuildFlowAsset.objects.create(
+                build_flow=test_result.build_flow,
+                asset=f"suite-screenshot-{i}.png",
+                category="robot-screenshot",
+            )
+            references.append(f'<msg>"buildflowasset://{flow_asset.id}"</msg>')
+        return test_result, "".join(references)
+
+    def test_resolves_asset_urls(self):
+        test_result, robot_xml = self._make_result(1)
+        asset = test_result.assets.get()
+        flow_asset = test_result.build_flow.assets.get()
+        robot_xml += '<msg>"asset://0"</msg>'
+
+        resolved = ASSET_URL_RE.sub(
+            make_asset_resolver(test_result, robot_xml), robot_xml
+        )
+
+        asset_url = reverse(
+            "testresult_download_asset",
+            kwargs={"result_id": test_result.id, "testresult_asset_id": asset.id},
+        )
+        flow_asset_url = reverse(
+            "build_flow_download_asset",
+            kwargs={
+                "build_id": test_result.build_flow.build_id,
+                "flow": test_result.build_flow.flow,
+                "build_flow_asset_id": flow_asset.id,
+            },
+        )
+        assert resolved == (
+            f'<msg>"{asset_url}"</msg><msg>"{flow_asset_url}"</msg><msg>""</msg>'
+        )
+
+    def test_query_count_is_constant(self):
+        for num_assets in (1, 25):
+            test_result, robot_xml = self._make_result(num_assets)
+            test_result = TestResult.objects.get(id=test_result.id)
+            with self.assertNumQueries(2):
+                ASSET_URL_RE.sub(make_asset_resolver(test_result, robot_xml), robot_xml)
@@ -1,25 +1,16 @@
-import html
-import os
-import re
-from tempfile import mkstemp
-
 from django.contrib.auth.decorators import login_required
-from django.core.exceptions import ObjectDoesNotExist
 from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404, render
-from django.urls import reverse
 from django.views.decorators.clickjacking import xframe_options_exempt
-from robot import rebot
 
 from metaci.build.models import Build, BuildFlow
 from metaci.build.utils import paginate
 from metaci.testresults.filters import BuildFlowFilter
 from metaci.testresults.importer import STATS_MAP
 from metaci.testresults.models import TestMethod, TestResult, TestResultAsset
+from metaci.testresults.robot_log import get_robot_log_html
 from metaci.testresults.utils import find_buildflow
 
-ASSET_URL_RE = re.compile(r'"(buildflow)?asset://(\d+)"')
-
 
 def build_flow_tests(request, build_id, flow):
     build_flow = find_buildflow(request, build_id, flow)
@@ -150,112 +141,17 @@ def test_result_detail(request, result_id):
     return render(request, "testresults/test_result_detail.html", data)
 
 
-def make_asset_resolver(result):
-    def resolve_asset_url(m):
-        url = ""
-        asset_type = m.group(1)
-        if asset_type == "buildflow":
-            queryset = result.build_flow.assets
-        elif asset_type is None:
-            queryset = result.assets
-        asset_id = int(m.group(2))
-        try:
-            asset = queryset.get(id=asset_id)
-        except ObjectDoesNotExist:
-            pass
-        else:
-            if asset_type == "buildflow":
-                url = reverse(
-                    "build_flow_download_asset",
-                    kwargs={
-                        "build_id": result.build_flow.build.pk,
-                        "flow": result.build_flow.flow,
-                        "build_flow_asset_id": asset.pk,
-                    },
-                )
-            else:
-                url = reverse(
-                    "testresult_download_asset",
-                    kwargs={
-                        "result_id": asset.result.pk,
-                        "testresult_asset_id": asset.pk,
-                    },
-                )
-        return '"{}"'.format(html.escape(url))
-
-    return resolve_asset_url
-
-
 @xframe_options_exempt
 def test_result_robot(request, result_id):
     build_qs = Build.objects.for_user(request.user)
     result = get_object_or_404(TestResult, id=result_id, build_flow__build__in=build_qs)
 
-    if result.robot_xml:
-        # resolve linked assets into temporary S3 URLs
-        robot_xml = ASSET_URL_RE.sub(make_asset_resolver(result), result.robot_xml)
-
-        source = mkstemp()[1]
-        log = mkstemp(".html")[1]
-        rebot_options = {"log": log, "output": None, "report": None}
-        if result.task:
-            # Copy subset of robot task options that affect the log
-            options_to_copy = (
-                "name",
-                "doc",
-                "metadata",
-                "settag",
-                "critical",
-                "noncritical",
-                "logtitle",
-                "suitestatlevel",
-                "tagstatinclude",
-                "tagstatexclude",
-                "tagstatcombine",
-                "tagdoc",
-                "tagstatlink",
-                "removekeywords",
-                "flattenkeywords",
-            )
-            options = result.task.options.get("options", {})
-            rebot_options.update(
-                {k: options[k] for k in options_to_copy if k in options}
-            )
-
-        with open(source, "w") as f:
-            f.write(robot_xml)
-        rebot(source, **rebot_options)
-        with open(log, "r") as f:
-            log_html = f.read()
-        log_html = patch_html(log_html)
-        os.remove(source)
-        os.remove(log)
-        return HttpResponse(log_html)
+    if result.has_robot_xml:
+        return HttpResponse(get_robot_log_html(result))
     else:
         return HttpResponse(f"No robot_xml available in test result: {result}")
 
 
-def patch_html(html):
-    """Patch anchor elements to specify the target attribute
-
-    The links created by the tagstatlink option will fail to
-    open when viewed within a frame. Even if that weren't the
-    case, I don't think we want them to open up in the frame
-    inside a metaci test result page.
-
-    This adds `target=_top` to the generated links.
-    """
-    # Yeah, I know patching HTML is fraught with peril. The robot
-    # code to generate the logs is pretty stable, so I think
-    # this is a reasonably safe way to do it. It results in a
-    # much better experience for our users.
-    html = html.replace(
-        r'<span>[<a href="{{html $value.url}}" title="{{html $value.url}}">',
-        r'<span>[<a href="{{html $value.url}}" title="{{html $value.url}}" target="_top">',
-    )
-    return html
-
-
 def test_method_peek(request, method_id):
     build_qs = Build.objects.for_user(request.user)
     method = get_object_or_404(TestMethod, id=method_id)